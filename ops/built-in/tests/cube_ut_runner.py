@@ -23,7 +23,6 @@ import multiprocessing
 from typing import List
 from typing import Union
 from datetime import datetime
-from multiprocessing import Pool
 from functools import reduce
 
 import coverage
@@ -31,6 +30,8 @@ from op_test_frame.common import logger
 from op_test_frame.ut import ut_loader
 from op_test_frame.ut import ut_report
 from op_test_frame.ut import op_ut
+from op_test_frame.ut import op_ut_schedule
+from op_test_frame.ut import op_ut_runner
 from op_test_frame.utils import file_util
 
 from op_test_frame.ut.op_ut_case_info import CaseUsage
@@ -125,7 +126,7 @@ class RunUTCaseFileArgs:  # pylint: disable=too-many-instance-attributes,too-few
     def __init__(self, case_file, op_module_name, soc_version,  # pylint: disable=too-many-arguments
                  case_name, test_report, test_report_data_path,
                  cov_report, cov_data_path, simulator_mode, simulator_lib_path,
-                 data_dir, dump_model_dir):
+                 data_dir, dump_model_dir, cov_relative_files=False):
         self.case_file = case_file
         self.op_module_name = op_module_name
         self.soc_version = soc_version
@@ -138,6 +139,7 @@ class RunUTCaseFileArgs:  # pylint: disable=too-many-instance-attributes,too-few
         self.simulator_lib_path = simulator_lib_path
         self.data_dir = data_dir
         self.dump_model_dir = dump_model_dir
+        self.cov_relative_files = cov_relative_files
 
 
 def _run_ut_case_file(run_arg: RunUTCaseFileArgs):
@@ -145,6 +147,8 @@ def _run_ut_case_file(run_arg: RunUTCaseFileArgs):
     res = True
     if run_arg.cov_report:
         ut_cover = coverage.Coverage(source=[run_arg.op_module_name] + cube_source_dirs, data_file=run_arg.cov_data_path)
+        if run_arg.cov_relative_files:
+            ut_cover.set_option("run:relative_files", True)
         ut_cover.start()
 
     try:
@@ -188,6 +192,12 @@ def _run_ut_case_file(run_arg: RunUTCaseFileArgs):
     return res
 
 
+def _run_ut_case_file_with_duration(run_arg: RunUTCaseFileArgs):
+    start_time = time.time()
+    res = _run_ut_case_file(run_arg)
+    return res, time.time() - start_time
+
+
 SUCCESS = "success"
 FAILED = "failed"
 
@@ -226,7 +236,7 @@ def run_ut(case_dir, soc_version, case_name=None,  # pylint: disable=too-many-ar
            cov_report=None, cov_report_path="./cov_report",
            simulator_mode=None, simulator_lib_path=None,
            simulator_data_path="./model", test_data_path="./data",
-           process_num=0):
+           process_num=0, shard=None, worker_start_method=None, duration_history_path=None):
     """
     run ut test case
     :param case_dir: a test case dir or a test case file
@@ -241,6 +251,10 @@ def run_ut(case_dir, soc_version, case_name=None,  # pylint: disable=too-many-ar
     :param simulator_data_path: test data directory, input, output and expect output data
     :param test_data_path: when run ca or tm mode, dump data save in this dirctory
     :param process_num: when 0 means use cpu_count, else means process count 
+    :param shard: like "0/4", only run the 1st of 4 shards of (case file, soc) tasks,
+                  see op_ut_runner.run_ut and op_ut_runner.merge_shard_reports
+    :param worker_start_method: None/fork/spawn/forkserver, see op_ut_runner.run_ut
+    :param duration_history_path: case file run duration history file, see op_ut_runner.run_ut
 
     :return: success or failed
     """
@@ -248,6 +262,7 @@ def run_ut(case_dir, soc_version, case_name=None,  # pylint: disable=too-many-ar
 
     if not _check_args(case_dir, test_report, cov_report):
         return FAILED
+    shard_index, shard_count = op_ut_schedule.parse_shard(shard) if shard else (None, None)
 
     case_file_info_list, load_has_err = ut_loader.load_ut_cases(case_dir)
     if not case_file_info_list:
@@ -284,24 +299,49 @@ def run_ut(case_dir, soc_version, case_name=None,  # pylint: disable=too-many-ar
                                             simulator_mode=simulator_mode,
                                             simulator_lib_path=simulator_lib_path,
                                             data_dir=test_data_path,
-                                            dump_model_dir=simulator_data_path)
+                                            dump_model_dir=simulator_data_path,
+                                            cov_relative_files=shard is not None)
                 total_run_arg_list[one_soc_version].append(run_arg)
                 ps_count += 1
         return total_run_arg_list, ps_count
 
     multiprocess_run_args, total_count = _build_multiprocess_run_args()
+    history_shared = bool(duration_history_path)
+    if not duration_history_path:
+        duration_history_path = os.path.join(test_report_path, op_ut_schedule.Constant.HISTORY_FILE_NAME)
+    duration_history = op_ut_schedule.DurationHistory(duration_history_path)
+    duration_history.load()
+    report_shard = None
+    if shard:
+        shard_history = duration_history
+        if not history_shared:
+            logger.log_info("duration_history_path not set, balance the shards by case file size")
+            shard_history = op_ut_schedule.DurationHistory(duration_history_path)
+        all_args = [arg for soc_args in multiprocess_run_args.values() for arg in soc_args]
+        shard_args, shard_estimate = op_ut_schedule.select_shard(all_args, shard_history, shard_index, shard_count)
+        logger.log_info("run shard %d/%d, case file task count: %d, estimated duration: %.1fs" % (
+            shard_index, shard_count, len(shard_args), shard_estimate))
+        for one_soc_version, soc_args in multiprocess_run_args.items():
+            multiprocess_run_args[one_soc_version] = [arg for arg in soc_args if arg in shard_args]
+        total_count = len(shard_args)
+        report_shard = op_ut_schedule.build_shard_info(all_args, shard_args, shard_index, shard_count)
 
    
     logger.log_info("multiprocess_run_args count: %d" % total_count)
 
-    if process_num == 1:
+    run_args = [arg for soc_args in multiprocess_run_args.values() for arg in soc_args]
+    if total_count == 0:
+        logger.log_info("no case file task to run")
+        run_success = True
+        results = []
+    elif process_num == 1:
         logger.log_info("process_num is 1, run cases one by one")
         results = []
         for _, soc_args in multiprocess_run_args.items():
             for soc_arg in soc_args:
-                res = _run_ut_case_file(soc_arg)
+                res = _run_ut_case_file_with_duration(soc_arg)
                 results.append(res)
-        run_success = reduce(lambda x, y: x and y, results)
+        run_success = reduce(lambda x, y: x and y, [res for res, _ in results])
     else:
         if process_num == 0:
             cpu_count = multiprocessing.cpu_count() - 1
@@ -320,30 +360,39 @@ def run_ut(case_dir, soc_version, case_name=None,  # pylint: disable=too-many-ar
                 for soc_arg in soc_args:
                     total_args.append(soc_arg)
             if len(total_args) == 1:
-                res = _run_ut_case_file(total_args[0])
+                res = _run_ut_case_file_with_duration(total_args[0])
                 results = [res, ]
             else:
-                with Pool(processes=cpu_count) as pool:
-                    results = pool.map(_run_ut_case_file, total_args)
-            run_success = reduce(lambda x, y: x and y, results)
+                with op_ut_runner.get_worker_context(worker_start_method).Pool(processes=cpu_count) as pool:
+                    results = pool.map(_run_ut_case_file_with_duration, total_args)
+            run_success = reduce(lambda x, y: x and y, [res for res, _ in results])
         else:
             results = []
             for _, soc_args in multiprocess_run_args.items():
-                with Pool(processes=cpu_count) as pool:
-                    one_soc_results = pool.map(_run_ut_case_file, soc_args)
+                with op_ut_runner.get_worker_context(worker_start_method).Pool(processes=cpu_count) as pool:
+                    one_soc_results = pool.map(_run_ut_case_file_with_duration, soc_args)
                 for result in one_soc_results:
                     results.append(result)
-            run_success = reduce(lambda x, y: x and y, results)
+            run_success = reduce(lambda x, y: x and y, [res for res, _ in results])
+
+    for run_arg, (_, duration) in zip(run_args, results):
+        duration_history.update(run_arg.case_file, run_arg.soc_version, duration)
+    try:
+        duration_history.save()
+    except OSError as save_err:
+        logger.log_warn("save duration history failed, error msg: %s" % save_err)
 
     test_report = ut_report.OpUTReport()
     test_report.combine_report(rpt_combine_dir)
+    if shard:
+        test_report.shard = report_shard
     report_data_path = os.path.join(test_report_path, ".ut_test_report")
     test_report.save(report_data_path)
     if test_report:
         test_report.console_print()
 
-    if cov_report and len(multiprocess_run_args) > 0:
-        _combine_coverage(cov_report_path, cov_combine_dir)
+    if cov_report and total_count > 0:
+        _combine_coverage(cov_report_path, cov_combine_dir, relative_files=shard is not None)
 
     print("end run ops ut time: %s" % datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"))
     if load_has_err:
@@ -354,9 +403,11 @@ def run_ut(case_dir, soc_version, case_name=None,  # pylint: disable=too-many-ar
     return run_result
 
 
-def _combine_coverage(cov_report_path, cov_combine_dir):
+def _combine_coverage(cov_report_path, cov_combine_dir, relative_files=False):
     total_cov_data_file = os.path.join(cov_report_path, ".coverage")
     cov = coverage.Coverage(source=cube_source_dirs, data_file=total_cov_data_file)
+    if relative_files:
+        cov.set_option("run:relative_files", True)
     combine_files = [os.path.join(cov_combine_dir, cov_file) for cov_file in os.listdir(cov_combine_dir)]
     cov.combine(combine_files)
     cov.save()
@@ -18,6 +18,31 @@ flags.DEFINE_string("cov_path", None, "which dirctory to save coverage report")
 flags.DEFINE_string("simulator_lib_path", None, "the path to simulator libs")
 flags.DEFINE_string("pr_changed_file", None, "git diff result file by ci, analyse relate ut by this file")
 flags.DEFINE_integer("process_num", None, "process number")
+flags.DEFINE_string("shard", None, "Shard like 'index/count', only run one shard of (case file, soc) tasks")
+flags.DEFINE_string("duration_history_path", None,
+                    "Duration history shared by all shards to balance them, default balance by case file size")
+flags.DEFINE_integer("merge_shard_count", None, "Merge the reports of a sharded run instead of running ut")
+flags.DEFINE_string("merge_report_paths", None, "Report directories of all shards to merge, split by ','")
+flags.DEFINE_string("merge_cov_paths", None, "Coverage directories of all shards to merge, split by ','")
+flags.DEFINE_string("worker_start_method", None,
+                    "How to start case file workers: fork/spawn/forkserver, default the platform default")
+flags.DEFINE_boolean("resume", False, "Resume a broken run, skip the work recorded in the run journal")
+flags.DEFINE_integer("case_timeout", None, "Seconds, kill a hung case and run the rest cases in a new worker")
+flags.DEFINE_integer("file_timeout", None, "Seconds, kill a hung case file task and keep its completed cases")
+flags.DEFINE_boolean("last_failed", False, "Only run the failed and error cases of the last run")
+flags.DEFINE_boolean("failed_first", False, "Run the failed and error cases of the last run first")
+flags.DEFINE_integer("memory_budget", None,
+                     "MB, case file workers memory budget, 0 means 80% of available memory, default no budget")
+flags.DEFINE_integer("max_tasks_per_worker", None, "Replace a case file worker after it runs this count of tasks")
+flags.DEFINE_integer("max_worker_rss", None, "MB, replace a case file worker when its rss is bigger after a task")
+flags.DEFINE_boolean("cov_fast", False, "Collect coverage with the lowest overhead tracer, only trace op files")
+flags.DEFINE_string("cov_report", "html", "Coverage report type: html/xml/json/data, data means render later")
+flags.DEFINE_integer("simulator_slots", None, "Simulator instance count can run at the same time, default 1 for esl")
+flags.DEFINE_string("event_log", None, "Jsonl case event log path, default .ut_event_log.jsonl in the report path")
+flags.DEFINE_string("test_report", "json", "Test report type: json/jsonl, jsonl report has one case a line")
+flags.DEFINE_string("result_store", None, "Sqlite database to keep the case results of the runs, not store if None")
+flags.DEFINE_string("run_id", None, "Run id of the stored results, default generated by time and pid")
+flags.DEFINE_integer("case_process_num", 1, "Process count to run the cases of one case file, default 1")
 
 cur_dir = os.path.realpath(__file__)
 repo_root = os.path.sep.join(cur_dir.split(os.path.sep)[:-4])
@@ -423,8 +448,27 @@ def get_cube_case_dir(case_dir):
     return cube_case_dir, vector_case_dir
 
 
+def merge_shards():
+    report_path = FLAGS.report_path if FLAGS.report_path else "./report/ops/python_report"
+    cov_report_path = FLAGS.cov_path if FLAGS.cov_path else "./cov_report/ops/python_utest"
+    shard_report_paths = [path.strip() for path in str(FLAGS.merge_report_paths).split(",") if path.strip()]
+    shard_cov_paths = None
+    if FLAGS.merge_cov_paths:
+        shard_cov_paths = [path.strip() for path in str(FLAGS.merge_cov_paths).split(",") if path.strip()]
+    res = op_ut_runner.merge_shard_reports(FLAGS.merge_shard_count, shard_report_paths,
+                                           test_report_path=report_path,
+                                           shard_cov_report_paths=shard_cov_paths,
+                                           cov_report_path=cov_report_path,
+                                           test_report=FLAGS.test_report)
+    if res != op_status.SUCCESS:
+        exit(-1)
+    exit(0)
+
+
 def main(argv):
     _ = argv
+    if FLAGS.merge_shard_count:
+        merge_shards()
     soc_version = FLAGS.soc_version
     soc_version = [soc.strip() for soc in str(soc_version).split(",")]
     pr_changed_file = FLAGS.pr_changed_file
@@ -458,7 +502,10 @@ def main(argv):
                                          cov_report_path=cov_report_path,
                                          simulator_mode="pv",
                                          simulator_lib_path=simulator_lib_path,
-                                         process_num=process_num)
+                                         process_num=process_num,
+                                         shard=FLAGS.shard,
+                                         duration_history_path=FLAGS.duration_history_path,
+                                         worker_start_method=FLAGS.worker_start_method)
         dst_cov_report_path = FLAGS.cov_path if FLAGS.cov_path else "./cov_report/ops/python_utest"
         dst_report_path = FLAGS.report_path if FLAGS.report_path else "./report/ops/python_report"
         shutil.copytree(cov_report_path, dst_cov_report_path)
@@ -482,7 +529,10 @@ def main(argv):
                                          cov_report_path=cov_report_path,
                                          simulator_mode="pv",
                                          simulator_lib_path=simulator_lib_path,
-                                         process_num=process_num)
+                                         process_num=process_num,
+                                         shard=FLAGS.shard,
+                                         duration_history_path=FLAGS.duration_history_path,
+                                         worker_start_method=FLAGS.worker_start_method)
         cube_cov_file = os.path.join(cov_report_path, ".coverage")
         if os.path.exists(cube_cov_file):
             if not os.path.exists(FLAGS.cov_path):
@@ -500,13 +550,30 @@ def main(argv):
         process_num = FLAGS.process_num
         res = op_ut_runner.run_ut(vector_case_dir,
                                   soc_version=soc_version,
-                                  test_report="json",
+                                  test_report=FLAGS.test_report,
                                   test_report_path=report_path,
-                                  cov_report="html",
+                                  cov_report=FLAGS.cov_report,
                                   cov_report_path=cov_report_path,
                                   simulator_mode="pv",
                                   simulator_lib_path=simulator_lib_path,
-                                  process_num=process_num)
+                                  process_num=process_num,
+                                  case_process_num=FLAGS.case_process_num,
+                                  shard=FLAGS.shard,
+                                  duration_history_path=FLAGS.duration_history_path,
+                                  worker_start_method=FLAGS.worker_start_method,
+                                  resume=FLAGS.resume,
+                                  case_timeout=FLAGS.case_timeout,
+                                  file_timeout=FLAGS.file_timeout,
+                                  last_failed=FLAGS.last_failed,
+                                  failed_first=FLAGS.failed_first,
+                                  memory_budget=FLAGS.memory_budget,
+                                  max_tasks_per_worker=FLAGS.max_tasks_per_worker,
+                                  max_worker_rss=FLAGS.max_worker_rss,
+                                  cov_fast=FLAGS.cov_fast,
+                                  simulator_slots=FLAGS.simulator_slots,
+                                  event_log_path=FLAGS.event_log,
+                                  result_store_path=FLAGS.result_store,
+                                  run_id=FLAGS.run_id)
         if res != op_status.SUCCESS:
             exit(-1)
 
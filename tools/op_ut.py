@@ -21,10 +21,16 @@ the op ut test main class: OpUT, BroadcaseOpUT, ElementwiseOpUT, ReduceOpUT
 import os
 import sys
 import ast
+import zlib
 import stat
 import json
+import time
 import inspect
+import threading
 import traceback
+import contextlib
+import multiprocessing
+from concurrent import futures
 from enum import Enum
 from typing import List
 from typing import Dict
@@ -44,6 +50,12 @@ from op_test_frame.utils import op_param_util
 from op_test_frame.utils import file_util
 from op_test_frame.ut import op_ut_case_info
 from op_test_frame.ut import ut_report
+from op_test_frame.ut import op_ut_cache
+from op_test_frame.ut import op_ut_data_writer
+from op_test_frame.ut import op_ut_compare
+from op_test_frame.ut import op_ut_func_cache
+from op_test_frame.ut import op_ut_journal
+from op_test_frame.ut import op_ut_sim_lease
 from op_test_frame.common.ascend_tbe_op import AscendOpKernel
 from op_test_frame.common.ascend_tbe_op import AscendOpKernelRunner
 
@@ -124,6 +136,54 @@ def get_trace_info() -> str:
     return "".join(trace_info)
 
 
+# op ut and run args of current parallel run_case, forked case worker processes inherit it
+_PARALLEL_RUN_CONTEXT = {}
+# data_generator draws from the numpy global random state, seeded generation holds it and restores it
+_GLOBAL_RANDOM_LOCK = threading.Lock()
+
+
+def _gen_seeded_data(shape, dtype, distribution, value_range, seed):
+    """
+    generate the random input data by a seed, not change the numpy global random state
+    """
+    if distribution == "uniform":
+        return np.random.RandomState(seed).uniform(value_range[0], value_range[1], shape).astype(dtype)
+    # other distributions are only implemented by data_generator, which uses the global random state
+    with _GLOBAL_RANDOM_LOCK:
+        random_state = np.random.get_state()
+        np.random.seed(seed)
+        try:
+            return data_generator.gen_data(data_shape=shape, min_value=value_range[0], max_value=value_range[1],
+                                           dtype=dtype, distribution=distribution)
+        finally:
+            np.random.set_state(random_state)
+
+
+def _run_case_task(task_arg) -> tuple:
+    """
+    run a group of cases in case worker process
+    :param task_arg: (case names of the task, shape bucket kernels compiled by the other case worker processes)
+    :return: (list of (case_name, case report json object), shape bucket kernels of this process)
+    """
+    case_name_list, shape_bucket_map = task_arg
+    op_ut_case = _PARALLEL_RUN_CONTEXT.get("op_ut")
+    run_soc_version = _PARALLEL_RUN_CONTEXT.get("run_soc_version")
+    run_cfg = _PARALLEL_RUN_CONTEXT.get("run_cfg")
+    # case events of the case worker processes not go to the case file worker's event pipe, they may interleave,
+    # the case end events are notified by the parent process
+    op_ut_case._case_event_func = None  # 'pylint: disable=protected-access
+    op_ut_case._shape_bucket_map.update(shape_bucket_map)  # 'pylint: disable=protected-access
+    task_res = []
+    for case_name in case_name_list:
+        case_info = op_ut_case.get_case_info(case_name)
+        case_rpt = op_ut_case._run_one_case(run_soc_version, case_info,  # 'pylint: disable=protected-access
+                                            run_cfg=run_cfg)
+        task_res.append((case_name, case_rpt.to_json_obj()))
+    # make sure the case data is written before the report return to parent process
+    op_ut_case._flush_data()  # 'pylint: disable=protected-access
+    return task_res, dict(op_ut_case._shape_bucket_map)  # 'pylint: disable=protected-access
+
+
 class OpUT:  # 'pylint: disable=too-many-instance-attributes
     """
         OpUT
@@ -173,6 +233,26 @@ class OpUT:  # 'pylint: disable=too-many-instance-attributes
         self._auto_gen_case_name_count = 0
         # key: case_name, value: case_info: OpUTCase
         self._case_info_map = {}
+        # kernel cache and input data cache of current run, set by run_case
+        self._kernel_cache = None
+        self._input_data_cache = None
+        # case data writer of current run, set by run_case
+        self._data_writer = None
+        # dynamic shape bucket of current run, key: shape bucket key, value: compiled kernel name
+        self._shape_bucket_map = {}
+        # key: case_name, value: the kernel name of the case's shape bucket
+        self._bucket_kernel_map = {}
+        self._enable_shape_bucket = True
+        # outputs which element count not less than this threshold use chunked compare, set by run_case
+        self._chunk_compare_threshold = op_ut_compare.Constant.DEFAULT_CHUNK_COMPARE_THRESHOLD
+        # journal of completed cases of current run, set by run_case
+        self._case_journal = None
+        # ut_report.JsonlReportWriter which each completed case of current run is appended to, set by run_case
+        self._case_report_writer = None
+        # case progress event function of current run, set by run_case
+        self._case_event_func = None
+        # start time of the running stage of the cases, to measure the stage duration
+        self._stage_start_map = {}
         caller = inspect.stack()[1]
         self.case_file = caller.filename
 
@@ -249,7 +329,12 @@ class OpUT:  # 'pylint: disable=too-many-instance-attributes
         self._case_info_map[case_info.case_name] = case_info
 
     @staticmethod
-    def _gen_input_data(param_info):
+    def _get_input_seed(case_name: str, input_idx: int) -> int:
+        # random input data seed is decided by case name, so the failed case can be reproduced
+        return zlib.crc32(("%s_input%d" % (case_name, input_idx)).encode())
+
+    @staticmethod
+    def _gen_input_data(param_info, seed=None, data_cache: op_ut_cache.InputDataCache = None):
         def _deal_data_path():
             input_data_path = param_info.get("data_path")
             if not isinstance(input_data_path, str):
@@ -257,17 +342,31 @@ class OpUT:  # 'pylint: disable=too-many-instance-attributes
             input_data_path = os.path.realpath(input_data_path)
             if not os.path.exists(input_data_path):
                 raise IOError("data_path is not exist, please check your case param, data_path: %s" % input_data_path)
-            data_type = str(param_info.get("dtype")).strip()
-            data_from_file = np.fromfile(input_data_path, data_type)
-            data_from_file_size = len(data_from_file)
+            data_type = np.dtype(str(param_info.get("dtype")).strip())
+            # data_offset and data_stride are counted by element, read data[offset::stride] from the file
+            data_offset = int(param_info.get("data_offset", 0))
+            data_stride = int(param_info.get("data_stride", 1))
+            if data_offset < 0 or data_stride < 1:
+                raise RuntimeError("data_offset(%d) should not less than 0 and data_stride(%d) should not less than 1"
+                                   % (data_offset, data_stride))
             param_shape = param_info.get("run_shape")
             if param_shape is None:
                 param_shape = param_info.get("shape")
             param_shape_size = shape_utils.calc_shape_size(param_shape)
+            if param_shape_size == 0:
+                param_info["value"] = np.empty(param_shape, data_type)
+                return
+            file_elem_cnt = os.path.getsize(input_data_path) // data_type.itemsize
+            data_from_file_size = max(file_elem_cnt - data_offset + data_stride - 1, 0) // data_stride
             if data_from_file_size < param_shape_size:
                 raise RuntimeError("Input data file size(%s) is len than shape size(%s), dtype is %s. " % (
                     data_from_file_size, param_shape_size, data_type))
-            param_info["value"] = data_from_file[:param_shape_size].reshape(param_shape)
+            # map the file copy on write, processes use the same input file share the page cache until
+            # a case writes its inputs, the writes stay in the process and the file is not changed
+            data_from_file = np.memmap(input_data_path, dtype=data_type, mode="c",
+                                       offset=data_offset * data_type.itemsize,
+                                       shape=((param_shape_size - 1) * data_stride + 1,))
+            param_info["value"] = data_from_file[::data_stride].reshape(param_shape)
 
         def _deal_no_param_data_path():
             if "value" in param_info.keys():
@@ -279,11 +378,23 @@ class OpUT:  # 'pylint: disable=too-many-instance-attributes
             if shape is None:
                 shape = param_info.get("shape")
             dtype = param_info.get("dtype")
-            data = data_generator.gen_data(data_shape=shape,
-                                           min_value=value_range[0],
-                                           max_value=value_range[1],
-                                           dtype=dtype,
-                                           distribution=distribution)
+            cache_key = None
+            if data_cache and seed is not None:
+                cache_key = data_cache.build_key(shape, dtype, distribution, value_range, seed)
+                data = data_cache.load(cache_key)
+                if data is not None:
+                    param_info["value"] = data
+                    return
+            if seed is not None:
+                data = _gen_seeded_data(shape, dtype, distribution, value_range, seed)
+            else:
+                data = data_generator.gen_data(data_shape=shape,
+                                               min_value=value_range[0],
+                                               max_value=value_range[1],
+                                               dtype=dtype,
+                                               distribution=distribution)
+            if cache_key:
+                data_cache.save(cache_key, data)
             param_info["value"] = data
 
         if "data_path" in param_info.keys():
@@ -347,12 +458,19 @@ class OpUT:  # 'pylint: disable=too-many-instance-attributes
         data_dir = os.path.realpath(data_dir)
         if not os.path.exists(data_dir):
             file_util.makedirs(data_dir, mode=Constant.DATA_DIR_MODES)
-        data_path = os.path.join(data_dir, file_name)
-        if not os.path.exists(data_path):
-            # create output data file with mode
-            with os.fdopen(os.open(data_path, Constant.DATA_FILE_FLAGS, Constant.DATA_FILE_MODES), 'w') as fout:
-                fout.write("")
-        return data_path
+        # the data file is created with mode by data writer
+        return os.path.join(data_dir, file_name)
+
+    def _write_data(self, data, data_path):
+        if self._data_writer:
+            self._data_writer.submit(data, data_path)
+        else:
+            op_ut_data_writer.write_data(data, data_path)
+
+    def _flush_data(self):
+        if self._data_writer:
+            return self._data_writer.flush()
+        return []
 
     def _save_data(self, run_soc_version, case_info: op_ut_case_info.OpUTCase, run_cfg: Dict = None):
 
@@ -360,7 +478,7 @@ class OpUT:  # 'pylint: disable=too-many-instance-attributes
             input_data_file_name = "%s_input%s.bin" % (case_info.case_name, str(idx))
             input_data_path = self._build_data_file(input_data_file_name, run_soc_version, run_cfg)
             one_param["data_path"] = input_data_path
-            one_param["value"].tofile(input_data_path)
+            self._write_data(one_param["value"], input_data_path)
 
         def _save_output_data(one_param, idx):
             output_data_file_name = "%s_output%s.bin" % (case_info.case_name, str(idx))
@@ -369,8 +487,8 @@ class OpUT:  # 'pylint: disable=too-many-instance-attributes
             expect_output_data_path = self._build_data_file(expect_output_data_file_name, run_soc_version, run_cfg)
             one_param["data_path"] = output_data_path
             one_param["expect_data_path"] = expect_output_data_path
-            one_param["value"].tofile(output_data_path)
-            one_param["expect_value"].tofile(expect_output_data_path)
+            self._write_data(one_param["value"], output_data_path)
+            self._write_data(one_param["expect_value"], expect_output_data_path)
 
         input_idx = 0
         output_idx = 0
@@ -496,35 +614,17 @@ class OpUT:  # 'pylint: disable=too-many-instance-attributes
             case_info_list.append(case_obj)
         return case_info_list
 
-    def _load_op_func(self):
-        try:
-            __import__(self.op_module_name)
-        except (ImportError, ModuleNotFoundError) as _:
-            # custom op and inner op both have parent dir impl，
-            # so when python_path contains two impl's parent dir,
-            # we need to add either impl dir to python_path
-            for dir_item in sys.path:
-                impl_dir = os.path.join(dir_item, "impl")
-                if os.path.exists(impl_dir):
-                    sys.path.append(impl_dir)
-            self.op_module_name = self.op_module_name.replace("impl.", "")
-            try:
-                __import__(self.op_module_name)
-            except (ImportError, ModuleNotFoundError) as _:
-                err_msg = "Can't import op module, please check you python path"
-                err_msg += ", op module name: %s" % self.op_module_name
-                err_trace = get_trace_info()
-                err_msg += ", err_trace: %s" % err_trace
-                return None, err_msg
-
-        op_module = sys.modules[self.op_module_name]
-        op_func = getattr(op_module, self.op_func_name)
-        if not op_func:
-            err_msg = "can't get op function in op module,"
-            err_msg += " op module name: %s, op function name: %s" % (self.op_module_name, self.op_func_name)
-            return None, err_msg
+    def get_case_info(self, case_name: str):
+        """
+        get case info by case name
+        :param case_name: case name
+        :return: OpUTCase or OpUTCustomCase, None if not found
+        """
+        return self._case_info_map.get(case_name)
 
-        return op_func, None
+    def _load_op_func(self):
+        _, op_func, err_msg = op_ut_func_cache.resolve_op_func(self.op_module_name, self.op_func_name)
+        return op_func, err_msg
 
     @staticmethod
     def _check_kernel_so_exist(kernel_meta_dir, kernel_name):
@@ -538,6 +638,13 @@ class OpUT:  # 'pylint: disable=too-many-instance-attributes
     def _get_kernel_name(run_soc_version: str, case_info: op_ut_case_info.OpUTCase) -> str:
         return "_".join([case_info.case_name, run_soc_version.lower()])
 
+    def _get_run_kernel_name(self, run_soc_version: str, case_info: op_ut_case_info.OpUTCase) -> str:
+        # dynamic shape case in a shape bucket run with the kernel compiled by the first case of the bucket
+        bucket_kernel_name = self._bucket_kernel_map.get(case_info.case_name)
+        if bucket_kernel_name:
+            return bucket_kernel_name
+        return self._get_kernel_name(run_soc_version, case_info)
+
     @staticmethod
     def _get_compile_info_file_name(kernel_name):
         return kernel_name + "_compile_info.json"
@@ -617,37 +724,105 @@ class OpUT:  # 'pylint: disable=too-many-instance-attributes
 
         return call_op_success, err_msg
 
+    def _get_shape_bucket_key(self, case_info: op_ut_case_info.OpUTCase):
+        """
+        dynamic shape precision cases which have the same params except run_shape can share one kernel,
+        they only differ in tiling
+        """
+        if not self._enable_shape_bucket or self.imply_type != OpImplyType.DYNAMIC_SHAPE:
+            return None
+        if case_info.case_usage != op_ut_case_info.CaseUsage.PRECISION or case_info.expect != op_status.SUCCESS:
+            return None
+        if not self._hase_dynamic_shape(case_info.op_params):
+            return None
+        # the run fills "value" of op_params, it is a runtime only key, so the next soc gets the same bucket
+        ignore_keys = op_ut_cache.Constant.RUNTIME_ONLY_PARAM_KEYS + op_ut_cache.Constant.RUN_SHAPE_PARAM_KEYS
+        addition_params = dict(case_info.addition_params) if case_info.addition_params else {}
+        addition_params.pop("kernel_name", None)
+        try:
+            return "\n".join([op_ut_cache.normalize_params(case_info.op_params, ignore_keys),
+                              op_ut_cache.normalize_params(addition_params, ignore_keys)])
+        except TypeError as key_err:
+            logger.log_warn("case %s not share shape bucket kernel, %s" % (case_info.case_name, key_err))
+            return None
+
+    def _get_kernel_cache_key(self, run_soc_version: str, case_info: op_ut_case_info.OpUTCase):
+        # only cache the kernel which expect compile success
+        if not self._kernel_cache or case_info.expect != op_status.SUCCESS:
+            return None
+        addition_params = dict(case_info.addition_params) if case_info.addition_params else {}
+        addition_params["kernel_name"] = self._get_kernel_name(run_soc_version, case_info)
+        op_module, _, _ = op_ut_func_cache.resolve_op_func(self.op_module_name, self.op_func_name)
+        try:
+            return self._kernel_cache.build_key(op_module=op_module,
+                                                op_func_name=self.op_func_name,
+                                                run_soc_version=run_soc_version,
+                                                imply_type=self.imply_type.value,
+                                                op_params=case_info.op_params,
+                                                addition_params=addition_params)
+        except TypeError as key_err:
+            logger.log_warn("case %s not use kernel cache, %s" % (case_info.case_name, key_err))
+            return None
+
     def _compile_op_kernel(self, run_soc_version, case_info: op_ut_case_info.OpUTCase, check_exist=False):
         op_func, load_err_msg = self._load_op_func()
         if not op_func:
-            return False, load_err_msg
-        call_success, err_msg = self._call_op_func(run_soc_version=run_soc_version,
-                                                   op_func=op_func,
-                                                   case_info=case_info,
-                                                   check_exist=check_exist)
-        return call_success, err_msg
+            return False, load_err_msg, {}
+        kernel_name = self._get_kernel_name(run_soc_version, case_info)
+        compile_result = {}
+        bucket_key = self._get_shape_bucket_key(case_info)
+        if bucket_key:
+            bucket_kernel_name = self._shape_bucket_map.get(bucket_key)
+            if bucket_kernel_name:
+                self._bucket_kernel_map[case_info.case_name] = bucket_kernel_name
+                compile_result[op_ut_cache.Constant.SHAPE_BUCKET_RESULT_KEY] = bucket_kernel_name
+                return True, None, compile_result
+
+        call_success = True
+        err_msg = None
+        cache_key = self._get_kernel_cache_key(run_soc_version, case_info)
+        if cache_key and self._kernel_cache.restore(cache_key, self.KERNEL_DIR, kernel_name):
+            compile_result[op_ut_cache.Constant.KERNEL_CACHE_RESULT_KEY] = op_ut_cache.Constant.CACHE_HIT
+        else:
+            call_success, err_msg = self._call_op_func(run_soc_version=run_soc_version,
+                                                       op_func=op_func,
+                                                       case_info=case_info,
+                                                       check_exist=check_exist)
+            if cache_key:
+                compile_result[op_ut_cache.Constant.KERNEL_CACHE_RESULT_KEY] = op_ut_cache.Constant.CACHE_MISS
+            if cache_key and call_success:
+                self._kernel_cache.store(cache_key, self.KERNEL_DIR, kernel_name)
+
+        if bucket_key and call_success:
+            self._shape_bucket_map[bucket_key] = kernel_name
+        return call_success, err_msg, compile_result
 
     def _run_compile_stage(self, run_soc_version,
                            case_info: op_ut_case_info.OpUTCase,
                            check_exist=False) -> op_ut_case_info.OpUTStageResult:
-        compile_success, compile_err_msg = self._compile_op_kernel(run_soc_version,
-                                                                   case_info=case_info,
-                                                                   check_exist=check_exist)
+        self._notify_case_event(op_ut_case_info.Constant.CASE_EVENT_STAGE, case_info.case_name,
+                                stage_name=op_ut_case_info.Constant.STAGE_COMPILE)
+        compile_success, compile_err_msg, compile_result = self._compile_op_kernel(run_soc_version,
+                                                                                   case_info=case_info,
+                                                                                   check_exist=check_exist)
+        stage_result = compile_result if compile_result else None
         if not compile_success:
             stage_status = op_ut_case_info.OpUTStageResult(status=op_status.FAILED,
                                                            stage_name=op_ut_case_info.Constant.STAGE_COMPILE,
+                                                           result=stage_result,
                                                            err_msg="Failed",
                                                            err_trace=compile_err_msg)
         else:
             stage_status = op_ut_case_info.OpUTStageResult(status=op_status.SUCCESS,
-                                                           stage_name=op_ut_case_info.Constant.STAGE_COMPILE)
+                                                           stage_name=op_ut_case_info.Constant.STAGE_COMPILE,
+                                                           result=stage_result)
         return stage_status
 
     def _run_compile_case(self, run_soc_version,
                           case_info: op_ut_case_info.OpUTCase) -> ut_report.OpUTCaseReport:
         case_trace = op_ut_case_info.OpUTCaseTrace(run_soc_version, case_info)
         stage_status = self._run_compile_stage(run_soc_version, case_info)
-        case_trace.add_stage_result(stage_status)
+        self._add_stage_result(case_trace, stage_status)
         return ut_report.OpUTCaseReport(case_trace)
 
     @staticmethod
@@ -675,7 +850,7 @@ class OpUT:  # 'pylint: disable=too-many-instance-attributes
     def _do_tiling(self, run_soc_version: str, case_info: op_ut_case_info.OpUTCase,
                    input_info_list: List, output_info_list: List):
         from tbe.common.utils import op_tiling # 'pylint: disable=import-outside-toplevel
-        kernel_name = self._get_kernel_name(run_soc_version, case_info)
+        kernel_name = self._get_run_kernel_name(run_soc_version, case_info)
         compile_info = self._get_compile_info(kernel_name)
         tiling_info = op_tiling.do_op_tiling(self.op_type, compile_info=compile_info,
                                              inputs=input_info_list, outputs=output_info_list)
@@ -778,7 +953,7 @@ class OpUT:  # 'pylint: disable=too-many-instance-attributes
         input_list = []
         output_list = []
         op_func, _ = self._load_op_func()
-        param_desc_list, param_name_list = self._get_op_param_desc_info(op_func)
+        param_desc_list, param_name_list = op_ut_func_cache.get_op_signature(op_func, self._get_op_param_desc_info)
         param_desc_list = self._check_and_fix_param_desc(param_desc_list, op_params)
         if len(param_name_list) < len(param_desc_list):
             raise RuntimeError("Op params in testcase not match the op interface check_op_params decorator.")
@@ -790,22 +965,25 @@ class OpUT:  # 'pylint: disable=too-many-instance-attributes
         return input_list, output_list
 
     def _run_kernel(self, run_soc_version: str, case_info: op_ut_case_info.OpUTCase, run_cfg: Dict[str, Any] = None):
-        bin_path = os.path.join(OpUT.KERNEL_DIR, self._get_kernel_name(run_soc_version, case_info) + ".o")
-        json_path = os.path.join(OpUT.KERNEL_DIR, self._get_kernel_name(run_soc_version, case_info) + ".json")
+        kernel_name = self._get_run_kernel_name(run_soc_version, case_info)
+        bin_path = os.path.join(OpUT.KERNEL_DIR, kernel_name + ".o")
+        json_path = os.path.join(OpUT.KERNEL_DIR, kernel_name + ".json")
         input_info_list, output_info_list = self._get_input_outputs(case_info.op_params)
         input_data_list = []
-        for input_info in input_info_list:
-            self._gen_input_data(input_info)
+        for input_idx, input_info in enumerate(input_info_list):
+            self._gen_input_data(input_info, seed=self._get_input_seed(case_info.case_name, input_idx),
+                                 data_cache=self._input_data_cache)
             input_data_list.append(input_info.get("value"))
         op_kernel = AscendOpKernel(bin_path, json_path)
         op_kernel.set_input_info(input_info_list)
         op_kernel.set_output_info(output_info_list)
         simulator_mode = self._get_simulator_mode(run_cfg)
         simulator_dump_path = self._get_simulator_dump_path(simulator_mode, case_info.case_name, run_cfg)
-        with AscendOpKernelRunner(simulator_mode=simulator_mode,
-                                  soc_version=run_soc_version,
-                                  simulator_lib_path=self._get_simulator_lib_path(run_cfg),
-                                  simulator_dump_path=simulator_dump_path) as runner:
+        with self._get_simulator_lease(simulator_mode, run_cfg), \
+                AscendOpKernelRunner(simulator_mode=simulator_mode,
+                                     soc_version=run_soc_version,
+                                     simulator_lib_path=self._get_simulator_lib_path(run_cfg),
+                                     simulator_dump_path=simulator_dump_path) as runner:
             if self.imply_type == OpImplyType.DYNAMIC_SHAPE:
                 op_kernel.set_compile_info({})
                 tiling_inputs, tiling_outputs = self._build_tiling_args(case_info.op_params)
@@ -827,8 +1005,19 @@ class OpUT:  # 'pylint: disable=too-many-instance-attributes
         for idx, output_info in enumerate(output_info_list):
             output_info["value"] = output_data_list[idx].get_data()
 
+    @staticmethod
+    def _get_simulator_lease(simulator_mode, run_cfg: Dict[str, Any] = None):
+        if not isinstance(run_cfg, dict) or not run_cfg.get("simulator_lease_dir"):
+            return contextlib.nullcontext()
+        slot_num = op_ut_sim_lease.get_slot_num(simulator_mode, run_cfg.get("simulator_slot_num"))
+        if slot_num == 0:
+            return contextlib.nullcontext()
+        return op_ut_sim_lease.SimulatorLease(run_cfg.get("simulator_lease_dir"), simulator_mode, slot_num)
+
     def _run_model_run_stage(self, run_soc_version, case_info: op_ut_case_info.OpUTCase,
                              run_cfg: Dict[str, Any] = None) -> op_ut_case_info.OpUTStageResult:
+        self._notify_case_event(op_ut_case_info.Constant.CASE_EVENT_STAGE, case_info.case_name,
+                                stage_name=op_ut_case_info.Constant.STAGE_RUN)
         run_success = True
         err_msg = None
         try:
@@ -867,39 +1056,55 @@ class OpUT:  # 'pylint: disable=too-many-instance-attributes
         return True, None
 
     def _run_gen_expect_stage(self, case_info: op_ut_case_info.OpUTCase) -> op_ut_case_info.OpUTStageResult:
+        self._notify_case_event(op_ut_case_info.Constant.CASE_EVENT_STAGE, case_info.case_name,
+                                stage_name=op_ut_case_info.Constant.STAGE_GEN_EXPECT)
         try:
             gen_success, err_msg = self._gen_expect_data(case_info)
         except BaseException as _:  # 'pylint: disable=broad-except
             gen_success = False
             err_msg = get_trace_info()
         stage_status = op_ut_case_info.OpUTStageResult(status=op_status.SUCCESS if gen_success else op_status.FAILED,
-                                                       stage_name=op_ut_case_info.Constant.STAGE_RUN,
+                                                       stage_name=op_ut_case_info.Constant.STAGE_GEN_EXPECT,
                                                        err_msg="Failed" if not gen_success else None,
                                                        err_trace=err_msg)
         return stage_status
 
+    def _compare_one_output(self, idx, output, precision_standard):
+        expect_tensor = output.get("expect_value")
+        actual_tensor = output.get("value")
+        if expect_tensor.shape != actual_tensor.shape:
+            return False, "output %d 's shape is not same, expect: [%s], actual: [%s]\n" % (
+                idx, ",".join([str(x) for x in expect_tensor.shape]),
+                ",".join([str(x) for x in actual_tensor.shape]))
+        if expect_tensor.size >= self._chunk_compare_threshold:
+            cmp_res = op_ut_compare.compare_precision_chunked(actual_tensor, expect_tensor,
+                                                              precision_standard=precision_standard)
+        else:
+            cmp_res = precision_compare_util.compare_precision(actual_tensor, expect_tensor,
+                                                               precision_standard=precision_standard)
+        if cmp_res.status != op_status.SUCCESS:
+            return False, "output %d precision compare failed, detail msg: %s" % (idx, cmp_res.err_msg)
+        return True, ""
+
     def _compare_output(self, case_info: op_ut_case_info.OpUTCase):
         output_list = self._get_outputs(case_info.op_params)
-        err_msg = ""
-        compare_success = True
-        for idx, output in enumerate(output_list):
-            expect_tensor = output.get("expect_value")
-            actual_tensor = output.get("value")
-            if expect_tensor.shape != actual_tensor.shape:
-                compare_success = False
-                err_msg += "output %d 's shape is not same, expect: [%s], actual: [%s]\n" % (
-                    idx, ",".join([str(x) for x in expect_tensor.shape]),
-                    ",".join([str(x) for x in actual_tensor.shape]))
-                continue
-            cmp_res = precision_compare_util.compare_precision(output.get("value"),
-                                                               output.get("expect_value"),
-                                                               precision_standard=case_info.precision_standard)
-            if cmp_res.status != op_status.SUCCESS:
-                compare_success = False
-                err_msg += "output %d precision compare failed, detail msg: %s" % (idx, cmp_res.err_msg)
+        if len(output_list) > 1:
+            # numpy releases GIL in the element wise compare, compare outputs concurrently
+            with futures.ThreadPoolExecutor(max_workers=min(len(output_list), os.cpu_count() or 1)) as executor:
+                cmp_res_list = list(executor.map(
+                    lambda idx_output: self._compare_one_output(idx_output[0], idx_output[1],
+                                                                case_info.precision_standard),
+                    enumerate(output_list)))
+        else:
+            cmp_res_list = [self._compare_one_output(idx, output, case_info.precision_standard)
+                            for idx, output in enumerate(output_list)]
+        compare_success = all(cmp_success for cmp_success, _ in cmp_res_list)
+        err_msg = "".join(cmp_err_msg for _, cmp_err_msg in cmp_res_list)
         return compare_success, err_msg
 
     def _run_data_compare_stage(self, case_info: op_ut_case_info.OpUTCase):
+        self._notify_case_event(op_ut_case_info.Constant.CASE_EVENT_STAGE, case_info.case_name,
+                                stage_name=op_ut_case_info.Constant.STAGE_COMPARE_PRECISION)
         compare_success, err_msg = self._compare_output(case_info)
         stage_status = op_ut_case_info.OpUTStageResult(
             status=op_status.SUCCESS if compare_success else op_status.FAILED,
@@ -919,27 +1124,32 @@ class OpUT:  # 'pylint: disable=too-many-instance-attributes
                             run_cfg: Dict[str, Any] = None) -> ut_report.OpUTCaseReport:
         case_trace = op_ut_case_info.OpUTCaseTrace(run_soc_version, case_info)
         compile_stage_status = self._run_compile_stage(run_soc_version, case_info, check_exist=True)
-        case_trace.add_stage_result(compile_stage_status)
+        self._add_stage_result(case_trace, compile_stage_status)
         if compile_stage_status.status != op_status.SUCCESS:
             return ut_report.OpUTCaseReport(case_trace)
 
         run_stage_status = self._run_model_run_stage(run_soc_version, case_info, run_cfg)
-        case_trace.add_stage_result(run_stage_status)
+        self._add_stage_result(case_trace, run_stage_status)
         if run_stage_status.status != op_status.SUCCESS or not self._check_need_run_expect(run_cfg):
             return ut_report.OpUTCaseReport(case_trace)
 
         gen_expect_stage_status = self._run_gen_expect_stage(case_info)
-        case_trace.add_stage_result(gen_expect_stage_status)
+        self._add_stage_result(case_trace, gen_expect_stage_status)
         if gen_expect_stage_status.status != op_status.SUCCESS:
             return ut_report.OpUTCaseReport(case_trace)
 
-        compare_stage_status = self._run_data_compare_stage(case_info)
-        case_trace.add_stage_result(compare_stage_status)
+        # the data files are written in background while comparing, and all written before the case report
         self._save_data(run_soc_version, case_info, run_cfg)
+        compare_stage_status = self._run_data_compare_stage(case_info)
+        self._add_stage_result(case_trace, compare_stage_status)
+        save_err_msg_list = self._flush_data()
+        if save_err_msg_list:
+            self._add_stage_result(case_trace, op_ut_case_info.OpUTStageResult(
+                status=op_status.FAILED, stage_name=op_ut_case_info.Constant.STAGE_SAVE_DATA,
+                err_msg="\n".join(save_err_msg_list)))
         return ut_report.OpUTCaseReport(case_trace)
 
-    @staticmethod
-    def _run_custom_case(run_soc_version: str,
+    def _run_custom_case(self, run_soc_version: str,
                          case_info: op_ut_case_info.OpUTCustomCase) -> ut_report.OpUTCaseReport:
         run_success = True
         err_trace = None
@@ -956,11 +1166,17 @@ class OpUT:  # 'pylint: disable=too-many-instance-attributes
             err_msg=None if run_success else "Failed",
             err_trace=err_trace)
         case_trace = op_ut_case_info.OpUTCaseTrace(run_soc_version, case_info)
-        case_trace.add_stage_result(stage_status)
+        self._add_stage_result(case_trace, stage_status)
         return ut_report.OpUTCaseReport(case_trace)
 
     def _run_one_case(self, run_soc_version, case_info: op_ut_case_info.OpUTCase,
                       run_cfg: Dict[str, Any] = None) -> ut_report.OpUTCaseReport:
+        start_time = time.time()
+        self._notify_case_event(op_ut_case_info.Constant.CASE_EVENT_START, case_info.case_name,
+                                case_info=case_info.to_json_obj())
+        if case_info.case_usage == op_ut_case_info.CaseUsage.CUSTOM:
+            self._notify_case_event(op_ut_case_info.Constant.CASE_EVENT_STAGE, case_info.case_name,
+                                    stage_name=op_ut_case_info.Constant.STAGE_CUST_FUNC)
         try:
             case_rpt = None
             if case_info.case_usage == op_ut_case_info.CaseUsage.IMPL:
@@ -977,8 +1193,11 @@ class OpUT:  # 'pylint: disable=too-many-instance-attributes
                 err_msg="Error",
                 err_trace=err_trace)
             case_trace = op_ut_case_info.OpUTCaseTrace(run_soc_version, case_info)
-            case_trace.add_stage_result(stage_status)
+            self._add_stage_result(case_trace, stage_status)
             case_rpt = ut_report.OpUTCaseReport(case_trace)
+        self._stage_start_map.pop(case_info.case_name, None)
+        if case_rpt:
+            case_rpt.duration = round(time.time() - start_time, 3)
         return case_rpt
 
     @staticmethod
@@ -987,6 +1206,146 @@ class OpUT:  # 'pylint: disable=too-many-instance-attributes
         from te.platform import te_set_version  # 'pylint: disable=import-outside-toplevel
         te_set_version(run_soc_version)
 
+    def _get_run_case_list(self, one_soc_version: str, case_name_list: List[str] = None,
+                           case_usage_list: List = None) -> List:
+        run_case_list = []
+        for case_name, case_info in self._case_info_map.items():
+            if not case_info.check_support_soc(one_soc_version):
+                continue
+            if case_name_list and not case_name in case_name_list:
+                continue
+            if case_usage_list and not case_info.case_usage in case_usage_list:
+                continue
+            run_case_list.append(case_info)
+        return run_case_list
+
+    @staticmethod
+    def _get_case_status_str(case_rpt: ut_report.OpUTCaseReport) -> str:
+        if case_rpt.status == op_status.SUCCESS:
+            return "ok"
+        if case_rpt.status == op_status.FAILED:
+            return "fail"
+        return "error"
+
+    @staticmethod
+    def _get_case_process_num(run_cfg: Dict[str, Any], case_cnt: int) -> int:
+        if not isinstance(run_cfg, dict):
+            return 1
+        case_process_num = min(int(run_cfg.get("case_process_num") or 1), case_cnt)
+        if case_process_num <= 1:
+            return 1
+        if "fork" not in multiprocessing.get_all_start_methods():
+            logger.log_warn("case_process_num is %d, but fork is not supported, run cases one by one"
+                            % case_process_num)
+            return 1
+        if multiprocessing.current_process().daemon:
+            logger.log_warn("case_process_num is %d, but daemonic process can't create case worker process, "
+                            "run cases one by one" % case_process_num)
+            return 1
+        return case_process_num
+
+    def _build_parallel_task_list(self, run_case_list: List):
+        """
+        the first case of a dynamic shape bucket compiles the kernel, the other cases of the bucket wait for it
+        and then run one case a task, so that a big bucket also runs in parallel
+        :return: (first task list, key: bucket key, value: case names wait for the bucket kernel)
+        """
+        first_task_list = []
+        bucket_wait_map = {}
+        for case_info in run_case_list:
+            bucket_key = self._get_shape_bucket_key(case_info)
+            if bucket_key and bucket_key in bucket_wait_map:
+                bucket_wait_map[bucket_key].append(case_info.case_name)
+                continue
+            if bucket_key:
+                bucket_wait_map[bucket_key] = []
+            first_task_list.append([case_info.case_name])
+        return first_task_list, bucket_wait_map
+
+    def _run_cases_parallel(self, run_soc_version: str, run_case_list: List, case_process_num: int,
+                            run_cfg: Dict[str, Any] = None) -> List[ut_report.OpUTCaseReport]:
+        # import op module before fork, so that case worker processes not need import it again
+        self._load_op_func()
+        first_task_list, bucket_wait_map = self._build_parallel_task_list(run_case_list)
+        _PARALLEL_RUN_CONTEXT["op_ut"] = self
+        _PARALLEL_RUN_CONTEXT["run_soc_version"] = run_soc_version
+        _PARALLEL_RUN_CONTEXT["run_cfg"] = run_cfg
+        print("run %d cases in %d case worker processes" % (len(run_case_list), case_process_num))
+        case_rpt_map = {}
+
+        def _add_task_res(task_res):
+            for case_name, case_rpt_json in task_res:
+                case_rpt = ut_report.OpUTCaseReport.parser_json_obj(case_rpt_json)
+                case_rpt_map[case_name] = case_rpt
+                self._record_case(run_soc_version, case_rpt)
+                print("%s (%s) (%s) ... %s" % (case_name, self.op_type,
+                                               self.get_case_info(case_name).case_usage.value,
+                                               self._get_case_status_str(case_rpt)))
+
+        try:
+            with multiprocessing.get_context("fork").Pool(processes=case_process_num) as pool:
+                wait_results = []
+                first_tasks = [(case_names, {}) for case_names in first_task_list]
+                for task_res, shape_bucket_map in pool.imap_unordered(_run_case_task, first_tasks):
+                    _add_task_res(task_res)
+                    self._shape_bucket_map.update(shape_bucket_map)
+                    bucket_key = self._get_shape_bucket_key(self.get_case_info(task_res[0][0]))
+                    # the waiting cases of the bucket compile by themselves if the first case not get the kernel
+                    for case_name in bucket_wait_map.pop(bucket_key, []) if bucket_key else []:
+                        wait_results.append(pool.apply_async(_run_case_task,
+                                                             (([case_name], dict(self._shape_bucket_map)),)))
+                for wait_res in wait_results:
+                    _add_task_res(wait_res.get()[0])
+        finally:
+            _PARALLEL_RUN_CONTEXT.clear()
+        return [case_rpt_map[case_info.case_name] for case_info in run_case_list]
+
+    @staticmethod
+    def _order_failed_cases(run_case_list, run_cfg: Dict[str, Any] = None):
+        if not isinstance(run_cfg, dict) or not run_cfg.get("failed_case_mode"):
+            return run_case_list
+        failed_case_names = set(run_cfg.get("failed_case_names") or [])
+        if not failed_case_names:
+            return run_case_list
+        failed_case_list = [case_info for case_info in run_case_list if case_info.case_name in failed_case_names]
+        if run_cfg.get("failed_case_mode") == op_ut_case_info.Constant.FAILED_MODE_LAST_FAILED:
+            return failed_case_list
+        return failed_case_list + [case_info for case_info in run_case_list
+                                   if case_info.case_name not in failed_case_names]
+
+    def _add_stage_result(self, case_trace: op_ut_case_info.OpUTCaseTrace,
+                          stage_res: op_ut_case_info.OpUTStageResult):
+        start_time = self._stage_start_map.pop(case_trace.ut_case_info.case_name, None)
+        if stage_res.duration is None and start_time is not None:
+            stage_res.duration = round(time.time() - start_time, 3)
+        case_trace.add_stage_result(stage_res)
+        self._notify_case_event(op_ut_case_info.Constant.CASE_EVENT_STAGE_END, case_trace.ut_case_info.case_name,
+                                stage_name=stage_res.stage_name, status=stage_res.status)
+
+    def _notify_case_event(self, event_type, case_name, **event_info):
+        if event_type == op_ut_case_info.Constant.CASE_EVENT_STAGE:
+            self._stage_start_map[case_name] = time.time()
+        if self._case_event_func:
+            self._case_event_func(event_type, case_name=case_name, **event_info)
+
+    def _record_case(self, run_soc_version: str, case_rpt: ut_report.OpUTCaseReport):
+        self._notify_case_event(op_ut_case_info.Constant.CASE_EVENT_END, case_rpt.case_name,
+                                case_report=case_rpt.to_json_obj())
+        if self._case_report_writer:
+            try:
+                self._case_report_writer.add_case_report(case_rpt)
+            except OSError as write_err:
+                logger.log_warn("write case to report failed, case name: %s, error msg: %s" % (
+                    case_rpt.case_name, write_err))
+        if not self._case_journal:
+            return
+        try:
+            self._case_journal.append_case(self.case_file, run_soc_version, case_rpt.case_name,
+                                           case_rpt.to_json_obj())
+        except OSError as journal_err:
+            logger.log_warn("record case to journal failed, case name: %s, error msg: %s" % (
+                case_rpt.case_name, journal_err))
+
     def run_case(self, one_soc_version: str, case_name_list: List[str] = None,
                  case_usage_list: List = None, run_cfg: Dict[str, Any] = None) -> ut_report.OpUTReport:
         """
@@ -1001,7 +1360,21 @@ class OpUT:  # 'pylint: disable=too-many-instance-attributes
         case_usage_list: List, default is None
             only run the cases which's caseusage in this list, default None means run all.
         run_cfg: Dict[str, Any]
-            run configuration, like: simulator_mode, simulator_lib_path, simulator_dump_path, data_dump_path
+            run configuration, like: simulator_mode, simulator_lib_path, simulator_dump_path, data_dump_path,
+            kernel_cache_dir, dynamic_shape_bucket(default True, dynamic shape precision cases which only differ
+            in run_shape compile once), case_process_num(default 1, when bigger than 1 run cases in forked
+            case worker processes), input_data_cache_dir, data_write_queue_size(default 16, max count of the
+            data waiting to be written by the background data writer), chunk_compare_threshold(outputs which
+            element count not less than it are compared block by block, default 16M), case_journal_path(append
+            each completed case to this op_ut_journal.RunJournal), skip_case_names(cases to skip, e.g. the
+            journaled cases of a resumed run), case_report_writer(append each completed case to this
+            ut_report.JsonlReportWriter), case_event_func(called as case_event_func(event_type, case_name=..,
+            **event_info) when a case starts, a case stage starts or ends and a case ends, event types are
+            CASE_EVENT_* of op_ut_case_info.Constant), failed_case_names(the failed or error cases of the last run),
+            failed_case_mode(FAILED_MODE_LAST_FAILED to run only failed_case_names, FAILED_MODE_FAILED_FIRST to
+            run failed_case_names before the other cases), simulator_lease_dir(lease a simulator slot in this
+            directory before run kernel, see op_ut_sim_lease), simulator_slot_num(simulator slot count, default is
+            DEFAULT_SLOT_NUM of op_ut_sim_lease.Constant)
 
         Returns
         -------
@@ -1009,32 +1382,55 @@ class OpUT:  # 'pylint: disable=too-many-instance-attributes
             run report
         """
         self._set_run_soc(one_soc_version)
+        self._kernel_cache = op_ut_cache.get_kernel_cache(run_cfg)
+        self._input_data_cache = op_ut_cache.get_input_data_cache(run_cfg)
+        data_write_queue_size = op_ut_data_writer.Constant.DEFAULT_QUEUE_SIZE
+        if isinstance(run_cfg, dict):
+            data_write_queue_size = run_cfg.get("data_write_queue_size", data_write_queue_size)
+        self._data_writer = op_ut_data_writer.AsyncDataWriter(max_queue_size=data_write_queue_size)
+        self._shape_bucket_map = {}
+        self._bucket_kernel_map = {}
+        self._enable_shape_bucket = True
+        if isinstance(run_cfg, dict):
+            self._enable_shape_bucket = run_cfg.get("dynamic_shape_bucket", True)
+        self._chunk_compare_threshold = op_ut_compare.Constant.DEFAULT_CHUNK_COMPARE_THRESHOLD
+        if isinstance(run_cfg, dict) and run_cfg.get("chunk_compare_threshold") is not None:
+            self._chunk_compare_threshold = int(run_cfg.get("chunk_compare_threshold"))
+        self._case_journal = None
+        self._case_event_func = None
+        skip_case_names = set()
+        if isinstance(run_cfg, dict):
+            self._case_event_func = run_cfg.get("case_event_func")
+            self._case_report_writer = run_cfg.get("case_report_writer")
+            if run_cfg.get("case_journal_path"):
+                self._case_journal = op_ut_journal.RunJournal(run_cfg.get("case_journal_path"))
+            skip_case_names = set(run_cfg.get("skip_case_names") or [])
         print("%s test start running..." % self.op_type)
-        case_cnt = 0
-        success_cnt = 0
-        fail_cnt = 0
-        err_cnt = 0
         total_rpt = ut_report.OpUTReport()
-        for case_name, case_info in self._case_info_map.items():
-            if not case_info.check_support_soc(one_soc_version):
-                continue
-            if case_name_list and not case_name in case_name_list:
-                continue
-            if case_usage_list and not case_info.case_usage in case_usage_list:
-                continue
-            print("%s (%s) (%s) ... " % (case_name, self.op_type, case_info.case_usage.value), end="")
-            case_cnt += 1
-            case_rpt = self._run_one_case(one_soc_version, case_info, run_cfg=run_cfg)
-            total_rpt.add_case_report(case_rpt)
-            if case_rpt.status == op_status.SUCCESS:
-                success_cnt += 1
-                print("ok")
-            elif case_rpt.status == op_status.FAILED:
-                fail_cnt += 1
-                print("fail")
+        run_case_list = self._get_run_case_list(one_soc_version, case_name_list, case_usage_list)
+        run_case_list = [case_info for case_info in run_case_list if case_info.case_name not in skip_case_names]
+        run_case_list = self._order_failed_cases(run_case_list, run_cfg)
+        case_process_num = self._get_case_process_num(run_cfg, len(run_case_list))
+        try:
+            if case_process_num > 1:
+                for case_rpt in self._run_cases_parallel(one_soc_version, run_case_list, case_process_num,
+                                                         run_cfg):
+                    total_rpt.add_case_report(case_rpt)
             else:
-                err_cnt += 1
-                print("error")
+                for case_info in run_case_list:
+                    print("%s (%s) (%s) ... " % (case_info.case_name, self.op_type, case_info.case_usage.value),
+                          end="")
+                    case_rpt = self._run_one_case(one_soc_version, case_info, run_cfg=run_cfg)
+                    total_rpt.add_case_report(case_rpt)
+                    self._record_case(one_soc_version, case_rpt)
+                    print(self._get_case_status_str(case_rpt))
+        finally:
+            # each case flushes its data before its report, stop the writer thread even if a case raises
+            self._data_writer.close()
+        case_cnt = total_rpt.total_cnt
+        success_cnt = total_rpt.success_cnt
+        fail_cnt = total_rpt.failed_cnt
+        err_cnt = case_cnt - success_cnt - fail_cnt
         print("\n\n----------------------------------")
         summary_msg = "run %d tests, success: %d" % (case_cnt, success_cnt)
         if fail_cnt > 0:
@@ -1044,13 +1440,14 @@ class OpUT:  # 'pylint: disable=too-many-instance-attributes
         print(summary_msg)
         return total_rpt
 
-    def run(self, soc, case_name=None, simulator_mode=None, simulator_lib_path=None):
+    def run(self, soc, case_name=None, simulator_mode=None, simulator_lib_path=None, case_process_num=1):
         """
         run ut
         :param soc: soc version, one soc or a soc list
         :param case_name: case name, if none will run all test case
         :param simulator_mode: support "pv", "tm"
         :param simulator_lib_path: simulator library path
+        :param case_process_num: case worker process count, default is 1, run cases one by one
         :return: None
         """
         if simulator_mode:
@@ -1061,7 +1458,8 @@ class OpUT:  # 'pylint: disable=too-many-instance-attributes
                                    "Please set simulator_lib_path arg, or set ENV SIMULATOR_PATH")
 
         run_cfg = {"simulator_mode": simulator_mode,
-                   "simulator_lib_path": simulator_lib_path}
+                   "simulator_lib_path": simulator_lib_path,
+                   "case_process_num": case_process_num}
         if isinstance(soc, str):
             soc_list = [x.strip() for x in soc.split(",")]
         if isinstance(soc, (tuple, list)):
@@ -0,0 +1,442 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Copyright 2020 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+
+"""
+op ut cache, apply content-addressed caches for op ut run: KernelCache, InputDataCache
+"""
+import os
+import sys
+import json
+import stat
+import shutil
+import hashlib
+import inspect
+import tempfile
+import importlib.util
+from enum import Enum
+from typing import Any
+from typing import Dict
+
+import numpy as np
+
+from op_test_frame.common import logger
+from op_test_frame.utils import file_util
+
+
+# 'pylint: disable=too-few-public-methods
+class Constant:
+    """
+    This class for Constant.
+    """
+    DATA_DIR_MODES = stat.S_IWUSR | stat.S_IRUSR | stat.S_IXUSR | stat.S_IRGRP | stat.S_IXGRP
+    CACHE_FORMAT_VERSION = "1"
+    CACHE_HIT = "hit"
+    CACHE_MISS = "miss"
+    KERNEL_CACHE_RESULT_KEY = "kernel_cache"
+    SHAPE_BUCKET_RESULT_KEY = "shape_bucket_kernel"
+    KERNEL_CACHE_DIR_CFG = "kernel_cache_dir"
+    INPUT_DATA_CACHE_DIR_CFG = "input_data_cache_dir"
+    # kernel file suffix, (suffix, required)
+    KERNEL_FILE_SUFFIXES = ((".o", True), (".json", True), ("_compile_info.json", False))
+    # param keys only used by run model and compare stage, not affect the compile result,
+    # value is filled with the input data and the output data by the run, so a rerun case has it
+    RUNTIME_ONLY_PARAM_KEYS = ("data_path", "expect_data_path", "expect_value", "value")
+    # param keys only used to generate input data and do tiling of dynamic shape case
+    RUN_SHAPE_PARAM_KEYS = ("run_shape", "distribution", "value_range")
+    # version files of the ascend toolkit, searched in the parent directories of the tbe package
+    TOOLKIT_VERSION_FILES = ("version.info", "ascend_toolkit_install.info")
+    TOOLKIT_VERSION_SEARCH_DEPTH = 6
+
+
+# key: op module name, value: source closure digest
+_SOURCE_DIGEST_MAP = {}
+
+
+def _get_module_file(module):
+    module_file = getattr(module, "__file__", None)
+    if not module_file:
+        return None
+    return os.path.realpath(module_file)
+
+
+def _get_source_root(op_module):
+    module_dir = os.path.dirname(_get_module_file(op_module))
+    if module_dir.endswith("dynamic"):
+        module_dir = os.path.dirname(module_dir)
+    return module_dir
+
+
+def _get_depend_modules(module):
+    depend_modules = []
+    for attr_value in list(vars(module).values()):
+        if inspect.ismodule(attr_value):
+            depend_modules.append(attr_value)
+            continue
+        depend_module = sys.modules.get(getattr(attr_value, "__module__", None) or "")
+        if depend_module is not None:
+            depend_modules.append(depend_module)
+    return depend_modules
+
+
+def get_source_closure_digest(op_module) -> str:
+    """
+    get the digest of op module's source and all the sources it depends on in the same impl directory
+
+    Parameters
+    ----------
+    op_module: module
+        the op module which has been imported
+
+    Returns
+    -------
+    digest: str
+        sha256 hex digest of the source closure
+    """
+    if op_module.__name__ in _SOURCE_DIGEST_MAP:
+        return _SOURCE_DIGEST_MAP[op_module.__name__]
+
+    source_root = _get_source_root(op_module)
+    source_files = {}
+    visit_modules = [op_module, ]
+    visited_names = set()
+    while visit_modules:
+        module = visit_modules.pop()
+        if module.__name__ in visited_names:
+            continue
+        visited_names.add(module.__name__)
+        module_file = _get_module_file(module)
+        if not module_file or not module_file.startswith(source_root + os.path.sep):
+            continue
+        source_files[os.path.relpath(module_file, source_root)] = module_file
+        visit_modules.extend(_get_depend_modules(module))
+
+    sha = hashlib.sha256()
+    for rel_path in sorted(source_files):
+        sha.update(rel_path.encode())
+        with open(source_files[rel_path], "rb") as src_f:
+            sha.update(src_f.read())
+    digest = sha.hexdigest()
+    _SOURCE_DIGEST_MAP[op_module.__name__] = digest
+    return digest
+
+
+def _strip_keys(obj, ignore_keys):
+    if isinstance(obj, dict):
+        return {key: _strip_keys(val, ignore_keys) for key, val in obj.items() if key not in ignore_keys}
+    if isinstance(obj, (tuple, list)):
+        return [_strip_keys(val, ignore_keys) for val in obj]
+    return obj
+
+
+def _json_default(obj):
+    # only the values which have a stable form between processes, str of an object may has its address
+    if isinstance(obj, np.ndarray):
+        return {"dtype": str(obj.dtype), "shape": list(obj.shape),
+                "sha256": hashlib.sha256(np.ascontiguousarray(obj).tobytes()).hexdigest()}
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, Enum):
+        return obj.value
+    raise TypeError("param of type %s is not json serializable, can not be in a cache key" % type(obj).__name__)
+
+
+def normalize_params(params: Any, ignore_keys=Constant.RUNTIME_ONLY_PARAM_KEYS) -> str:
+    """
+    convert case params to a stable json string, the value only used in run stage will be removed
+
+    Parameters
+    ----------
+    params: Any
+        op params or addition params of a case
+    ignore_keys: tuple
+        the param keys need to remove, default is the keys only used in run stage
+
+    Returns
+    -------
+    json_str: str
+        the normalized json string, raise TypeError when a param is not json serializable
+    """
+    return json.dumps(_strip_keys(params, ignore_keys), sort_keys=True, default=_json_default)
+
+
+def _find_toolkit_version_files(tbe_dir):
+    version_files = []
+    search_dir = tbe_dir
+    for _ in range(Constant.TOOLKIT_VERSION_SEARCH_DEPTH):
+        for file_name in Constant.TOOLKIT_VERSION_FILES:
+            version_file = os.path.join(search_dir, file_name)
+            if os.path.isfile(version_file):
+                version_files.append(version_file)
+        parent_dir = os.path.dirname(search_dir)
+        if parent_dir == search_dir:
+            break
+        search_dir = parent_dir
+    return version_files
+
+
+def get_toolkit_id():
+    """
+    get the identity of the tbe compiler which compiles the kernels, without importing tbe,
+    made of the tbe package path and mtime, and the ascend toolkit version files found above it
+
+    Returns
+    -------
+    toolkit_id: str
+        sha256 hex digest, None if the tbe package is not found
+    """
+    try:
+        tbe_spec = importlib.util.find_spec("tbe")
+    except (ImportError, ValueError):
+        return None
+    if not tbe_spec or not tbe_spec.origin or not os.path.isfile(tbe_spec.origin):
+        return None
+    tbe_file = os.path.realpath(tbe_spec.origin)
+    sha = hashlib.sha256()
+    sha.update(("%s\n%d\n" % (tbe_file, os.stat(tbe_file).st_mtime_ns)).encode())
+    for version_file in _find_toolkit_version_files(os.path.dirname(tbe_file)):
+        sha.update(version_file.encode())
+        with open(version_file, "rb") as version_f:
+            sha.update(version_f.read())
+    return sha.hexdigest()
+
+
+class KernelCache:
+    """
+    compiled kernel cache, the kernel files are saved in cache_dir/key[:2]/key
+    """
+
+    def __init__(self, cache_dir, toolkit_id):
+        self.cache_dir = os.path.realpath(cache_dir)
+        # kernels compiled by another tbe compiler are not reused, see get_toolkit_id
+        self.toolkit_id = toolkit_id
+        if not os.path.exists(self.cache_dir):
+            file_util.makedirs(self.cache_dir, mode=Constant.DATA_DIR_MODES)
+
+    def build_key(self, op_module, op_func_name, run_soc_version,  # 'pylint: disable=too-many-arguments
+                  imply_type, op_params, addition_params) -> str:
+        """
+        build the cache key of a compile
+
+        Parameters
+        ----------
+        op_module: module
+            the op module which has been imported
+        op_func_name: str
+            op function name
+        run_soc_version: str
+            the soc to compile
+        imply_type: str
+            op imply type, static_shape or dynamic_shape
+        op_params: List
+            op params of the case
+        addition_params: Dict
+            addition params of the case, include kernel_name
+
+        Returns
+        -------
+        key: str
+            the cache key
+        """
+        key_items = [Constant.CACHE_FORMAT_VERSION,
+                     self.toolkit_id,
+                     op_module.__name__,
+                     op_func_name,
+                     get_source_closure_digest(op_module),
+                     run_soc_version,
+                     imply_type,
+                     normalize_params(op_params),
+                     normalize_params(addition_params)]
+        return hashlib.sha256("\n".join(key_items).encode()).hexdigest()
+
+    def _get_entry_dir(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def restore(self, key, kernel_dir, kernel_name) -> bool:
+        """
+        restore kernel files from cache to kernel_dir
+
+        Returns
+        -------
+        True if cache hit, else False
+        """
+        entry_dir = self._get_entry_dir(key)
+        for suffix, required in Constant.KERNEL_FILE_SUFFIXES:
+            if required and not os.path.exists(os.path.join(entry_dir, kernel_name + suffix)):
+                return False
+        if not os.path.exists(kernel_dir):
+            file_util.makedirs(kernel_dir, mode=Constant.DATA_DIR_MODES)
+        try:
+            for suffix, _ in Constant.KERNEL_FILE_SUFFIXES:
+                cache_file = os.path.join(entry_dir, kernel_name + suffix)
+                if os.path.exists(cache_file):
+                    shutil.copyfile(cache_file, os.path.join(kernel_dir, kernel_name + suffix))
+        except OSError as copy_err:
+            logger.log_warn("restore kernel cache failed, kernel name: %s, error msg: %s" % (kernel_name, copy_err))
+            return False
+        return True
+
+    def store(self, key, kernel_dir, kernel_name):
+        """
+        save kernel files in kernel_dir to cache, do nothing if kernel files is not complete
+
+        Returns
+        -------
+        None
+        """
+        for suffix, required in Constant.KERNEL_FILE_SUFFIXES:
+            if required and not os.path.exists(os.path.join(kernel_dir, kernel_name + suffix)):
+                return
+        entry_dir = self._get_entry_dir(key)
+        if os.path.exists(entry_dir):
+            return
+        entry_parent_dir = os.path.dirname(entry_dir)
+        tmp_dir = None
+        try:
+            if not os.path.exists(entry_parent_dir):
+                file_util.makedirs(entry_parent_dir, mode=Constant.DATA_DIR_MODES)
+            tmp_dir = tempfile.mkdtemp(prefix=".tmp_", dir=entry_parent_dir)
+            for suffix, _ in Constant.KERNEL_FILE_SUFFIXES:
+                kernel_file = os.path.join(kernel_dir, kernel_name + suffix)
+                if os.path.exists(kernel_file):
+                    shutil.copyfile(kernel_file, os.path.join(tmp_dir, kernel_name + suffix))
+            # other process may save the same key at the same time, the first one win
+            os.replace(tmp_dir, entry_dir)
+            tmp_dir = None
+        except OSError as save_err:
+            logger.log_warn("save kernel cache failed, kernel name: %s, error msg: %s" % (kernel_name, save_err))
+        finally:
+            if tmp_dir:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def get_kernel_cache(run_cfg: Dict[str, Any] = None):
+    """
+    get kernel cache by run configuration
+
+    Parameters
+    ----------
+    run_cfg: Dict[str, Any]
+        run configuration, kernel cache enabled when "kernel_cache_dir" is set
+
+    Returns
+    -------
+    kernel_cache: KernelCache or None, None when the tbe compiler can not be identified
+    """
+    if not run_cfg or not isinstance(run_cfg, dict):
+        return None
+    cache_dir = run_cfg.get(Constant.KERNEL_CACHE_DIR_CFG)
+    if not cache_dir:
+        return None
+    toolkit_id = get_toolkit_id()
+    if not toolkit_id:
+        logger.log_warn("can not identify the tbe compiler, kernel cache is disabled")
+        return None
+    return KernelCache(cache_dir, toolkit_id)
+
+
+class InputDataCache:
+    """
+    generated input data cache, the data are saved as cache_dir/key[:2]/key.npy and loaded by copy on write mmap
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = os.path.realpath(cache_dir)
+        if not os.path.exists(self.cache_dir):
+            file_util.makedirs(self.cache_dir, mode=Constant.DATA_DIR_MODES)
+
+    @staticmethod
+    def build_key(shape, dtype, distribution, value_range, seed) -> str:  # 'pylint: disable=too-many-arguments
+        """
+        build the cache key of a generated input data
+
+        Returns
+        -------
+        key: str
+            the cache key
+        """
+        key_items = [Constant.CACHE_FORMAT_VERSION,
+                     json.dumps([list(shape), str(dtype), str(distribution), list(value_range), seed],
+                                default=_json_default)]
+        return hashlib.sha256("\n".join(key_items).encode()).hexdigest()
+
+    def _get_entry_file(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".npy")
+
+    def load(self, key):
+        """
+        load data from cache
+
+        Returns
+        -------
+        data: copy on write numpy memmap, None if cache miss
+        """
+        entry_file = self._get_entry_file(key)
+        if not os.path.exists(entry_file):
+            return None
+        try:
+            return np.load(entry_file, mmap_mode="c")
+        except (OSError, ValueError) as load_err:
+            logger.log_warn("load input data cache failed, file: %s, error msg: %s" % (entry_file, load_err))
+            return None
+
+    def save(self, key, data):
+        """
+        save data to cache
+
+        Returns
+        -------
+        None
+        """
+        entry_file = self._get_entry_file(key)
+        if os.path.exists(entry_file):
+            return
+        entry_dir = os.path.dirname(entry_file)
+        tmp_file = None
+        try:
+            if not os.path.exists(entry_dir):
+                file_util.makedirs(entry_dir, mode=Constant.DATA_DIR_MODES)
+            tmp_fd, tmp_file = tempfile.mkstemp(prefix=".tmp_", suffix=".npy", dir=entry_dir)
+            with os.fdopen(tmp_fd, "wb") as tmp_f:
+                np.save(tmp_f, np.asarray(data))
+            os.replace(tmp_file, entry_file)
+            tmp_file = None
+        except OSError as save_err:
+            logger.log_warn("save input data cache failed, file: %s, error msg: %s" % (entry_file, save_err))
+        finally:
+            if tmp_file and os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+
+def get_input_data_cache(run_cfg: Dict[str, Any] = None):
+    """
+    get input data cache by run configuration
+
+    Parameters
+    ----------
+    run_cfg: Dict[str, Any]
+        run configuration, input data cache enabled when "input_data_cache_dir" is set
+
+    Returns
+    -------
+    input_data_cache: InputDataCache or None
+    """
+    if not run_cfg or not isinstance(run_cfg, dict):
+        return None
+    cache_dir = run_cfg.get(Constant.INPUT_DATA_CACHE_DIR_CFG)
+    if not cache_dir:
+        return None
+    return InputDataCache(cache_dir)
@@ -291,8 +291,18 @@ class Constant:
     """
     STAGE_COMPILE = "ut_compile"
     STAGE_RUN = "ut_run_on_model"
+    STAGE_GEN_EXPECT = "ut_gen_expect"
     STAGE_COMPARE_PRECISION = "ut_compare_precision"
     STAGE_CUST_FUNC = "ut_cust_func"
+    STAGE_SAVE_DATA = "ut_save_data"
+    # case progress events, see run_cfg case_event_func of OpUT.run_case
+    CASE_EVENT_START = "case_start"
+    CASE_EVENT_STAGE = "stage_start"
+    CASE_EVENT_STAGE_END = "stage_end"
+    CASE_EVENT_END = "case_end"
+    # how to run the failed cases of the last run, see run_cfg failed_case_mode of OpUT.run_case
+    FAILED_MODE_LAST_FAILED = "last_failed"
+    FAILED_MODE_FAILED_FIRST = "failed_first"
 
 
 class OpUTStageResult:
@@ -301,12 +311,14 @@ class OpUTStageResult:
     """
 
     def __init__(self, status, stage_name=None, result=None,  # 'pylint: disable=too-many-arguments
-                 err_msg=None, err_trace=None):
+                 err_msg=None, err_trace=None, duration=None):
         self.status = status
         self.result = result
         self.err_msg = err_msg
         self.err_trace = err_trace
         self.stage_name = stage_name
+        # seconds the stage runs, None means not measured
+        self.duration = duration
 
     def is_success(self):
         """
@@ -325,7 +337,8 @@ class OpUTStageResult:
             "result": self.result,
             "err_msg": self.err_msg,
             "stage_name": self.stage_name,
-            "err_trace": self.err_trace
+            "err_trace": self.err_trace,
+            "duration": self.duration
         }
 
     @staticmethod
@@ -336,7 +349,7 @@ class OpUTStageResult:
         :return: OpUTStageResult object
         """
         return OpUTStageResult(json_obj["status"], json_obj["stage_name"], json_obj["result"], json_obj["err_msg"],
-                               json_obj["err_trace"])
+                               json_obj["err_trace"], json_obj.get("duration"))
 
 
 class OpUTCaseTrace:
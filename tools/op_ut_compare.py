@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Copyright 2020 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+
+"""
+op ut compare, apply chunked precision compare for large outputs: ChunkCompareResult, compare_precision_chunked
+
+an output is walked block by block, every block is judged by precision_compare_util.compare_precision with the
+case's precision standard, and the error statistics of the whole output are kept incrementally:
+    an element is an error element when abs(actual - expect) > atol * max(abs(expect), 1),
+    nan only equals nan, inf only equals the inf with the same sign.
+an output passes when all of its blocks pass, the error ratio, max and mean criteria of the blocks hold for the
+whole output too. after a block fails, the output is judged by the statistics, it fails when the error element
+count > rtol * total count, or when max_atol is set and any abs(actual - expect) > max_atol, and the compare stops
+as soon as it fails.
+"""
+import numpy as np
+
+from op_test_frame.common import op_status
+from op_test_frame.utils import precision_compare_util
+
+
+# 'pylint: disable=too-few-public-methods
+class Constant:
+    """
+    This class for Constant.
+    """
+    DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+    # outputs which element count not less than this threshold use chunked compare
+    DEFAULT_CHUNK_COMPARE_THRESHOLD = 16 * 1024 * 1024
+    # dtype: (rtol, atol), the statistics standard when the case has no precision standard
+    DEFAULT_STANDARD = {
+        "float16": (0.001, 0.001),
+        "float32": (0.0001, 0.0001),
+        "float64": (0.0001, 0.0001)
+    }
+
+
+# 'pylint: disable=too-many-instance-attributes
+class ChunkCompareResult:
+    """
+    chunked compare result, contains status, err_msg and the error statistics
+    """
+
+    def __init__(self, total_cnt):
+        self.status = op_status.SUCCESS
+        self.err_msg = None
+        self.total_cnt = total_cnt
+        self.compared_cnt = 0
+        self.err_cnt = 0
+        self.max_diff = 0.0
+        self.max_diff_idx = None
+        self.diff_sum = 0.0
+        # start index of the first block failed by compare_precision, None means all blocks pass
+        self.failed_chunk_start = None
+        self.early_exit = False
+
+    def update(self, diff: np.ndarray, err_mask: np.ndarray, chunk_start: int):
+        """
+        update statistics with a compared chunk
+        :param diff: abs diff of the chunk, nan means not comparable
+        :param err_mask: error element mask of the chunk
+        :param chunk_start: chunk start index in the flatten output
+        :return: None
+        """
+        self.compared_cnt += diff.size
+        self.err_cnt += int(np.count_nonzero(err_mask))
+        finite_diff = np.where(np.isfinite(diff), diff, 0)
+        if finite_diff.size > 0:
+            chunk_max_idx = int(np.argmax(finite_diff))
+            if finite_diff[chunk_max_idx] > self.max_diff or self.max_diff_idx is None:
+                self.max_diff = float(finite_diff[chunk_max_idx])
+                self.max_diff_idx = chunk_start + chunk_max_idx
+        self.diff_sum += float(np.sum(finite_diff, dtype=np.float64))
+
+    def summary_txt(self):
+        """
+        get statistics summary string
+        :return: summary string
+        """
+        mean_diff = self.diff_sum / self.compared_cnt if self.compared_cnt else 0.0
+        summary = "error count: %d, compared count: %d, total count: %d, max diff: %s at index %s, mean diff: %s" % (
+            self.err_cnt, self.compared_cnt, self.total_cnt, self.max_diff, self.max_diff_idx, mean_diff)
+        if self.failed_chunk_start is not None:
+            summary += ", first failed block starts at index %d" % self.failed_chunk_start
+        if self.early_exit:
+            summary += ", stop early since error count is out of budget"
+        return summary
+
+
+def get_standard(precision_standard, dtype):
+    """
+    get (rtol, atol, max_atol) of the statistics
+    :param precision_standard: op_test_frame.common.precision_info.PrecisionStandard, can be None
+    :param dtype: expect output dtype
+    :return: (rtol, atol, max_atol)
+    """
+    if precision_standard:
+        return precision_standard.rtol, precision_standard.atol, getattr(precision_standard, "max_atol", None)
+    rtol, atol = Constant.DEFAULT_STANDARD.get(np.dtype(dtype).name, (0, 0))
+    return rtol, atol, None
+
+
+def _compare_chunk(actual_chunk, expect_chunk, atol):
+    actual_chunk = actual_chunk.astype(np.float64)
+    expect_chunk = expect_chunk.astype(np.float64)
+    with np.errstate(invalid="ignore", over="ignore"):
+        diff = np.abs(actual_chunk - expect_chunk)
+        err_mask = diff > atol * np.maximum(np.abs(expect_chunk), 1)
+    # nan or inf diff, equal only when both nan or the same inf
+    not_finite = ~np.isfinite(diff)
+    if np.any(not_finite):
+        same_special = (np.isnan(actual_chunk) & np.isnan(expect_chunk)) | (actual_chunk == expect_chunk)
+        err_mask |= not_finite & ~same_special
+        diff[not_finite & same_special] = 0
+    return diff, err_mask
+
+
+def compare_precision_chunked(actual: np.ndarray, expect: np.ndarray, precision_standard=None,
+                              chunk_size=Constant.DEFAULT_CHUNK_SIZE) -> ChunkCompareResult:
+    """
+    compare actual and expect output block by block, the temporary memory is bounded by chunk_size,
+    every element is compared once, and the compare stops as soon as the output fails
+
+    Parameters
+    ----------
+    actual: np.ndarray
+        actual output
+    expect: np.ndarray
+        expect output, should have the same shape with actual
+    precision_standard: PrecisionStandard
+        precision standard of the case, None means the default standard of compare_precision for the blocks,
+        and the default standard of expect dtype for the statistics
+    chunk_size: int
+        element count of one block
+
+    Returns
+    -------
+    cmp_res: ChunkCompareResult
+    """
+    actual_flatten = actual.reshape(-1)
+    expect_flatten = expect.reshape(-1)
+    rtol, atol, max_atol = get_standard(precision_standard, expect.dtype)
+    cmp_res = ChunkCompareResult(expect_flatten.size)
+    err_budget = int(rtol * expect_flatten.size)
+    for chunk_start in range(0, expect_flatten.size, chunk_size):
+        chunk_end = min(chunk_start + chunk_size, expect_flatten.size)
+        actual_chunk = actual_flatten[chunk_start:chunk_end]
+        expect_chunk = expect_flatten[chunk_start:chunk_end]
+        diff, err_mask = _compare_chunk(actual_chunk, expect_chunk, atol)
+        cmp_res.update(diff, err_mask, chunk_start)
+        if cmp_res.failed_chunk_start is None:
+            chunk_res = precision_compare_util.compare_precision(actual_chunk, expect_chunk,
+                                                                 precision_standard=precision_standard)
+            if chunk_res.status != op_status.SUCCESS:
+                cmp_res.failed_chunk_start = chunk_start
+        if cmp_res.failed_chunk_start is None:
+            continue
+        if max_atol is not None and cmp_res.max_diff > max_atol:
+            cmp_res.status = op_status.FAILED
+            cmp_res.early_exit = chunk_end < expect_flatten.size
+            cmp_res.err_msg = "max diff is bigger than max_atol(%s), %s" % (max_atol, cmp_res.summary_txt())
+            return cmp_res
+        if cmp_res.err_cnt > err_budget:
+            cmp_res.status = op_status.FAILED
+            cmp_res.early_exit = chunk_end < expect_flatten.size
+            cmp_res.err_msg = "error count is bigger than rtol(%s) * total count, %s" % (rtol, cmp_res.summary_txt())
+            return cmp_res
+    return cmp_res
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Copyright 2020 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+
+"""
+op ut data writer, apply AsyncDataWriter to save case data in background
+"""
+import os
+import stat
+import queue
+import hashlib
+import threading
+
+import numpy as np
+
+from op_test_frame.common import logger
+
+
+# 'pylint: disable=too-few-public-methods
+class Constant:
+    """
+    This class for Constant.
+    """
+    DATA_FILE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+    DATA_FILE_MODES = stat.S_IWUSR | stat.S_IRUSR | stat.S_IRGRP
+    DEFAULT_QUEUE_SIZE = 16
+    HASH_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+def _file_has_same_content(data_path, data: np.ndarray) -> bool:
+    if not os.path.exists(data_path) or os.path.getsize(data_path) != data.nbytes:
+        return False
+    data_sha = hashlib.sha256(data.reshape(-1).view(np.uint8))
+    file_sha = hashlib.sha256()
+    with open(data_path, "rb") as data_f:
+        chunk = data_f.read(Constant.HASH_CHUNK_SIZE)
+        while chunk:
+            file_sha.update(chunk)
+            chunk = data_f.read(Constant.HASH_CHUNK_SIZE)
+    return data_sha.digest() == file_sha.digest()
+
+
+def write_data(data, data_path) -> bool:
+    """
+    write numpy data to file, skip writing when the file already has the same content
+
+    Parameters
+    ----------
+    data: numpy.ndarray
+        data to write
+    data_path: str
+        the file path
+
+    Returns
+    -------
+    True if data is written, False if skipped
+    """
+    data = np.ascontiguousarray(data)
+    if _file_has_same_content(data_path, data):
+        return False
+    with os.fdopen(os.open(data_path, Constant.DATA_FILE_FLAGS, Constant.DATA_FILE_MODES), "wb") as data_f:
+        data.tofile(data_f)
+    return True
+
+
+class AsyncDataWriter:
+    """
+    write numpy data to files in a background thread, the pending data count is bounded by max_queue_size,
+    submit will block when the queue is full.
+    """
+
+    def __init__(self, max_queue_size=Constant.DEFAULT_QUEUE_SIZE):
+        self._queue = queue.Queue(maxsize=max(int(max_queue_size), 1))
+        self._thread = None
+        self._err_msg_list = []
+        self.write_cnt = 0
+        self.skip_cnt = 0
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                data, data_path = item
+                if write_data(data, data_path):
+                    self.write_cnt += 1
+                else:
+                    self.skip_cnt += 1
+            except (OSError, ValueError) as write_err:
+                self._err_msg_list.append("write data failed, data path: %s, error msg: %s" % (item[1], write_err))
+            finally:
+                self._queue.task_done()
+
+    def submit(self, data, data_path):
+        """
+        submit a data to write
+
+        Parameters
+        ----------
+        data: numpy.ndarray
+            data to write, should not be modified after submit
+        data_path: str
+            the file path
+
+        Returns
+        -------
+        None
+        """
+        # start the thread lazily, so that a writer created before fork start its own thread in child process
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._work, name="op_ut_data_writer", daemon=True)
+            self._thread.start()
+        self._queue.put((data, data_path))
+
+    def flush(self):
+        """
+        wait for all submitted data written
+
+        Returns
+        -------
+        err_msg_list: the error messages of failed writing
+        """
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+        err_msg_list = self._err_msg_list
+        self._err_msg_list = []
+        for err_msg in err_msg_list:
+            logger.log_warn(err_msg)
+        return err_msg_list
+
+    def close(self):
+        """
+        flush and stop the background thread
+
+        Returns
+        -------
+        err_msg_list: the error messages of failed writing
+        """
+        err_msg_list = self.flush()
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._thread = None
+        return err_msg_list
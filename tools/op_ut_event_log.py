@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Copyright 2020 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+
+"""
+op ut event log, apply the jsonl event log and the live progress of a ut run: EventLog
+"""
+import os
+import sys
+import stat
+import json
+import time
+
+from op_test_frame.common import logger
+from op_test_frame.common import op_status
+from op_test_frame.utils import file_util
+from op_test_frame.ut import op_ut_case_info
+from op_test_frame.ut import op_ut_worker_pool
+
+
+# 'pylint: disable=too-few-public-methods
+class Constant:
+    """
+    This class for Constant.
+    """
+    DATA_DIR_MODES = stat.S_IWUSR | stat.S_IRUSR | stat.S_IXUSR | stat.S_IRGRP | stat.S_IXGRP
+    LOG_FILE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+    LOG_FILE_MODES = stat.S_IWUSR | stat.S_IRUSR | stat.S_IRGRP
+    EVENT_LOG_FILE_NAME = ".ut_event_log.jsonl"
+    # written by the caller process when a case file task finishes
+    EVENT_TASK_END = "task_end"
+    # fields copied from the worker events
+    EVENT_FIELDS = ("type", "time", "worker_id", "task_id", "case_name", "stage_name", "status", "rss",
+                    "reason", "duration")
+    DEFAULT_PROGRESS_INTERVAL = 10
+
+
+# 'pylint: disable=too-many-instance-attributes
+class EventLog:
+    """
+    write the case events of a ut run to a jsonl file, one json object a line, and print the progress line
+    with case rate and eta.
+
+    the eta is predicted by the estimated durations of the finished and total case file tasks.
+    """
+
+    def __init__(self, log_path, task_estimates: dict, append=False,
+                 progress_interval=Constant.DEFAULT_PROGRESS_INTERVAL):
+        """
+        :param log_path: jsonl event log path
+        :param task_estimates: dict, key is (case file, soc), value is estimated duration seconds
+        :param append: True to append to the exist log, e.g. resume a broken run
+        :param progress_interval: seconds between two progress lines, 0 means not print progress
+        """
+        self.log_path = os.path.realpath(log_path)
+        self.task_estimates = task_estimates
+        self.append = append
+        self.progress_interval = progress_interval
+        self._log_f = None
+        self._start_time = None
+        self._last_progress_time = 0
+        self._total_estimate = sum(task_estimates.values())
+        self._done_estimate = 0.0
+        self._done_task_cnt = 0
+        # key: (worker id, task id, case name), value: case start time
+        self._case_start_map = {}
+        self._status_cnt = {op_status.SUCCESS: 0, op_status.FAILED: 0, op_status.ERROR: 0}
+        self._is_tty = sys.stdout.isatty()
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def open(self):
+        """
+        open the log file
+        :return: None
+        """
+        log_dir = os.path.dirname(self.log_path)
+        if not os.path.exists(log_dir):
+            file_util.makedirs(log_dir, mode=Constant.DATA_DIR_MODES)
+        flags = Constant.LOG_FILE_FLAGS if self.append else Constant.LOG_FILE_FLAGS | os.O_TRUNC
+        # line buffered, so that the readers tailing the log get whole lines
+        self._log_f = os.fdopen(os.open(self.log_path, flags, Constant.LOG_FILE_MODES), "w", buffering=1)
+        self._start_time = time.time()
+
+    def close(self):
+        """
+        print the last progress line and close the log file
+        :return: None
+        """
+        if self._log_f is None:
+            return
+        self._print_progress(force=True)
+        if self._is_tty and self.progress_interval:
+            print("", flush=True)
+        self._log_f.close()
+        self._log_f = None
+
+    def _write(self, record):
+        try:
+            self._log_f.write(json.dumps(record) + "\n")
+        except (OSError, ValueError) as write_err:
+            logger.log_warn("write event log failed, error msg: %s" % write_err)
+
+    def on_worker_event(self, event, case_file, soc_version):
+        """
+        record an event reported by a worker, see op_ut_worker_pool.report_event
+        :param event: event dict
+        :param case_file: case file of the task
+        :param soc_version: soc version of the task
+        :return: None
+        """
+        if self._log_f is None:
+            return
+        record = {field: event.get(field) for field in Constant.EVENT_FIELDS if event.get(field) is not None}
+        record.update({"case_file": case_file, "soc": soc_version})
+        case_key = (event.get("worker_id"), event.get("task_id"), event.get("case_name"))
+        if event.get("type") == op_ut_case_info.Constant.CASE_EVENT_START:
+            self._case_start_map[case_key] = event.get("time")
+        elif event.get("type") == op_ut_case_info.Constant.CASE_EVENT_END:
+            case_start = self._case_start_map.pop(case_key, None)
+            if case_start is not None:
+                record["duration"] = round(event.get("time") - case_start, 3)
+            case_report = event.get("case_report") or {}
+            record["status"] = case_report.get("status")
+            if case_report.get("err_msg"):
+                record["err_msg"] = case_report.get("err_msg")
+            if record.get("status") in self._status_cnt:
+                self._status_cnt[record.get("status")] += 1
+        elif event.get("type") == op_ut_worker_pool.Constant.EVENT_TASK_HANG:
+            # the running case of a killed worker is recorded as error
+            if event.get("case_name"):
+                self._status_cnt[op_status.ERROR] += 1
+            if event.get("duration") is not None:
+                record["duration"] = round(event.get("duration"), 3)
+        self._write(record)
+        self._print_progress()
+
+    def on_task_end(self, case_file, soc_version, res, duration, peak_rss=None):
+        """
+        record a finished case file task
+        :param case_file: case file
+        :param soc_version: soc version
+        :param res: task result, True means success
+        :param duration: task duration seconds
+        :param peak_rss: peak rss bytes of the task, can be None
+        :return: None
+        """
+        if self._log_f is None:
+            return
+        self._done_task_cnt += 1
+        self._done_estimate += self.task_estimates.get((case_file, soc_version), 0)
+        self._write({"type": Constant.EVENT_TASK_END, "time": time.time(), "case_file": case_file,
+                     "soc": soc_version, "status": op_status.SUCCESS if res else op_status.FAILED,
+                     "duration": round(duration, 3), "peak_rss": peak_rss})
+        self._print_progress()
+
+    def get_progress_txt(self):
+        """
+        get the progress line
+        :return: progress str
+        """
+        elapsed = time.time() - self._start_time
+        case_cnt = sum(self._status_cnt.values())
+        progress_txt = "[progress] cases: %d (failed: %d, error: %d), %.2f cases/s, case file tasks: %d/%d, " \
+                       "elapsed: %ds" % (case_cnt, self._status_cnt.get(op_status.FAILED),
+                                         self._status_cnt.get(op_status.ERROR), case_cnt / elapsed if elapsed else 0,
+                                         self._done_task_cnt, len(self.task_estimates), elapsed)
+        if 0 < self._done_estimate < self._total_estimate:
+            done_ratio = self._done_estimate / self._total_estimate
+            progress_txt += ", eta: %ds" % (elapsed * (1 - done_ratio) / done_ratio)
+        return progress_txt
+
+    def _print_progress(self, force=False):
+        if not self.progress_interval:
+            return
+        now = time.time()
+        if not force and now - self._last_progress_time < self.progress_interval:
+            return
+        self._last_progress_time = now
+        if self._is_tty:
+            print("\r" + self.get_progress_txt(), end="", flush=True)
+        else:
+            print(self.get_progress_txt(), flush=True)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Copyright 2020 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+
+"""
+op ut func cache, apply per-process caches of op function introspection: get_op_signature, resolve_op_func
+"""
+import os
+import sys
+import inspect
+import traceback
+
+
+# key: (op module name, op function name), value: (op module, op function, err_msg), failed lookups are cached too
+_OP_FUNC_MAP = {}
+# key: id of op function, value: (op function, source stamp, param desc list, param name list)
+_OP_SIGNATURE_MAP = {}
+
+
+def _get_source_stamp(op_func):
+    try:
+        source_file = inspect.getsourcefile(inspect.unwrap(op_func))
+    except TypeError:
+        return None
+    if not source_file or not os.path.exists(source_file):
+        return None
+    return source_file, os.path.getmtime(source_file)
+
+
+def get_op_signature(op_func, parse_func):
+    """
+    get op function's check_op_params descriptors and parameter names, parse once per function and source mtime
+
+    Parameters
+    ----------
+    op_func: function
+        the op function
+    parse_func: function
+        called as parse_func(op_func) on cache miss, return (param_desc_list, param_name_list)
+
+    Returns
+    -------
+    (param_desc_list, param_name_list), new lists which the caller can modify
+    """
+    source_stamp = _get_source_stamp(op_func)
+    cache_item = _OP_SIGNATURE_MAP.get(id(op_func))
+    if cache_item is None or cache_item[0] is not op_func or cache_item[1] != source_stamp:
+        param_desc_list, param_name_list = parse_func(op_func)
+        cache_item = (op_func, source_stamp, tuple(param_desc_list), tuple(param_name_list))
+        _OP_SIGNATURE_MAP[id(op_func)] = cache_item
+    return list(cache_item[2]), list(cache_item[3])
+
+
+def invalidate_op_signature(op_func=None):
+    """
+    drop the cached op signature, call it after reloading op module in the same process
+
+    Parameters
+    ----------
+    op_func: function
+        the op function to drop, None means drop all
+
+    Returns
+    -------
+    None
+    """
+    if op_func is None:
+        _OP_SIGNATURE_MAP.clear()
+    else:
+        _OP_SIGNATURE_MAP.pop(id(op_func), None)
+
+
+def _add_impl_dirs_to_path():
+    # custom op and inner op both have parent dir impl,
+    # so when python_path contains two impl's parent dir,
+    # we need to add either impl dir to python_path
+    for dir_item in list(sys.path):
+        impl_dir = os.path.join(dir_item, "impl")
+        if os.path.exists(impl_dir) and impl_dir not in sys.path:
+            sys.path.append(impl_dir)
+
+
+def _import_op_module(op_module_name):
+    try:
+        __import__(op_module_name)
+        return sys.modules[op_module_name], None
+    except (ImportError, ModuleNotFoundError) as _:
+        pass
+
+    _add_impl_dirs_to_path()
+    fallback_module_name = op_module_name.replace("impl.", "")
+    try:
+        __import__(fallback_module_name)
+        return sys.modules[fallback_module_name], None
+    except (ImportError, ModuleNotFoundError) as _:
+        err_msg = "Can't import op module, please check you python path"
+        err_msg += ", op module name: %s" % fallback_module_name
+        err_msg += ", err_trace: %s" % traceback.format_exc()
+        return None, err_msg
+
+
+def resolve_op_func(op_module_name, op_func_name):
+    """
+    import op module and get op function, both resolved and failed lookups are cached per process
+
+    Parameters
+    ----------
+    op_module_name: str
+        op module name, like impl.add or impl.dynamic.add, fallback to the name without "impl." when import failed
+    op_func_name: str
+        op function name
+
+    Returns
+    -------
+    (op_module, op_func, err_msg), op_module and op_func are None when failed
+    """
+    cache_key = (op_module_name, op_func_name)
+    if cache_key in _OP_FUNC_MAP:
+        return _OP_FUNC_MAP[cache_key]
+
+    op_module, err_msg = _import_op_module(op_module_name)
+    op_func = getattr(op_module, op_func_name, None) if op_module else None
+    if op_module and not op_func:
+        err_msg = "can't get op function in op module,"
+        err_msg += " op module name: %s, op function name: %s" % (op_module.__name__, op_func_name)
+    _OP_FUNC_MAP[cache_key] = (op_module, op_func, err_msg)
+    return _OP_FUNC_MAP[cache_key]
+
+
+def invalidate_op_func(op_module_name=None):
+    """
+    drop the cached op module resolution, so that next resolve_op_func imports again
+
+    Parameters
+    ----------
+    op_module_name: str
+        the op module name to drop, None means drop all
+
+    Returns
+    -------
+    None
+    """
+    for cache_key in list(_OP_FUNC_MAP):
+        if op_module_name is None or cache_key[0] == op_module_name:
+            _OP_FUNC_MAP.pop(cache_key)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Copyright 2020 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+
+"""
+op ut journal, apply append-only journal of completed ut work for resuming a broken run: RunJournal
+"""
+import os
+import json
+import stat
+
+from op_test_frame.common import logger
+from op_test_frame.utils import file_util
+
+
+# 'pylint: disable=too-few-public-methods
+class Constant:
+    """
+    This class for Constant.
+    """
+    JOURNAL_FILE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+    JOURNAL_FILE_MODES = stat.S_IWUSR | stat.S_IRUSR | stat.S_IRGRP
+    DATA_DIR_MODES = stat.S_IWUSR | stat.S_IRUSR | stat.S_IXUSR | stat.S_IRGRP | stat.S_IXGRP
+    JOURNAL_FILE_NAME = ".ut_run_journal"
+    RECORD_CASE = "case"
+    RECORD_TASK = "task"
+    # block size to find the last line end when drop the broken tail
+    TAIL_READ_BLOCK_SIZE = 64 * 1024
+
+
+def get_task_key(case_file, soc_version):
+    """
+    get the journal key of a (case file, soc) task
+    :param case_file: case file path
+    :param soc_version: soc version
+    :return: key tuple
+    """
+    return os.path.realpath(case_file), soc_version
+
+
+class RunJournal:
+    """
+    append-only journal, one json record per line, records are written by one os.write of an O_APPEND file,
+    so that processes can append to the same journal, and a broken run leaves at most one broken last line.
+    record types:
+        case: {"type": "case", "case_file": .., "soc": .., "case_name": .., "report": case report json object}
+        task: {"type": "task", "case_file": .., "soc": .., "report_path": report data path of the task}
+    """
+
+    def __init__(self, journal_path):
+        self.journal_path = os.path.realpath(journal_path)
+        # key: (case file, soc), value: report data path
+        self.done_tasks = {}
+        # key: (case file, soc), value: {case name: case report json object}
+        self.done_cases = {}
+
+    def reset(self):
+        """
+        clear the journal for a new run
+        :return: None
+        """
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.done_tasks = {}
+        self.done_cases = {}
+
+    def load(self):
+        """
+        load the journal records, skip the broken lines
+        :return: None
+        """
+        self.done_tasks = {}
+        self.done_cases = {}
+        if not os.path.exists(self.journal_path):
+            return
+        self._truncate_broken_tail()
+        with open(self.journal_path) as journal_f:
+            for line_no, line in enumerate(journal_f, start=1):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.log_warn("skip broken journal line %d in %s" % (line_no, self.journal_path))
+                    continue
+                task_key = get_task_key(record.get("case_file"), record.get("soc"))
+                if record.get("type") == Constant.RECORD_CASE:
+                    self.done_cases.setdefault(task_key, {})[record.get("case_name")] = record.get("report")
+                elif record.get("type") == Constant.RECORD_TASK:
+                    self.done_tasks[task_key] = record.get("report_path")
+
+    def _truncate_broken_tail(self):
+        # the last line without line end is written by a broken run, drop it so that new records start a new line,
+        # only the tail is read, backwards by blocks from the end of the journal
+        with open(self.journal_path, "rb+") as journal_f:
+            block_end = journal_f.seek(0, os.SEEK_END)
+            if block_end == 0:
+                return
+            journal_f.seek(block_end - 1)
+            if journal_f.read(1) == b"\n":
+                return
+            logger.log_warn("drop broken journal tail in %s" % self.journal_path)
+            while block_end > 0:
+                block_start = max(block_end - Constant.TAIL_READ_BLOCK_SIZE, 0)
+                journal_f.seek(block_start)
+                line_end_pos = journal_f.read(block_end - block_start).rfind(b"\n")
+                if line_end_pos >= 0:
+                    journal_f.truncate(block_start + line_end_pos + 1)
+                    return
+                block_end = block_start
+            journal_f.truncate(0)
+
+    def _append(self, record):
+        journal_dir = os.path.dirname(self.journal_path)
+        if not os.path.exists(journal_dir):
+            file_util.makedirs(journal_dir, mode=Constant.DATA_DIR_MODES)
+        line = (json.dumps(record) + "\n").encode()
+        journal_fd = os.open(self.journal_path, Constant.JOURNAL_FILE_FLAGS, Constant.JOURNAL_FILE_MODES)
+        try:
+            os.write(journal_fd, line)
+        finally:
+            os.close(journal_fd)
+
+    def append_case(self, case_file, soc_version, case_name, case_rpt_json):
+        """
+        record a completed case
+        :param case_file: case file path
+        :param soc_version: soc version
+        :param case_name: case name
+        :param case_rpt_json: case report json object
+        :return: None
+        """
+        case_file, soc_version = get_task_key(case_file, soc_version)
+        self._append({"type": Constant.RECORD_CASE, "case_file": case_file, "soc": soc_version,
+                      "case_name": case_name, "report": case_rpt_json})
+
+    def append_task(self, case_file, soc_version, report_path):
+        """
+        record a completed (case file, soc) task, its report has been saved in report_path
+        :param case_file: case file path
+        :param soc_version: soc version
+        :param report_path: report data path of the task
+        :return: None
+        """
+        case_file, soc_version = get_task_key(case_file, soc_version)
+        self._append({"type": Constant.RECORD_TASK, "case_file": case_file, "soc": soc_version,
+                      "report_path": os.path.realpath(report_path)})
+
+    def is_task_done(self, case_file, soc_version, report_path):
+        """
+        check the task is completed and its report is still there
+        :param case_file: case file path
+        :param soc_version: soc version
+        :param report_path: report data path of the task in this run
+        :return: True if done
+        """
+        done_report_path = self.done_tasks.get(get_task_key(case_file, soc_version))
+        return done_report_path == os.path.realpath(report_path) and os.path.isfile(done_report_path)
+
+    def get_done_cases(self, case_file, soc_version):
+        """
+        get completed cases of a task
+        :param case_file: case file path
+        :param soc_version: soc version
+        :return: {case name: case report json object}
+        """
+        return dict(self.done_cases.get(get_task_key(case_file, soc_version), {}))
@@ -0,0 +1,358 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Copyright 2020 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+
+"""
+op ut result store, apply sqlite database of the case results of the runs, to find slow and flaky cases:
+ResultStore
+
+usage:
+    python op_ut_result_store.py --db ./report/.ut_result_store.db slowest --soc Ascend910 --days 7 --limit 50
+    python op_ut_result_store.py --db ./report/.ut_result_store.db flipped --days 7
+    python op_ut_result_store.py --db ./report/.ut_result_store.db runs
+"""
+import os
+import sys
+import stat
+import sqlite3
+import argparse
+from datetime import datetime
+
+from op_test_frame.common import logger
+from op_test_frame.common import op_status
+from op_test_frame.utils import file_util
+from op_test_frame.ut import ut_report
+
+
+# 'pylint: disable=too-few-public-methods
+class Constant:
+    """
+    This class for Constant.
+    """
+    DATA_DIR_MODES = stat.S_IWUSR | stat.S_IRUSR | stat.S_IXUSR | stat.S_IRGRP | stat.S_IXGRP
+    RESULT_STORE_FILE_NAME = ".ut_result_store.db"
+    SCHEMA_VERSION = 1
+    # seconds to wait for the lock, shards of a run may write the same database
+    LOCK_TIMEOUT = 60
+    SECONDS_PER_DAY = 24 * 3600
+    DEFAULT_QUERY_LIMIT = 50
+    INSERT_BATCH_SIZE = 1000
+    SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS ut_run (
+    run_id TEXT PRIMARY KEY,
+    run_time REAL NOT NULL,
+    run_cmd TEXT
+);
+CREATE TABLE IF NOT EXISTS ut_run_shard (
+    run_id TEXT NOT NULL,
+    shard_index INTEGER NOT NULL,
+    shard_count INTEGER NOT NULL,
+    run_time REAL NOT NULL,
+    PRIMARY KEY (run_id, shard_index)
+);
+CREATE TABLE IF NOT EXISTS ut_case (
+    run_id TEXT NOT NULL,
+    run_time REAL NOT NULL,
+    op_type TEXT,
+    case_name TEXT NOT NULL,
+    run_soc TEXT,
+    status TEXT,
+    duration REAL,
+    case_file TEXT,
+    err_msg TEXT
+);
+CREATE TABLE IF NOT EXISTS ut_stage (
+    run_id TEXT NOT NULL,
+    op_type TEXT,
+    case_name TEXT NOT NULL,
+    run_soc TEXT,
+    stage_name TEXT,
+    status TEXT,
+    duration REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS ut_case_run_key_idx ON ut_case (run_id, op_type, case_name, run_soc);
+CREATE INDEX IF NOT EXISTS ut_case_soc_time_idx ON ut_case (run_soc, run_time);
+CREATE INDEX IF NOT EXISTS ut_case_key_time_idx ON ut_case (op_type, case_name, run_soc, run_time);
+CREATE INDEX IF NOT EXISTS ut_stage_key_idx ON ut_stage (run_id, op_type, case_name, run_soc);
+"""
+
+
+def new_run_id():
+    """
+    generate a run id from the current time and pid
+    :return: run id str
+    """
+    return "%s_%d" % (datetime.now().strftime("%Y%m%d%H%M%S%f"), os.getpid())
+
+
+def _case_row(run_id, run_time, case_rpt: ut_report.OpUTCaseReport):
+    case_info = case_rpt.trace_detail.ut_case_info if case_rpt.trace_detail else None
+    return (run_id, run_time, case_rpt.op_type, case_rpt.case_name, case_rpt.run_soc, case_rpt.status,
+            case_rpt.duration, case_info.case_file if case_info else None, case_rpt.err_msg)
+
+
+def _stage_rows(run_id, case_rpt: ut_report.OpUTCaseReport):
+    if not case_rpt.trace_detail:
+        return []
+    return [(run_id, case_rpt.op_type, case_rpt.case_name, case_rpt.run_soc, stage_res.stage_name,
+             stage_res.status, stage_res.duration) for stage_res in case_rpt.trace_detail.stage_result]
+
+
+class ResultStore:
+    """
+    case results of the runs in a sqlite database, one row a case and a stage of a run, keyed by run id,
+    a case stored again in the same run replaces the stored one
+    """
+
+    def __init__(self, db_path):
+        self.db_path = os.path.realpath(db_path)
+        self._conn = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def open(self):
+        """
+        open the database, create the tables when not exist
+        :return: None
+        """
+        db_dir = os.path.dirname(self.db_path)
+        if not os.path.exists(db_dir):
+            file_util.makedirs(db_dir, mode=Constant.DATA_DIR_MODES)
+        self._conn = sqlite3.connect(self.db_path, timeout=Constant.LOCK_TIMEOUT)
+        self._conn.row_factory = sqlite3.Row
+        user_version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if user_version not in (0, Constant.SCHEMA_VERSION):
+            self.close()
+            raise RuntimeError("result store schema version %s not support, db path: %s" % (
+                user_version, self.db_path))
+        with self._conn:
+            self._conn.executescript(Constant.SCHEMA_SQL)
+            self._conn.execute("PRAGMA user_version = %d" % Constant.SCHEMA_VERSION)
+
+    def close(self):
+        """
+        close the database
+        :return: None
+        """
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+    def add_cases(self, run_id, case_rpts, run_time=None, run_cmd=None,  # 'pylint: disable=too-many-arguments
+                  shard=None):
+        """
+        add the case reports of a run in one transaction, the cases of a run can be added by several calls,
+        e.g. one call a shard, a case added again replaces the stored case and its stages
+
+        Parameters
+        ----------
+        run_id: str
+            run id
+        case_rpts: iterable
+            OpUTCaseReport iterable
+        run_time: float
+            timestamp of the run, default is None, the current time
+        run_cmd: str
+            run command
+        shard: dict
+            shard of the run, like {"index": 0, "count": 4}, recorded one row a shard
+
+        Returns
+        -------
+        added case count
+        """
+        run_time = run_time if run_time is not None else datetime.now().timestamp()
+        case_cnt = 0
+        with self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO ut_run (run_id, run_time, run_cmd) VALUES (?, ?, ?)",
+                               (run_id, run_time, run_cmd))
+            if run_cmd:
+                self._conn.execute("UPDATE ut_run SET run_cmd = ? WHERE run_id = ?", (run_cmd, run_id))
+            if shard:
+                self._conn.execute("INSERT OR REPLACE INTO ut_run_shard (run_id, shard_index, shard_count, run_time) "
+                                   "VALUES (?, ?, ?, ?)", (run_id, shard.get("index"), shard.get("count"), run_time))
+            case_rows = []
+            stage_rows = []
+            for case_rpt in case_rpts:
+                case_rows.append(_case_row(run_id, run_time, case_rpt))
+                stage_rows.extend(_stage_rows(run_id, case_rpt))
+                if len(case_rows) >= Constant.INSERT_BATCH_SIZE:
+                    case_cnt += self._insert_rows(case_rows, stage_rows)
+                    case_rows, stage_rows = [], []
+            case_cnt += self._insert_rows(case_rows, stage_rows)
+        return case_cnt
+
+    def _insert_rows(self, case_rows, stage_rows):
+        # stages of a case stored before are replaced with the case
+        self._conn.executemany("DELETE FROM ut_stage "
+                               "WHERE run_id = ? AND op_type = ? AND case_name = ? AND run_soc = ?",
+                               [(row[0], row[2], row[3], row[4]) for row in case_rows])
+        self._conn.executemany("INSERT OR REPLACE INTO ut_case VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", case_rows)
+        self._conn.executemany("INSERT INTO ut_stage VALUES (?, ?, ?, ?, ?, ?, ?)", stage_rows)
+        return len(case_rows)
+
+    def add_report_file(self, run_id, report_file, run_time=None, shard=None):
+        """
+        add the case reports of a json or jsonl report file, the case reports are streamed
+        :param run_id: run id
+        :param report_file: report file path
+        :param run_time: timestamp of the run, default is None, the current time
+        :param shard: shard of the run, like {"index": 0, "count": 4}
+        :return: added case count
+        """
+        return self.add_cases(run_id, ut_report.iter_case_reports(report_file), run_time=run_time, shard=shard)
+
+    def list_runs(self, limit=Constant.DEFAULT_QUERY_LIMIT):
+        """
+        get the latest runs
+        :param limit: run count
+        :return: list of dict with run_id, run_time, run_cmd, shard_cnt, case_cnt, failed_cnt, error_cnt,
+                 shard_cnt is the stored shard count of a sharded run, 0 when not sharded
+        """
+        sql = """
+SELECT r.run_id, r.run_time, r.run_cmd,
+       (SELECT COUNT(*) FROM ut_run_shard s WHERE s.run_id = r.run_id) AS shard_cnt, COUNT(c.case_name) AS case_cnt,
+       SUM(c.status = ?) AS failed_cnt, SUM(c.status = ?) AS error_cnt
+FROM (SELECT * FROM ut_run ORDER BY run_time DESC LIMIT ?) r LEFT JOIN ut_case c ON c.run_id = r.run_id
+GROUP BY r.run_id ORDER BY r.run_time DESC"""
+        return [dict(row) for row in self._conn.execute(sql, (op_status.FAILED, op_status.ERROR, limit))]
+
+    def slowest_cases(self, soc=None, since=None, limit=Constant.DEFAULT_QUERY_LIMIT):
+        """
+        get the slowest cases by the mean duration of the runs
+
+        Parameters
+        ----------
+        soc: str
+            only the cases run on this soc, default is None, all socs
+        since: float
+            only the runs after this timestamp, default is None, all runs
+        limit: int
+            case count
+
+        Returns
+        -------
+        list of dict with op_type, case_name, run_soc, mean_duration, max_duration, run_cnt, case_file
+        """
+        where_sql, params = self._build_where(soc, since)
+        sql = """
+SELECT op_type, case_name, run_soc, AVG(duration) AS mean_duration, MAX(duration) AS max_duration,
+       COUNT(*) AS run_cnt, MAX(case_file) AS case_file
+FROM ut_case WHERE duration IS NOT NULL%s
+GROUP BY op_type, case_name, run_soc ORDER BY mean_duration DESC LIMIT ?""" % where_sql
+        return [dict(row) for row in self._conn.execute(sql, params + [limit])]
+
+    def flipped_cases(self, soc=None, since=None, limit=Constant.DEFAULT_QUERY_LIMIT):
+        """
+        get the cases whose status changed between the runs, most changed first
+
+        Parameters
+        ----------
+        soc: str
+            only the cases run on this soc, default is None, all socs
+        since: float
+            only the runs after this timestamp, default is None, all runs
+        limit: int
+            case count
+
+        Returns
+        -------
+        list of dict with op_type, case_name, run_soc, flip_cnt, run_cnt, last_status
+        """
+        where_sql, params = self._build_where(soc, since)
+        sql = """
+WITH case_history AS (
+    SELECT op_type, case_name, run_soc, status, run_time,
+           LAG(status) OVER (PARTITION BY op_type, case_name, run_soc ORDER BY run_time) AS prev_status,
+           ROW_NUMBER() OVER (PARTITION BY op_type, case_name, run_soc ORDER BY run_time DESC) AS recent_idx
+    FROM ut_case WHERE 1 = 1%s
+)
+SELECT op_type, case_name, run_soc, SUM(prev_status IS NOT NULL AND prev_status != status) AS flip_cnt,
+       COUNT(*) AS run_cnt, MAX(CASE WHEN recent_idx = 1 THEN status END) AS last_status
+FROM case_history GROUP BY op_type, case_name, run_soc HAVING flip_cnt > 0
+ORDER BY flip_cnt DESC, op_type, case_name LIMIT ?""" % where_sql
+        return [dict(row) for row in self._conn.execute(sql, params + [limit])]
+
+    def stage_durations(self, run_id, op_type, case_name, run_soc):
+        """
+        get the stage results of a case in a run
+        :param run_id: run id
+        :param op_type: op type
+        :param case_name: case name
+        :param run_soc: soc version
+        :return: list of dict with stage_name, status, duration
+        """
+        sql = "SELECT stage_name, status, duration FROM ut_stage " \
+              "WHERE run_id = ? AND op_type = ? AND case_name = ? AND run_soc = ?"
+        return [dict(row) for row in self._conn.execute(sql, (run_id, op_type, case_name, run_soc))]
+
+    @staticmethod
+    def _build_where(soc, since):
+        where_sql = ""
+        params = []
+        if soc:
+            where_sql += " AND run_soc = ?"
+            params.append(soc)
+        if since is not None:
+            where_sql += " AND run_time >= ?"
+            params.append(since)
+        return where_sql, params
+
+
+def _print_rows(rows, columns):
+    print("\t".join(columns))
+    for row in rows:
+        print("\t".join("%.3f" % row[col] if isinstance(row[col], float) else str(row[col]) for col in columns))
+
+
+def main(argv=None):
+    """
+    query the result store from command line
+    :param argv: command line args, default is None, sys.argv
+    :return: exit code
+    """
+    parser = argparse.ArgumentParser(description="query the op ut result store")
+    parser.add_argument("--db", default=os.path.join("./report", Constant.RESULT_STORE_FILE_NAME),
+                        help="result store database path")
+    parser.add_argument("query", choices=("slowest", "flipped", "runs"), help="query type")
+    parser.add_argument("--soc", default=None, help="only the cases run on this soc")
+    parser.add_argument("--days", type=float, default=None, help="only the runs in the last days")
+    parser.add_argument("--limit", type=int, default=Constant.DEFAULT_QUERY_LIMIT, help="row count")
+    args = parser.parse_args(argv)
+    if not os.path.isfile(args.db):
+        logger.log_err("result store not exist: %s" % args.db)
+        return 1
+    since = datetime.now().timestamp() - args.days * Constant.SECONDS_PER_DAY if args.days else None
+    with ResultStore(args.db) as store:
+        if args.query == "slowest":
+            _print_rows(store.slowest_cases(args.soc, since, args.limit),
+                        ("op_type", "case_name", "run_soc", "mean_duration", "max_duration", "run_cnt"))
+        elif args.query == "flipped":
+            _print_rows(store.flipped_cases(args.soc, since, args.limit),
+                        ("op_type", "case_name", "run_soc", "flip_cnt", "run_cnt", "last_status"))
+        else:
+            _print_rows(store.list_runs(args.limit),
+                        ("run_id", "run_time", "run_cmd", "shard_cnt", "case_cnt", "failed_cnt", "error_cnt"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
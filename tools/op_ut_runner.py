@@ -22,19 +22,28 @@ import os
 import sys
 import stat
 import shutil
+import sqlite3
 import multiprocessing
 from typing import List
 from typing import Union
 from datetime import datetime
-from multiprocessing import Pool
 from functools import reduce
 
 import coverage
 import signal
 from op_test_frame.common import logger
+from op_test_frame.common import op_status
 from op_test_frame.ut import ut_loader
 from op_test_frame.ut import ut_report
 from op_test_frame.ut import op_ut
+from op_test_frame.ut import op_ut_schedule
+from op_test_frame.ut import op_ut_journal
+from op_test_frame.ut import op_ut_case_info
+from op_test_frame.ut import op_ut_worker_pool
+from op_test_frame.ut import op_ut_sim_lease
+from op_test_frame.ut import op_ut_event_log
+from op_test_frame.ut import op_ut_result_store
+from op_test_frame.ut import op_ut_func_cache
 from op_test_frame.utils import file_util
 
 from op_test_frame.ut.op_ut_case_info import CaseUsage
@@ -46,6 +55,20 @@ class Constant:
     This class for Constant.
     """
     DATA_DIR_MODES = stat.S_IWUSR | stat.S_IRUSR | stat.S_IXUSR | stat.S_IRGRP | stat.S_IXGRP
+    # memory budget of the case file workers when memory_budget is 0, ratio of the available memory
+    # when run_ut starts
+    AUTO_MEMORY_BUDGET_RATIO = 0.8
+    MEGABYTE = 1024 * 1024
+    # coverage report type which only combines the coverage data, render later by `coverage html`
+    COV_REPORT_DATA = "data"
+    # sys.monitoring based coverage tracer, the lowest overhead, need python 3.12 and coverage 7.4
+    COV_CORE_SYSMON = "sysmon"
+    COV_CORE_CTRACE = "ctrace"
+    COV_CORE_SYSMON_PY_VERSION = (3, 12)
+    # min coverage data file count of one parallel combine group
+    COV_COMBINE_GROUP_MIN_FILES = 8
+    # heavy modules imported once in the forkserver, missing modules are skipped
+    WORKER_PRELOAD_MODULES = ("numpy", "coverage", "tensorflow", "te", "tbe", "op_test_frame.ut.op_ut_runner")
 
 
 # 'pylint: disable=too-few-public-methods,too-many-arguments,too-many-branches,too-many-statements
@@ -55,7 +78,10 @@ class OpUTTestRunner:
     """
 
     def __init__(self, print_summary=True, verbosity=2, simulator_mode=None, simulator_lib_path=None,
-                 simulator_dump_path=None, data_dump_level=None, data_dump_dir=None):
+                 simulator_dump_path=None, data_dump_level=None, data_dump_dir=None, kernel_cache_dir=None,
+                 case_process_num=1, input_data_cache_dir=None, case_journal_path=None, skip_case_names=None,
+                 failed_case_names=None, failed_case_mode=None, simulator_lease_dir=None, simulator_slot_num=None,
+                 case_report_writer=None):
         self.print_summary = print_summary
         self.verbosity = verbosity
 
@@ -72,14 +98,35 @@ class OpUTTestRunner:
         self.simulator_dump_path = simulator_dump_path
         self.data_dumnp_level = data_dump_level
         self.data_dumnp_dir = data_dump_dir
+        self.kernel_cache_dir = kernel_cache_dir
+        self.case_process_num = case_process_num
+        self.input_data_cache_dir = input_data_cache_dir
+        self.case_journal_path = case_journal_path
+        self.skip_case_names = skip_case_names
+        self.failed_case_names = failed_case_names
+        self.failed_case_mode = failed_case_mode
+        self.simulator_lease_dir = simulator_lease_dir
+        self.simulator_slot_num = simulator_slot_num
+        self.case_report_writer = case_report_writer
 
     def _execute_one_soc(self, op_ut_case: op_ut.OpUT, run_soc_vsersion: str,
                          case_name_list: List[str], case_usage_list: List = None) -> ut_report.OpUTReport:
+        run_cfg = {"kernel_cache_dir": self.kernel_cache_dir,
+                   "case_process_num": self.case_process_num,
+                   "input_data_cache_dir": self.input_data_cache_dir,
+                   "case_journal_path": self.case_journal_path,
+                   "case_report_writer": self.case_report_writer,
+                   "case_event_func": op_ut_worker_pool.report_event,
+                   "skip_case_names": self.skip_case_names,
+                   "failed_case_names": self.failed_case_names,
+                   "failed_case_mode": self.failed_case_mode}
         if self.simulator_mode:
-            run_cfg = {"simulator_mode": self.simulator_mode,
-                       "simulator_lib_path": self.simulator_lib_path,
-                       "simulator_dump_path": self.simulator_dump_path,
-                       "data_dump_path": self.data_dumnp_dir}
+            run_cfg.update({"simulator_mode": self.simulator_mode,
+                            "simulator_lib_path": self.simulator_lib_path,
+                            "simulator_dump_path": self.simulator_dump_path,
+                            "data_dump_path": self.data_dumnp_dir,
+                            "simulator_lease_dir": self.simulator_lease_dir,
+                            "simulator_slot_num": self.simulator_slot_num})
         ut_run_report = op_ut_case.run_case(run_soc_vsersion, case_name_list=case_name_list,
                                             case_usage_list=case_usage_list, run_cfg=run_cfg)
         return ut_run_report
@@ -135,7 +182,9 @@ class RunUTCaseFileArgs:  # 'pylint: disable=too-many-instance-attributes,too-fe
     def __init__(self, case_file, op_module_name, soc_version,  # 'pylint: disable=too-many-arguments
                  case_name, test_report, test_report_data_path,
                  cov_report, cov_data_path, simulator_mode, simulator_lib_path,
-                 data_dir, dump_model_dir):
+                 data_dir, dump_model_dir, kernel_cache_dir=None, case_process_num=1,
+                 input_data_cache_dir=None, cov_relative_files=False, journal_path=None, failed_case_mode=None,
+                 cov_fast=False, simulator_lease_dir=None, simulator_slot_num=None):
         self.case_file = case_file
         self.op_module_name = op_module_name
         self.soc_version = soc_version
@@ -148,6 +197,19 @@ class RunUTCaseFileArgs:  # 'pylint: disable=too-many-instance-attributes,too-fe
         self.simulator_lib_path = simulator_lib_path
         self.data_dir = data_dir
         self.dump_model_dir = dump_model_dir
+        self.kernel_cache_dir = kernel_cache_dir
+        self.case_process_num = case_process_num
+        self.input_data_cache_dir = input_data_cache_dir
+        self.cov_relative_files = cov_relative_files
+        self.cov_fast = cov_fast
+        self.simulator_lease_dir = simulator_lease_dir
+        self.simulator_slot_num = simulator_slot_num
+        self.journal_path = journal_path
+        self.failed_case_mode = failed_case_mode
+        # failed and error case names of the last run, used by failed_case_mode
+        self.failed_case_names = []
+        # key: case name, value: case report json object of the case completed by a broken run
+        self.done_case_rpts = {}
 
 
 def get_cov_relate_source(module_name: str) -> list:
@@ -177,26 +239,81 @@ def get_cov_relate_source(module_name: str) -> list:
             module_dir = os.path.dirname(module_dir)
     return [module_name, module_dir]
 
+
+def get_cov_relate_files(module_name: str) -> list:
+    """
+    get relate source files to generate coverage, only the op module file and the file with the same name
+    in the static or dynamic directory
+    Parameters:
+    -----------
+    module_name: related module
+    Returns:
+    -----------
+    List related source file patterns to generate coverage
+    """
+    module_name, module_dir = get_cov_relate_source(module_name)
+    module_spec = importlib.util.find_spec(module_name)
+    if module_spec is None or not module_spec.origin:
+        return [os.path.join(os.path.realpath(module_dir), "*")]
+    file_name = os.path.basename(module_spec.origin)
+    relate_files = [os.path.realpath(module_spec.origin)]
+    for relate_dir in (module_dir, os.path.join(module_dir, "dynamic")):
+        relate_file = os.path.realpath(os.path.join(relate_dir, file_name))
+        if os.path.isfile(relate_file) and relate_file not in relate_files:
+            relate_files.append(relate_file)
+    return relate_files
+
+
+def _get_fast_cov_core():
+    if sys.version_info >= Constant.COV_CORE_SYSMON_PY_VERSION:
+        return Constant.COV_CORE_SYSMON
+    return Constant.COV_CORE_CTRACE
+
 def receive_signal(signum, frame):
     raise RuntimeError(f"Receive signal: {signum}")
 
+def _reload_op_module(op_module_name):
+    """
+    reload the op module imported before coverage starts, and drop the op function and signature cached from
+    the module object before reloading
+    """
+    try:
+        if sys.modules.get(op_module_name):
+            print("[INFO]reload module for coverage ,moule name:", sys.modules.get(op_module_name))
+            importlib.reload(sys.modules.get(op_module_name))
+            op_ut_func_cache.invalidate_op_func(op_module_name)
+            op_ut_func_cache.invalidate_op_signature()
+    except BaseException as run_err:  # 'pylint: disable=broad-except
+        logger.log_warn(f"reload module {op_module_name} failed")
+
+
 def _run_ut_case_file(run_arg: RunUTCaseFileArgs):
     logger.log_info("start run: %s" % run_arg.case_file)
     signal.signal(signal.SIGSEGV, receive_signal)
     res = True
 
-    if run_arg.cov_report:
+    if run_arg.cov_report and run_arg.cov_fast:
+        # COVERAGE_CORE is read when create Coverage, keep the tracer set by user
+        os.environ.setdefault("COVERAGE_CORE", _get_fast_cov_core())
+        ut_cover = coverage.Coverage(include=get_cov_relate_files(run_arg.op_module_name),
+                                     data_file=run_arg.cov_data_path)
+        if run_arg.cov_relative_files:
+            ut_cover.set_option("run:relative_files", True)
+        ut_cover.start()
+    elif run_arg.cov_report:
         cov_src = get_cov_relate_source(run_arg.op_module_name)
         ut_cover = coverage.Coverage(source=cov_src, data_file=run_arg.cov_data_path)
+        if run_arg.cov_relative_files:
+            ut_cover.set_option("run:relative_files", True)
         ut_cover.start()
 
+    # the cases are appended when they complete, a killed task leaves the report of its completed cases
+    case_report_writer = ut_report.JsonlReportWriter(run_arg.test_report_data_path)
     try:
-        try:
-            if sys.modules.get(run_arg.op_module_name):
-                print("[INFO]reload module for coverage ,moule name:", sys.modules.get(run_arg.op_module_name))
-                importlib.reload(sys.modules.get(run_arg.op_module_name))
-        except BaseException as run_err:  # 'pylint: disable=broad-except
-            logger.log_warn(f"reload module {run_arg.op_module_name} failed")
+        case_report_writer.open()
+        for case_rpt_json in run_arg.done_case_rpts.values():
+            case_report_writer.add_case_report(ut_report.OpUTCaseReport.parser_json_obj(case_rpt_json))
+        _reload_op_module(run_arg.op_module_name)
         case_dir = os.path.dirname(os.path.realpath(run_arg.case_file))
         case_module_name = os.path.basename(os.path.realpath(run_arg.case_file))[:-3]
         sys.path.insert(0, case_dir)
@@ -213,18 +330,33 @@ def _run_ut_case_file(run_arg: RunUTCaseFileArgs):
                                      simulator_mode=run_arg.simulator_mode,
                                      simulator_lib_path=run_arg.simulator_lib_path,
                                      simulator_dump_path=run_arg.dump_model_dir,
-                                     data_dump_dir=run_arg.data_dir)
+                                     data_dump_dir=run_arg.data_dir,
+                                     kernel_cache_dir=run_arg.kernel_cache_dir,
+                                     case_process_num=run_arg.case_process_num,
+                                     input_data_cache_dir=run_arg.input_data_cache_dir,
+                                     case_journal_path=run_arg.journal_path,
+                                     skip_case_names=list(run_arg.done_case_rpts),
+                                     failed_case_names=run_arg.failed_case_names,
+                                     failed_case_mode=run_arg.failed_case_mode,
+                                     simulator_lease_dir=run_arg.simulator_lease_dir,
+                                     simulator_slot_num=run_arg.simulator_slot_num,
+                                     case_report_writer=case_report_writer)
         if isinstance(run_arg.case_name, str):
             case_name_list = run_arg.case_name.split(",")
         else:
             case_name_list = run_arg.case_name
-        ut_rpt = case_runner.run(run_arg.soc_version, ut_case, case_name_list, case_usage_list)
-        ut_rpt.save(run_arg.test_report_data_path)
+        case_runner.run(run_arg.soc_version, ut_case, case_name_list, case_usage_list)
+        case_report_writer.close()
+        if run_arg.journal_path:
+            op_ut_journal.RunJournal(run_arg.journal_path).append_task(run_arg.case_file, run_arg.soc_version,
+                                                                       run_arg.test_report_data_path)
         del sys.modules[case_module_name]
     except BaseException as run_err:  # 'pylint: disable=broad-except
         logger.log_err("Test Failed! case_file: %s, error_msg: %s" % (run_arg.case_file, run_err.args[0]),
                        print_trace=True)
         res = False
+    finally:
+        case_report_writer.close()
 
     if run_arg.cov_report:
         ut_cover.stop()
@@ -233,34 +365,269 @@ def _run_ut_case_file(run_arg: RunUTCaseFileArgs):
     return res
 
 
+def get_worker_context(start_method=None):
+    """
+    get multiprocessing context to create case file worker pool
+    :param start_method: None/fork/spawn/forkserver, None means the platform default,
+                         forkserver imports WORKER_PRELOAD_MODULES once in the server and forks clean workers from it
+    :return: multiprocessing context
+    """
+    if start_method == "forkserver":
+        if "forkserver" not in multiprocessing.get_all_start_methods():
+            logger.log_warn("forkserver is not supported on this platform, use the default start method")
+            return multiprocessing.get_context()
+        worker_context = multiprocessing.get_context("forkserver")
+        # only work before the forkserver started, the server is shared by all pools of this process
+        worker_context.set_forkserver_preload(list(Constant.WORKER_PRELOAD_MODULES))
+        return worker_context
+    return multiprocessing.get_context(start_method)
+
+
+def _run_ut_case_file_with_duration(run_arg: RunUTCaseFileArgs):
+    start_time = time.time()
+    res = _run_ut_case_file(run_arg)
+    return run_arg.case_file, run_arg.soc_version, res, time.time() - start_time
+
+
+def _build_hung_case_report(run_arg: RunUTCaseFileArgs, hang_info):
+    case_info = op_ut_case_info.OpUTBaseCase.parser_json_obj(hang_info.get("case_info"))
+    if not case_info:
+        return None
+    if hang_info.get("reason") == op_ut_worker_pool.Constant.HANG_WORKER_EXIT:
+        err_msg = "worker process exit unexpectedly, exit code: %s" % hang_info.get("exitcode")
+    elif hang_info.get("reason") == op_ut_worker_pool.Constant.HANG_CASE_TIMEOUT:
+        err_msg = "case timeout, killed after %.1fs" % hang_info.get("case_elapsed")
+    else:
+        err_msg = "case file timeout, killed after %.1fs of the case file" % hang_info.get("elapsed")
+    case_trace = op_ut_case_info.OpUTCaseTrace(run_arg.soc_version, case_info)
+    case_trace.add_stage_result(op_ut_case_info.OpUTStageResult(status=op_status.ERROR,
+                                                                stage_name=hang_info.get("stage_name"),
+                                                                err_msg=err_msg))
+    case_rpt = ut_report.OpUTCaseReport(case_trace)
+    # only the cases killed by the worker pool are error, the case did not complete
+    case_rpt.status = op_status.ERROR
+    case_rpt.duration = hang_info.get("case_elapsed")
+    return case_rpt
+
+
+def _handle_hung_task(run_arg: RunUTCaseFileArgs, hang_info):
+    """
+    called by the worker pool when the worker of run_arg is killed by timeout or exits unexpectedly,
+    the hung case is recorded as error, the rest cases of a case timeout or a crash are run again by a new worker,
+    the case file of a file timeout is finished with the completed cases.
+    """
+    logger.log_err("case file task %s, case: %s, stage: %s, %s after %.1fs" % (
+        run_arg.case_file, hang_info.get("case_name"), hang_info.get("stage_name"), hang_info.get("reason"),
+        hang_info.get("elapsed")))
+    done_case_rpts = dict(run_arg.done_case_rpts)
+    done_case_rpts.update(hang_info.get("done_cases"))
+    hung_case_rpt = _build_hung_case_report(run_arg, hang_info)
+    if hung_case_rpt:
+        done_case_rpts[hung_case_rpt.case_name] = hung_case_rpt.to_json_obj()
+        if run_arg.journal_path:
+            op_ut_journal.RunJournal(run_arg.journal_path).append_case(run_arg.case_file, run_arg.soc_version,
+                                                                       hung_case_rpt.case_name,
+                                                                       hung_case_rpt.to_json_obj())
+    run_arg.done_case_rpts = done_case_rpts
+    if hung_case_rpt and hang_info.get("reason") != op_ut_worker_pool.Constant.HANG_TASK_TIMEOUT:
+        return None, run_arg
+
+    ut_rpt = ut_report.OpUTReport()
+    for case_rpt_json in done_case_rpts.values():
+        ut_rpt.add_case_report(ut_report.OpUTCaseReport.parser_json_obj(case_rpt_json))
+    ut_rpt.save(run_arg.test_report_data_path, report_format=ut_report.Constant.REPORT_FORMAT_JSONL)
+    if run_arg.journal_path:
+        op_ut_journal.RunJournal(run_arg.journal_path).append_task(run_arg.case_file, run_arg.soc_version,
+                                                                   run_arg.test_report_data_path)
+    return (run_arg.case_file, run_arg.soc_version, False, hang_info.get("elapsed")), None
+
+
+def _get_memory_budget(memory_budget):
+    if memory_budget is None:
+        return None
+    if memory_budget > 0:
+        return int(memory_budget) * Constant.MEGABYTE
+    available_memory = op_ut_worker_pool.get_available_memory()
+    if not available_memory:
+        logger.log_warn("can not get the available memory, run without memory budget")
+        return None
+    return int(available_memory * Constant.AUTO_MEMORY_BUDGET_RATIO)
+
+
+def _run_scheduled(run_args, history: op_ut_schedule.DurationHistory, cpu_count, in_process=False,
+                   worker_start_method=None, case_timeout=None, file_timeout=None, memory_budget=None,
+                   max_tasks_per_worker=None, max_worker_rss=None, event_log_path=None, event_log_append=False):
+    run_args, predicted_makespan = op_ut_schedule.schedule_lpt(run_args, history, cpu_count)
+    # case files with failed cases of the last run go first, keep the lpt order in each group
+    run_args.sort(key=lambda run_arg: not run_arg.failed_case_names)
+    start_time = time.time()
+    task_estimates = {(run_arg.case_file, run_arg.soc_version): history.estimate(run_arg.case_file,
+                                                                                  run_arg.soc_version)
+                      for run_arg in run_args}
+    event_log = op_ut_event_log.EventLog(event_log_path, task_estimates, append=event_log_append) \
+        if event_log_path else None
+    if event_log:
+        event_log.open()
+    try:
+        results = _run_tasks(run_args, history, cpu_count, in_process, event_log,
+                             worker_start_method=worker_start_method, case_timeout=case_timeout,
+                             file_timeout=file_timeout, memory_budget=memory_budget,
+                             max_tasks_per_worker=max_tasks_per_worker, max_worker_rss=max_worker_rss)
+    finally:
+        if event_log:
+            event_log.close()
+    actual_makespan = time.time() - start_time
+    logger.log_info("run %d case file tasks in %d processes, predicted makespan: %.1fs, actual makespan: %.1fs" % (
+        len(run_args), cpu_count, predicted_makespan, actual_makespan))
+    return results
+
+
+def _get_pool_event_func(event_log: op_ut_event_log.EventLog = None):
+    if not event_log:
+        return None
+    return lambda event, run_arg: event_log.on_worker_event(event, run_arg.case_file, run_arg.soc_version)
+
+
+def _run_in_process(run_args, event_log: op_ut_event_log.EventLog = None):
+    for run_arg in run_args:
+        if event_log:
+            op_ut_worker_pool.set_local_event_func(
+                lambda event, task_arg=run_arg: event_log.on_worker_event(event, task_arg.case_file,
+                                                                          task_arg.soc_version))
+        try:
+            yield _run_ut_case_file_with_duration(run_arg) + (None,)
+        finally:
+            op_ut_worker_pool.set_local_event_func(None)
+
+
+# 'pylint: disable=too-many-arguments
+def _run_tasks(run_args, history: op_ut_schedule.DurationHistory, cpu_count, in_process,
+               event_log: op_ut_event_log.EventLog = None, worker_start_method=None, case_timeout=None,
+               file_timeout=None, memory_budget=None, max_tasks_per_worker=None, max_worker_rss=None):
+    if in_process:
+        results = _collect_task_results(_run_in_process(run_args, event_log), history, event_log)
+    else:
+        memory_budget = _get_memory_budget(memory_budget)
+        if memory_budget:
+            logger.log_info("case file workers memory budget: %dMB" % (memory_budget // Constant.MEGABYTE))
+        with op_ut_worker_pool.WorkerPool(cpu_count, _run_ut_case_file_with_duration,
+                                          mp_context=get_worker_context(worker_start_method),
+                                          task_timeout=file_timeout, case_timeout=case_timeout,
+                                          timeout_func=_handle_hung_task, memory_budget=memory_budget,
+                                          task_memory_func=lambda run_arg: history.estimate_memory(
+                                              run_arg.case_file, run_arg.soc_version),
+                                          max_tasks_per_worker=max_tasks_per_worker,
+                                          max_worker_rss=max_worker_rss * Constant.MEGABYTE if max_worker_rss
+                                          else None,
+                                          event_func=_get_pool_event_func(event_log)) as pool:
+            task_results = (task_res + (task_stat.get("peak_rss"),)
+                            for _, task_res, task_stat in pool.imap_unordered(run_args))
+            results = _collect_task_results(task_results, history, event_log)
+        if pool.replace_cnt > 0:
+            logger.log_warn("%d case file workers are killed by timeout or exit unexpectedly" % pool.replace_cnt)
+        if pool.hold_cnt > 0:
+            logger.log_info("%d case file tasks are held back by the memory budget" % pool.hold_cnt)
+        _print_worker_stats(pool)
+    return results
+
+
+def _print_worker_stats(pool: op_ut_worker_pool.WorkerPool):
+    for worker_stat in sorted(pool.worker_stats, key=lambda x: x.get("worker_id")):
+        logger.log_info("case file worker %d, task count: %d, peak rss: %dMB, stop reason: %s" % (
+            worker_stat.get("worker_id"), worker_stat.get("task_cnt"),
+            worker_stat.get("peak_rss") // Constant.MEGABYTE, worker_stat.get("stop_reason")))
+    if pool.recycle_cnt > 0:
+        logger.log_info("%d case file workers are recycled by max_tasks_per_worker or max_worker_rss" %
+                        pool.recycle_cnt)
+
+
+def _collect_task_results(task_results, history: op_ut_schedule.DurationHistory,
+                          event_log: op_ut_event_log.EventLog = None):
+    results = []
+    for case_file, soc_version, res, duration, peak_rss in task_results:
+        history.update(case_file, soc_version, duration, peak_rss=peak_rss)
+        if event_log:
+            event_log.on_task_end(case_file, soc_version, res, duration, peak_rss)
+        results.append(res)
+    return results
+
+
+def _skip_journaled_work(run_args, run_journal: op_ut_journal.RunJournal):
+    remain_args = []
+    done_case_cnt = 0
+    for run_arg in run_args:
+        if run_journal.is_task_done(run_arg.case_file, run_arg.soc_version, run_arg.test_report_data_path):
+            continue
+        run_arg.done_case_rpts = run_journal.get_done_cases(run_arg.case_file, run_arg.soc_version)
+        done_case_cnt += len(run_arg.done_case_rpts)
+        remain_args.append(run_arg)
+    logger.log_info("resume run, skip %d completed case file tasks and %d completed cases of the rest tasks" % (
+        len(run_args) - len(remain_args), done_case_cnt))
+    return remain_args
+
+
+def _store_results(result_store_path, run_id, report_data_path, shard=None):
+    run_id = run_id if run_id else op_ut_result_store.new_run_id()
+    try:
+        with op_ut_result_store.ResultStore(result_store_path) as result_store:
+            case_cnt = result_store.add_report_file(run_id, report_data_path, shard=shard)
+    except (OSError, ValueError, KeyError, RuntimeError, sqlite3.Error) as store_err:
+        logger.log_warn("store results failed, result store: %s, error msg: %s" % (result_store_path, store_err))
+        return
+    logger.log_info("store %d case results of run %s to %s" % (case_cnt, run_id, result_store_path))
+
+
+def _apply_last_failed(run_args, test_report_path, failed_case_mode):
+    last_report_path = os.path.join(test_report_path, ".ut_test_report")
+    failed_case_map = {}
+    if os.path.isfile(last_report_path):
+        last_report = ut_report.OpUTReport()
+        try:
+            last_report.load(last_report_path)
+            failed_case_map = last_report.get_failed_case_names()
+        except (OSError, ValueError, KeyError) as load_err:
+            logger.log_warn("load last report failed, run all cases, error msg: %s" % load_err)
+    if not failed_case_map:
+        logger.log_info("no failed case in last report %s, run all cases" % last_report_path)
+        return run_args
+    for run_arg in run_args:
+        run_arg.failed_case_names = sorted(failed_case_map.get((os.path.realpath(run_arg.case_file),
+                                                                run_arg.soc_version), []))
+    if failed_case_mode == op_ut_case_info.Constant.FAILED_MODE_LAST_FAILED:
+        run_args = [run_arg for run_arg in run_args if run_arg.failed_case_names]
+    logger.log_info("%s, %d failed cases of last run in %d case file tasks" % (
+        failed_case_mode, sum(len(case_names) for case_names in failed_case_map.values()), len(failed_case_map)))
+    return run_args
 
 
 def _check_args(case_dir, test_report, cov_report):
     if not case_dir:
         logger.log_err("Not set case dir")
         return False
-    if test_report and test_report not in ("json", "console"):
-        logger.log_err("'test_report' only support 'json/console'.")
+    if test_report and test_report not in ("json", "console", ut_report.Constant.REPORT_FORMAT_JSONL):
+        logger.log_err("'test_report' only support 'json/jsonl/console'.")
         return False
-    if cov_report and cov_report not in ("html", "json", "xml"):
-        logger.log_err("'cov_report' only support 'html/json/xml'.")
+    if cov_report and cov_report not in ("html", "json", "xml", Constant.COV_REPORT_DATA):
+        logger.log_err("'cov_report' only support 'html/json/xml/data'.")
         return False
     return True
 
 
-def _build_cov_data_path(cov_report_path):
+def _build_cov_data_path(cov_report_path, keep_exist=False):
     cov_combine_path = os.path.join(os.path.realpath(cov_report_path), "combine_data_path")
-    if os.path.exists(cov_combine_path):
+    if os.path.exists(cov_combine_path) and not keep_exist:
         shutil.rmtree(cov_combine_path)
-    file_util.makedirs(cov_combine_path, mode=Constant.DATA_DIR_MODES)
+    if not os.path.exists(cov_combine_path):
+        file_util.makedirs(cov_combine_path, mode=Constant.DATA_DIR_MODES)
     return cov_combine_path
 
 
-def _build_report_data_path(test_report_path):
+def _build_report_data_path(test_report_path, keep_exist=False):
     rpt_combine_path = os.path.join(os.path.realpath(test_report_path), "combine_rpt_path")
-    if os.path.exists(rpt_combine_path):
+    if os.path.exists(rpt_combine_path) and not keep_exist:
         shutil.rmtree(rpt_combine_path)
-    file_util.makedirs(rpt_combine_path, mode=Constant.DATA_DIR_MODES)
+    if not os.path.exists(rpt_combine_path):
+        file_util.makedirs(rpt_combine_path, mode=Constant.DATA_DIR_MODES)
     return rpt_combine_path
 
 
@@ -269,21 +636,72 @@ def run_ut(case_dir, soc_version, case_name=None,  # 'pylint: disable=too-many-a
            cov_report=None, cov_report_path="./cov_report",
            simulator_mode=None, simulator_lib_path=None,
            simulator_data_path="./model", test_data_path="./data",
-           process_num=0):
+           process_num=0, kernel_cache_path=None, case_process_num=1, input_data_cache_path=None,
+           duration_history_path=None, shard=None, worker_start_method=None, resume=False,
+           case_timeout=None, file_timeout=None, last_failed=False, failed_first=False, memory_budget=None,
+           max_tasks_per_worker=None, max_worker_rss=None, cov_fast=False, simulator_slots=None,
+           event_log_path=None, result_store_path=None, run_id=None):
     """
     run ut test case
     :param case_dir: a test case dir or a test case file
     :param soc_version: like "Ascend910", "Ascend310"
     :param case_name: run case name, default is None, run all test case
-    :param test_report: support console/json, report format type
+    :param test_report: support console/json/jsonl, report format type, jsonl report has one case a line,
+                        the case file reports are concatenated to it but not parsed and rebuilt,
+                        and only the failed and error cases are printed
     :param test_report_path: test report save path
-    :param cov_report: support html/json/xml type, if None means not need coverage report
+    :param cov_report: support html/json/xml/data type, if None means not need coverage report,
+                       data means only combine the coverage data to cov_report_path/.coverage,
+                       render it later by `coverage html`
     :param cov_report_path: coverage report save path
     :param simulator_mode: simulator_mode can be None/pv/ca/tm/esl
     :param simulator_lib_path: simulator library path
     :param simulator_data_path: test data directory, input, output and expect output data
     :param test_data_path: when run ca or tm mode, dump data save in this dirctory
-    :param process_num: when 0 means use cpu_count, else means process count
+    :param process_num: when None or 0 means use cpu_count, else means process count
+    :param kernel_cache_path: compiled kernel cache directory, default is None, not use kernel cache
+    :param case_process_num: process count to run the cases in one case file, each case file worker forks its
+                             case worker processes, the cases of a dynamic shape bucket run in parallel after the
+                             first case compiles the kernel, case_timeout not works for these cases, file_timeout
+                             works, default is 1, run the cases one by one
+    :param input_data_cache_path: generated random input data cache directory, default is None, not use cache
+    :param duration_history_path: case file run duration history file, used to run the longest case files first,
+                                  default is None, use ".ut_duration_history.json" in test_report_path
+    :param shard: like "0/4", only run the 1st of 4 shards of (case file, soc) tasks, and be merged by
+                  merge_shard_reports, the shards are balanced by duration history only when duration_history_path
+                  is set, all shards should use the same file, else they are balanced by case file size,
+                  since the local histories of the machines differ
+    :param worker_start_method: None/fork/spawn/forkserver, how to start case file worker processes,
+                                default is None, the platform default, forkserver imports the heavy modules once,
+                                the caller's main module must be guarded by `if __name__ == "__main__"`
+    :param resume: resume a broken run with the same args, skip the (case file, soc) tasks and cases recorded
+                   in the journal ".ut_run_journal" of test_report_path, and keep the reports of the broken run
+    :param case_timeout: seconds, a case runs longer is killed with its worker and recorded as error,
+                         the rest cases of the case file run in a new worker, default is None, no timeout
+    :param file_timeout: seconds, a case file task runs longer is killed with its worker, the running case is
+                         recorded as error and the rest cases are skipped, default is None, no timeout
+    :param last_failed: only run the failed and error cases in the last report ".ut_test_report" of
+                        test_report_path, run all cases when the last report has no failed case
+    :param failed_first: run the failed and error cases in the last report before the other cases
+    :param memory_budget: MB, memory budget of the case file workers, a case file task waits while its peak memory
+                          in duration history would exceed the budget, 0 means 80% of the available memory,
+                          default is None, no budget, the tasks start as soon as a worker is idle
+    :param max_tasks_per_worker: a case file worker is replaced by a new one after run this count of case file
+                                 tasks, default is None, not limit
+    :param max_worker_rss: MB, a case file worker is replaced by a new one when its rss is bigger after a case file
+                           task, default is None, not limit
+    :param cov_fast: collect coverage with the lowest overhead tracer of the interpreter(sysmon or ctrace),
+                     and only trace the op module files, default is False, trace the whole op directory
+    :param simulator_slots: simulator instance count can run at the same time, the workers lease a slot before
+                            run a kernel on simulator, compile and other cases run at full parallelism,
+                            default is None, 1 for esl and not limited for the other modes
+    :param event_log_path: jsonl log of the case start, stage start and end, case end and case file task end
+                           events, can be tailed while running, default is None, use ".ut_event_log.jsonl" in
+                           test_report_path
+    :param result_store_path: sqlite database to keep the case results and durations of the runs, query it by
+                              op_ut_result_store.py, default is None, not store
+    :param run_id: run id of the stored results, shards of a run can use the same run id, default is None,
+                   generated by the time and pid
 
     :return: success or failed
     """
@@ -292,14 +710,32 @@ def run_ut(case_dir, soc_version, case_name=None,  # 'pylint: disable=too-many-a
     print("start run ops ut time: %s" % datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"))
     if not _check_args(case_dir, test_report, cov_report):
         return failed
+    shard_index, shard_count = op_ut_schedule.parse_shard(shard) if shard else (None, None)
+    # None and 0 both mean use cpu_count
+    worker_num = process_num if process_num else max(multiprocessing.cpu_count() - 1, 1)
+    if case_timeout and case_process_num > 1:
+        logger.log_warn("case_timeout not works for the cases run in case worker processes, "
+                        "use file_timeout to stop a hung case file")
+    failed_case_mode = None
+    if last_failed:
+        failed_case_mode = op_ut_case_info.Constant.FAILED_MODE_LAST_FAILED
+    elif failed_first:
+        failed_case_mode = op_ut_case_info.Constant.FAILED_MODE_FAILED_FIRST
 
     case_file_info_list, load_has_err = ut_loader.load_ut_cases(case_dir)
     if not case_file_info_list:
         logger.log_err("Not found any test cases.")
         return failed
 
-    cov_combine_dir = _build_cov_data_path(cov_report_path)
-    rpt_combine_dir = _build_report_data_path(test_report_path)
+    cov_combine_dir = _build_cov_data_path(cov_report_path, keep_exist=resume)
+    rpt_combine_dir = _build_report_data_path(test_report_path, keep_exist=resume)
+    run_journal = op_ut_journal.RunJournal(os.path.join(test_report_path, op_ut_journal.Constant.JOURNAL_FILE_NAME))
+    if resume:
+        run_journal.load()
+    else:
+        run_journal.reset()
+
+    simulator_lease_dir = os.path.join(os.path.realpath(test_report_path), op_ut_sim_lease.Constant.LEASE_DIR_NAME)
 
     def _build_multiprocess_run_args():
 
@@ -316,7 +752,7 @@ def run_ut(case_dir, soc_version, case_name=None,  # 'pylint: disable=too-many-a
             for one_soc_version in soc_version_list:
                 single_cov_data_path = os.path.join(cov_combine_dir, ".coverage_" + str(ps_count) + "_" + case_file_tmp)
                 single_rpt_data_path = os.path.join(rpt_combine_dir,
-                                                    "rpt_" + str(ps_count) + "_" + case_file_tmp + ".data")
+                                                    "rpt_%06d_%s.data" % (ps_count, case_file_tmp))
                 run_arg = RunUTCaseFileArgs(case_file=case_file_info.case_file,
                                             op_module_name=case_file_info.op_module_name,
                                             soc_version=one_soc_version,
@@ -328,7 +764,16 @@ def run_ut(case_dir, soc_version, case_name=None,  # 'pylint: disable=too-many-a
                                             simulator_mode=simulator_mode,
                                             simulator_lib_path=simulator_lib_path,
                                             data_dir=test_data_path,
-                                            dump_model_dir=simulator_data_path)
+                                            dump_model_dir=simulator_data_path,
+                                            kernel_cache_dir=kernel_cache_path,
+                                            case_process_num=case_process_num,
+                                            input_data_cache_dir=input_data_cache_path,
+                                            cov_relative_files=shard is not None,
+                                            journal_path=run_journal.journal_path,
+                                            failed_case_mode=failed_case_mode,
+                                            cov_fast=cov_fast,
+                                            simulator_lease_dir=simulator_lease_dir,
+                                            simulator_slot_num=simulator_slots)
                 total_run_arg_list[one_soc_version].append(run_arg)
                 ps_count += 1
         return total_run_arg_list, ps_count
@@ -337,55 +782,90 @@ def run_ut(case_dir, soc_version, case_name=None,  # 'pylint: disable=too-many-a
 
     logger.log_info("multiprocess_run_args count: %d" % total_count)
 
-    if process_num == 1:
+    history_shared = bool(duration_history_path)
+    if not duration_history_path:
+        duration_history_path = os.path.join(test_report_path, op_ut_schedule.Constant.HISTORY_FILE_NAME)
+    duration_history = op_ut_schedule.DurationHistory(duration_history_path)
+    duration_history.load()
+    if not event_log_path:
+        event_log_path = os.path.join(test_report_path, op_ut_event_log.Constant.EVENT_LOG_FILE_NAME)
+
+    # all (case file, soc) tasks share one pool, the socs interleave freely,
+    # cases are grouped by soc again when combine the reports
+    total_args = []
+    for _, soc_args in multiprocess_run_args.items():
+        total_args.extend(soc_args)
+    report_shard = None
+    if shard:
+        shard_history = duration_history
+        if not history_shared:
+            logger.log_info("duration_history_path not set, balance the shards by case file size")
+            shard_history = op_ut_schedule.DurationHistory(duration_history_path)
+        shard_args, shard_estimate = op_ut_schedule.select_shard(total_args, shard_history, shard_index, shard_count)
+        logger.log_info("run shard %d/%d, case file task count: %d, estimated duration: %.1fs" % (
+            shard_index, shard_count, len(shard_args), shard_estimate))
+        report_shard = op_ut_schedule.build_shard_info(total_args, shard_args, shard_index, shard_count)
+        total_args = shard_args
+    if failed_case_mode:
+        total_args = _apply_last_failed(total_args, test_report_path, failed_case_mode)
+    if resume:
+        total_args = _skip_journaled_work(total_args, run_journal)
+    if not total_args:
+        logger.log_info("no case file task to run")
+        results = [True, ]
+    elif process_num == 1:
         logger.log_info("process_num is 1, run cases one by one")
-        results = []
-        for _, soc_args in multiprocess_run_args.items():
-            for soc_arg in soc_args:
-                res = _run_ut_case_file(soc_arg)
-                results.append(res)
-        run_success = reduce(lambda x, y: x and y, results)
+        # timeouts need a supervised worker process
+        results = _run_scheduled(total_args, duration_history, 1,
+                                 in_process=not case_timeout and not file_timeout,
+                                 worker_start_method=worker_start_method,
+                                 case_timeout=case_timeout, file_timeout=file_timeout,
+                                 event_log_path=event_log_path, event_log_append=resume)
     else:
-        if process_num == 0:
-            cpu_count = max(multiprocessing.cpu_count() - 1, 1)
-            logger.log_info("multiprocessing cpu count: %d" % cpu_count)
+        if not process_num:
+            logger.log_info("multiprocessing cpu count: %d" % worker_num)
         else:
-            cpu_count = process_num
             logger.log_info("process_num is %s" % process_num)
 
-        if simulator_mode == "esl":
-            cpu_count = 1
-
-        if total_count < cpu_count:
-            total_args = []
-            for _, soc_args in multiprocess_run_args.items():
-                for soc_arg in soc_args:
-                    total_args.append(soc_arg)
-            if len(total_args) == 1:
-                res = _run_ut_case_file(total_args[0])
-                results = [res, ]
-            else:
-                with Pool(processes=cpu_count) as pool:
-                    results = pool.map(_run_ut_case_file, total_args)
-            run_success = reduce(lambda x, y: x and y, results)
-        else:
-            results = []
-            for _, soc_args in multiprocess_run_args.items():
-                with Pool(processes=cpu_count) as pool:
-                    one_soc_results = pool.map(_run_ut_case_file, soc_args)
-                for result in one_soc_results:
-                    results.append(result)
-            run_success = reduce(lambda x, y: x and y, results)
-
-    test_report = ut_report.OpUTReport()
-    test_report.combine_report(rpt_combine_dir)
+        slot_num = op_ut_sim_lease.get_slot_num(simulator_mode, simulator_slots)
+        if slot_num > 0:
+            logger.log_info("%s simulator slot count: %d" % (simulator_mode, slot_num))
+
+        cpu_count = min(worker_num, len(total_args))
+        in_process = len(total_args) == 1 and not case_timeout and not file_timeout
+        results = _run_scheduled(total_args, duration_history, cpu_count, in_process=in_process,
+                                 worker_start_method=worker_start_method,
+                                 case_timeout=case_timeout, file_timeout=file_timeout,
+                                 memory_budget=memory_budget, max_tasks_per_worker=max_tasks_per_worker,
+                                 max_worker_rss=max_worker_rss, event_log_path=event_log_path,
+                                 event_log_append=resume)
+    run_success = reduce(lambda x, y: x and y, results)
+    try:
+        duration_history.save()
+    except OSError as save_err:
+        logger.log_warn("save duration history failed, error msg: %s" % save_err)
+
+    report_format = test_report
     report_data_path = os.path.join(test_report_path, ".ut_test_report")
-    test_report.save(report_data_path)
+    # jsonl report is on disk already, only keep the summary to print
+    test_report = ut_report.OpUTReport(summary_only=report_format == ut_report.Constant.REPORT_FORMAT_JSONL)
+    if report_format == ut_report.Constant.REPORT_FORMAT_JSONL:
+        ut_report.concat_reports(rpt_combine_dir, report_data_path, shard=report_shard)
+        # summaries of the case file reports are small, load them in a process pool
+        test_report.combine_report(rpt_combine_dir, process_num=process_num)
+        test_report.shard = report_shard
+    else:
+        test_report.combine_report(rpt_combine_dir, process_num=process_num)
+        test_report.shard = report_shard
+        test_report.save(report_data_path)
     if test_report:
         test_report.console_print()
+    if result_store_path:
+        _store_results(result_store_path, run_id, report_data_path, shard=report_shard)
 
-    if cov_report and len(multiprocess_run_args) > 0:
-        _combine_coverage(cov_report_path, cov_combine_dir)
+    if cov_report and os.listdir(cov_combine_dir):
+        _combine_coverage(cov_report_path, cov_combine_dir, relative_files=shard is not None, cov_report=cov_report,
+                          combine_process_num=worker_num)
 
     print("end run ops ut time: %s" % datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"))
     if load_has_err:
@@ -396,12 +876,108 @@ def run_ut(case_dir, soc_version, case_name=None,  # 'pylint: disable=too-many-a
     return run_result
 
 
-def _combine_coverage(cov_report_path, cov_combine_dir):
+def _combine_coverage_group(group_arg):
+    group_data_file, combine_files, relative_files = group_arg
+    cov = coverage.Coverage(data_file=group_data_file)
+    if relative_files:
+        cov.set_option("run:relative_files", True)
+    cov.combine(combine_files)
+    cov.save()
+    return group_data_file
+
+
+def _render_coverage(cov: coverage.Coverage, cov_report, cov_report_path):
+    if cov_report == Constant.COV_REPORT_DATA:
+        logger.log_info("coverage data is saved in %s, render it by `coverage html --data-file=%s`" % (
+            cov_report_path, os.path.join(cov_report_path, ".coverage")))
+        return
+    cov.load()
+    if cov_report == "xml":
+        cov.xml_report(outfile=os.path.join(cov_report_path, "coverage.xml"))
+    elif cov_report == "json":
+        cov.json_report(outfile=os.path.join(cov_report_path, "coverage.json"))
+    else:
+        cov.html_report(directory=cov_report_path)
+
+
+def _combine_coverage(cov_report_path, cov_combine_dir, relative_files=False, cov_report="html",
+                      combine_process_num=1):
     total_cov_data_file = os.path.join(cov_report_path, ".coverage")
-    cov = coverage.Coverage(source="impl", data_file=total_cov_data_file)
     combine_files = [os.path.join(cov_combine_dir, cov_file) for cov_file in os.listdir(cov_combine_dir)]
+    # combine the data files in groups in parallel, then combine the groups
+    group_num = min(combine_process_num, len(combine_files) // Constant.COV_COMBINE_GROUP_MIN_FILES)
+    if group_num > 1:
+        group_args = [(os.path.join(cov_combine_dir, ".coverage_group_%d" % idx), combine_files[idx::group_num],
+                       relative_files) for idx in range(group_num)]
+        with multiprocessing.Pool(processes=group_num) as pool:
+            combine_files = pool.map(_combine_coverage_group, group_args)
+    cov = coverage.Coverage(source="impl", data_file=total_cov_data_file)
+    if relative_files:
+        cov.set_option("run:relative_files", True)
     cov.combine(combine_files)
     cov.save()
-    cov.load()
-    cov.html_report(directory=cov_report_path)
+    _render_coverage(cov, cov_report, cov_report_path)
     os.removedirs(cov_combine_dir)
+
+
+def merge_shard_reports(shard_count, shard_report_paths, test_report_path="./report",
+                        shard_cov_report_paths=None, cov_report_path="./cov_report", test_report="json"):
+    """
+    merge the reports and coverage data of a sharded run, fail when any shard not reported back
+
+    Parameters
+    ----------
+    shard_count: int
+        the shard count of the run
+    shard_report_paths: list
+        test_report_path of each shard
+    test_report_path: str
+        merged test report save path
+    shard_cov_report_paths: list
+        cov_report_path of each shard, None means not merge coverage
+    cov_report_path: str
+        merged coverage report save path, should run in the same relative directory with the shards,
+        coverage data of shards use file paths relative to the run directory
+    test_report: str
+        json or jsonl, format of the merged report, jsonl concatenates the shard reports
+
+    Returns
+    -------
+    success or failed
+    """
+    success = "success"
+    failed = "failed"
+    shard_report_files = [os.path.join(path, ".ut_test_report") for path in shard_report_paths]
+    shard_report_files = [path for path in shard_report_files if os.path.isfile(path)]
+    report_data_path = os.path.join(test_report_path, ".ut_test_report")
+    report_format = test_report
+    test_report = ut_report.OpUTReport(summary_only=report_format == ut_report.Constant.REPORT_FORMAT_JSONL)
+    try:
+        if report_format == ut_report.Constant.REPORT_FORMAT_JSONL:
+            ut_report.concat_reports(shard_report_files, report_data_path, strict=True, shard_count=shard_count)
+            test_report.load(report_data_path)
+        else:
+            test_report.combine_report(shard_report_files, strict=True, shard_count=shard_count)
+            test_report.save(report_data_path)
+    except RuntimeError as merge_err:
+        logger.log_err("merge shard reports failed, error msg: %s" % merge_err.args[0])
+        return failed
+    test_report.console_print()
+
+    if shard_cov_report_paths:
+        shard_cov_files = [os.path.join(path, ".coverage") for path in shard_cov_report_paths]
+        shard_cov_files = [path for path in shard_cov_files if os.path.isfile(path)]
+        if shard_cov_files:
+            if not os.path.exists(cov_report_path):
+                file_util.makedirs(cov_report_path, mode=Constant.DATA_DIR_MODES)
+            cov = coverage.Coverage(source="impl", data_file=os.path.join(cov_report_path, ".coverage"))
+            cov.set_option("run:relative_files", True)
+            cov.combine(shard_cov_files, keep=True)
+            cov.save()
+            _render_coverage(cov, "html", cov_report_path)
+        else:
+            logger.log_warn("not found any shard coverage data to merge")
+
+    if test_report.err_cnt > 0 or test_report.failed_cnt > 0:
+        return failed
+    return success
@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Copyright 2020 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+
+"""
+op ut schedule, apply history duration and peak memory based scheduling of case files: DurationHistory,
+schedule_lpt, select_shard, build_shard_info, check_shard_units
+"""
+import os
+import json
+import stat
+import heapq
+import hashlib
+import tempfile
+
+from op_test_frame.common import logger
+from op_test_frame.utils import file_util
+
+
+# 'pylint: disable=too-few-public-methods
+class Constant:
+    """
+    This class for Constant.
+    """
+    DATA_DIR_MODES = stat.S_IWUSR | stat.S_IRUSR | stat.S_IXUSR | stat.S_IRGRP | stat.S_IXGRP
+    HISTORY_FORMAT_VERSION = "2"
+    HISTORY_FILE_NAME = ".ut_duration_history.json"
+    # estimate seconds per case file byte when no history can be used
+    DEFAULT_SECONDS_PER_BYTE = 0.001
+    # path components of case file used in history key, like "Add/test_add_impl.py"
+    DURATION_KEY_PATH_DEPTH = 2
+
+
+def get_duration_key(case_file, soc_version):
+    """
+    get the history key of a case file run on one soc version,
+    the key not contains the repo root, so that history can be shared by the machines
+    :param case_file: case file path
+    :param soc_version: soc version
+    :return: key str
+    """
+    path_items = os.path.realpath(case_file).split(os.path.sep)[-Constant.DURATION_KEY_PATH_DEPTH:]
+    return "%s|%s" % ("/".join(path_items), soc_version)
+
+
+def _get_file_size(case_file):
+    try:
+        return max(os.path.getsize(case_file), 1)
+    except OSError:
+        return 1
+
+
+class DurationHistory:
+    """
+    per case file and soc version run durations, persisted as a json file
+    """
+
+    def __init__(self, history_path):
+        self.history_path = os.path.realpath(history_path)
+        # key: case file|soc version, value: {"duration": seconds of last run, "size": case file size,
+        # "peak_rss": peak rss bytes of the worker when run the case file, only when measured}
+        self._duration_map = {}
+        self._seconds_per_byte = None
+
+    def load(self):
+        """
+        load history file, a missing or broken file means empty history
+        :return: None
+        """
+        if not os.path.exists(self.history_path):
+            return
+        try:
+            with open(self.history_path) as history_f:
+                json_obj = json.load(history_f)
+        except (OSError, ValueError) as load_err:
+            logger.log_warn("load duration history failed, history path: %s, error msg: %s" % (
+                self.history_path, load_err))
+            return
+        if json_obj.get("version") != Constant.HISTORY_FORMAT_VERSION:
+            return
+        self._duration_map = dict(json_obj.get("durations", {}))
+        self._seconds_per_byte = None
+
+    def save(self):
+        """
+        save history file, write a temp file and replace, so that a broken run not leave a half file
+        :return: None
+        """
+        history_dir = os.path.dirname(self.history_path)
+        if not os.path.exists(history_dir):
+            file_util.makedirs(history_dir, mode=Constant.DATA_DIR_MODES)
+        json_obj = {"version": Constant.HISTORY_FORMAT_VERSION, "durations": self._duration_map}
+        tmp_fd, tmp_path = tempfile.mkstemp(dir=history_dir, prefix=".tmp_history_")
+        with os.fdopen(tmp_fd, "w") as history_f:
+            json.dump(json_obj, history_f, indent=4, sort_keys=True)
+        os.replace(tmp_path, self.history_path)
+
+    def update(self, case_file, soc_version, duration, peak_rss=None):
+        """
+        record a run duration
+        :param case_file: case file path
+        :param soc_version: soc version
+        :param duration: duration seconds
+        :param peak_rss: peak rss bytes of the run, None means not measured, keep the recorded one
+        :return: None
+        """
+        duration_key = get_duration_key(case_file, soc_version)
+        duration_info = {"duration": round(duration, 3), "size": _get_file_size(case_file)}
+        if peak_rss:
+            duration_info["peak_rss"] = int(peak_rss)
+        elif self._duration_map.get(duration_key, {}).get("peak_rss"):
+            duration_info["peak_rss"] = self._duration_map.get(duration_key).get("peak_rss")
+        self._duration_map[duration_key] = duration_info
+        self._seconds_per_byte = None
+
+    def _get_seconds_per_byte(self):
+        if self._seconds_per_byte is not None:
+            return self._seconds_per_byte
+        total_duration = 0.0
+        total_size = 0
+        for duration_info in self._duration_map.values():
+            total_duration += duration_info.get("duration", 0)
+            total_size += duration_info.get("size", 0)
+        self._seconds_per_byte = total_duration / total_size if total_size else Constant.DEFAULT_SECONDS_PER_BYTE
+        return self._seconds_per_byte
+
+    def estimate(self, case_file, soc_version):
+        """
+        get the estimated duration, use history duration if has, else estimate by case file size
+        :param case_file: case file path
+        :param soc_version: soc version
+        :return: estimated duration seconds
+        """
+        duration_info = self._duration_map.get(get_duration_key(case_file, soc_version))
+        if duration_info is not None:
+            return duration_info.get("duration", 0)
+        return _get_file_size(case_file) * self._get_seconds_per_byte()
+
+    def estimate_memory(self, case_file, soc_version):
+        """
+        get the estimated peak memory, use history peak rss if has, else the mean of the recorded peak rss
+        :param case_file: case file path
+        :param soc_version: soc version
+        :return: estimated peak rss bytes, 0 when no peak rss recorded
+        """
+        duration_info = self._duration_map.get(get_duration_key(case_file, soc_version))
+        if duration_info is not None and duration_info.get("peak_rss"):
+            return duration_info.get("peak_rss")
+        peak_list = [info.get("peak_rss") for info in self._duration_map.values() if info.get("peak_rss")]
+        return sum(peak_list) // len(peak_list) if peak_list else 0
+
+
+def schedule_lpt(run_arg_list, history: DurationHistory, worker_num):
+    """
+    order run args by longest processing time first
+
+    Parameters
+    ----------
+    run_arg_list: list
+        run args which have case_file and soc_version attributes
+    history: DurationHistory
+        duration history to estimate
+    worker_num: int
+        worker process count
+
+    Returns
+    -------
+    (ordered run arg list, predicted makespan seconds)
+    """
+    estimate_list = [(history.estimate(run_arg.case_file, run_arg.soc_version), idx, run_arg)
+                     for idx, run_arg in enumerate(run_arg_list)]
+    estimate_list.sort(key=lambda x: (-x[0], x[1]))
+    # each task goes to the worker which gets free first
+    worker_loads = [0.0] * max(min(worker_num, len(estimate_list)), 1)
+    for estimate, _, _ in estimate_list:
+        heapq.heapreplace(worker_loads, worker_loads[0] + estimate)
+    return [run_arg for _, _, run_arg in estimate_list], max(worker_loads)
+
+
+def parse_shard(shard):
+    """
+    parse shard option
+    :param shard: str like "0/4", index is 0 based
+    :return: (shard_index, shard_count)
+    """
+    try:
+        shard_index, shard_count = [int(x) for x in str(shard).split("/")]
+    except ValueError as parse_err:
+        raise RuntimeError("shard should be like 'index/count', but got: %s" % shard) from parse_err
+    if shard_count <= 0 or not 0 <= shard_index < shard_count:
+        raise RuntimeError("shard index should in [0, count), but got: %s" % shard)
+    return shard_index, shard_count
+
+
+def select_shard(run_arg_list, history: DurationHistory, shard_index, shard_count):
+    """
+    partition (case file, soc) run args into shard_count shards balanced by the estimated duration, and
+    return the run args of one shard. The partition only depends on the case files, socs and history,
+    so every machine gets the same partition when they use the same history file.
+
+    Parameters
+    ----------
+    run_arg_list: list
+        run args which have case_file and soc_version attributes
+    history: DurationHistory
+        duration history to estimate
+    shard_index: int
+        the shard to select, 0 based
+    shard_count: int
+        total shard count
+
+    Returns
+    -------
+    (run arg list of the shard, estimated duration seconds of the shard)
+    """
+    unit_list = [(history.estimate(run_arg.case_file, run_arg.soc_version),
+                  get_duration_key(run_arg.case_file, run_arg.soc_version), run_arg.case_file, idx)
+                 for idx, run_arg in enumerate(run_arg_list)]
+    # sort by key but not the discovery order, the file walk order may be different between machines
+    unit_list.sort(key=lambda x: (-x[0], x[1], x[2]))
+    shard_loads = [(0.0, idx) for idx in range(shard_count)]
+    selected_idx_list = []
+    for estimate, _, _, run_arg_idx in unit_list:
+        shard_load, assign_idx = heapq.heappop(shard_loads)
+        heapq.heappush(shard_loads, (shard_load + estimate, assign_idx))
+        if assign_idx == shard_index:
+            selected_idx_list.append(run_arg_idx)
+    shard_load = [load for load, idx in shard_loads if idx == shard_index][0]
+    return [run_arg_list[idx] for idx in sorted(selected_idx_list)], shard_load
+
+
+def _get_units_digest(unit_keys):
+    return hashlib.sha256("\n".join(sorted(unit_keys)).encode()).hexdigest()
+
+
+def build_shard_info(run_arg_list, shard_run_arg_list, shard_index, shard_count):
+    """
+    build the shard info saved in the shard report, so that the merge can check the shards cover every
+    (case file, soc) unit exactly once
+    :param run_arg_list: run args of all the shards
+    :param shard_run_arg_list: run args of this shard
+    :param shard_index: shard index
+    :param shard_count: shard count
+    :return: dict of index, count, units(duration keys of this shard), unit_cnt and unit_digest of all the shards
+    """
+    unit_keys = [get_duration_key(run_arg.case_file, run_arg.soc_version) for run_arg in run_arg_list]
+    return {"index": shard_index,
+            "count": shard_count,
+            "units": sorted(get_duration_key(run_arg.case_file, run_arg.soc_version)
+                            for run_arg in shard_run_arg_list),
+            "unit_cnt": len(unit_keys),
+            "unit_digest": _get_units_digest(unit_keys)}
+
+
+def check_shard_units(shard_list):
+    """
+    check the shards are partitioned from the same units, and every unit is run by exactly one shard,
+    raise RuntimeError when not, the shards without units info are not checked
+    :param shard_list: shard info list, see build_shard_info
+    :return: None
+    """
+    unit_shard_list = [shard for shard in shard_list if shard and "units" in shard]
+    if not unit_shard_list:
+        return
+    if len(unit_shard_list) != len(shard_list):
+        raise RuntimeError("shard unit check failed, some shards have no units info")
+    if len(set((shard.get("unit_cnt"), shard.get("unit_digest")) for shard in unit_shard_list)) != 1:
+        raise RuntimeError("shard unit check failed, the shards are partitioned from different case files, "
+                           "or by different duration histories")
+    unit_shard_map = {}
+    for shard in unit_shard_list:
+        for unit_key in shard.get("units"):
+            unit_shard_map.setdefault(unit_key, []).append(shard.get("index"))
+    duplicate_list = sorted(key for key, index_list in unit_shard_map.items() if len(index_list) > 1)
+    missing_cnt = unit_shard_list[0].get("unit_cnt") - len(unit_shard_map)
+    if duplicate_list or missing_cnt or _get_units_digest(unit_shard_map) != unit_shard_list[0].get("unit_digest"):
+        raise RuntimeError("shard unit check failed, missing unit count: %d, duplicate units: [%s]" % (
+            missing_cnt, ", ".join(duplicate_list)))
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Copyright 2020 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+
+"""
+op ut simulator lease, apply limited simulator slots shared by case file worker processes: SimulatorLease
+"""
+import os
+import stat
+import time
+import fcntl
+
+from op_test_frame.utils import file_util
+
+
+# 'pylint: disable=too-few-public-methods
+class Constant:
+    """
+    This class for Constant.
+    """
+    DATA_DIR_MODES = stat.S_IWUSR | stat.S_IRUSR | stat.S_IXUSR | stat.S_IRGRP | stat.S_IXGRP
+    LEASE_FILE_FLAGS = os.O_RDWR | os.O_CREAT
+    LEASE_FILE_MODES = stat.S_IWUSR | stat.S_IRUSR
+    LEASE_DIR_NAME = ".ut_simulator_lease"
+    # simulator instance count can run at the same time, the modes not in it are not limited
+    DEFAULT_SLOT_NUM = {"esl": 1}
+    POLL_INTERVAL = 0.1
+
+
+def get_slot_num(simulator_mode, slot_num=None):
+    """
+    get simulator slot count of a simulator mode
+    :param simulator_mode: simulator mode, like pv/ca/tm/esl
+    :param slot_num: slot count set by user, None means use DEFAULT_SLOT_NUM
+    :return: slot count, 0 means not limited
+    """
+    if slot_num is not None:
+        return max(int(slot_num), 0)
+    return Constant.DEFAULT_SLOT_NUM.get(simulator_mode, 0)
+
+
+class SimulatorLease:
+    """
+    lease one of the simulator slots of a simulator mode, a slot is a locked file in lease_dir,
+    so the slots are shared by all processes which use the same lease_dir, and the lease of a killed process
+    is released by the system.
+    """
+
+    def __init__(self, lease_dir, simulator_mode, slot_num, timeout=None):
+        self.lease_dir = os.path.realpath(lease_dir)
+        self.simulator_mode = simulator_mode
+        self.slot_num = max(int(slot_num), 1)
+        self.timeout = timeout
+        self.slot_idx = None
+        self.wait_time = 0.0
+        self._lease_fd = None
+
+    def _try_lock_slot(self, slot_idx):
+        lease_path = os.path.join(self.lease_dir, "%s_slot_%d" % (self.simulator_mode, slot_idx))
+        lease_fd = os.open(lease_path, Constant.LEASE_FILE_FLAGS, Constant.LEASE_FILE_MODES)
+        try:
+            fcntl.flock(lease_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(lease_fd)
+            return False
+        self._lease_fd = lease_fd
+        self.slot_idx = slot_idx
+        return True
+
+    def acquire(self):
+        """
+        wait and lease a free slot
+        :return: leased slot index
+        """
+        if not os.path.exists(self.lease_dir):
+            file_util.makedirs(self.lease_dir, mode=Constant.DATA_DIR_MODES)
+        start_time = time.time()
+        # start from different slots in different processes, so that they do not contend the same slot
+        first_slot = os.getpid() % self.slot_num
+        while True:
+            for slot_offset in range(self.slot_num):
+                if self._try_lock_slot((first_slot + slot_offset) % self.slot_num):
+                    self.wait_time = time.time() - start_time
+                    return self.slot_idx
+            if self.timeout is not None and time.time() - start_time > self.timeout:
+                raise RuntimeError("lease %s simulator slot timeout, slot count: %d, wait seconds: %.1f" % (
+                    self.simulator_mode, self.slot_num, time.time() - start_time))
+            time.sleep(Constant.POLL_INTERVAL)
+
+    def release(self):
+        """
+        release the leased slot
+        :return: None
+        """
+        if self._lease_fd is None:
+            return
+        fcntl.flock(self._lease_fd, fcntl.LOCK_UN)
+        os.close(self._lease_fd)
+        self._lease_fd = None
+        self.slot_idx = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
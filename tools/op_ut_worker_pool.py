@@ -0,0 +1,514 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Copyright 2020 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+
+"""
+op ut worker pool, apply supervised worker processes with task and case timeouts, memory admission and
+worker recycling: WorkerPool, report_event, get_process_rss, get_descendant_pids,
+get_available_memory
+"""
+import os
+import time
+import signal
+import collections
+import multiprocessing
+from multiprocessing import connection
+
+from op_test_frame.common import logger
+from op_test_frame.ut import op_ut_case_info
+
+
+# 'pylint: disable=too-few-public-methods
+class Constant:
+    """
+    This class for Constant.
+    """
+    EVENT_TASK_START = "task_start"
+    EVENT_TASK_END = "task_end"
+    # reported by the supervisor when a worker is killed by timeout or exits unexpectedly
+    EVENT_TASK_HANG = "task_hang"
+    # why the supervisor stops a worker
+    HANG_CASE_TIMEOUT = "case_timeout"
+    HANG_TASK_TIMEOUT = "task_timeout"
+    HANG_WORKER_EXIT = "worker_exit"
+    # why a worker stops, recorded in worker stats
+    STOP_HUNG = "hung"
+    STOP_MAX_TASKS = "max_tasks"
+    STOP_MAX_RSS = "max_rss"
+    STOP_CLOSE = "close"
+    POLL_INTERVAL = 0.5
+    KILL_WAIT_SECONDS = 5
+    PROC_MEMORY_UNIT = 1024
+    # write to /proc/<pid>/clear_refs to reset the peak rss(VmHWM) of the process
+    CLEAR_PEAK_RSS = "5"
+
+
+# event connection, worker id and current task id of the worker process,
+# or the local event function of the process which runs tasks in process
+_WORKER_CONTEXT = {}
+
+
+def set_local_event_func(event_func):
+    """
+    receive the events reported in current process, used when run tasks in process but not in pool workers
+    :param event_func: called as event_func(event), None to stop receiving
+    :return: None
+    """
+    _WORKER_CONTEXT["event_func"] = event_func
+
+
+def report_event(event_type, **event_info):
+    """
+    report an event to the supervisor, or to the local event function when not in a pool worker process,
+    do nothing when neither exists
+    :param event_type: event type, EVENT_* of Constant or CASE_EVENT_* of op_ut_case_info.Constant
+    :param event_info: event info, should be picklable
+    :return: None
+    """
+    event_conn = _WORKER_CONTEXT.get("event_conn")
+    event_func = _WORKER_CONTEXT.get("event_func")
+    if event_conn is None and event_func is None:
+        return
+    event = {"type": event_type, "worker_id": _WORKER_CONTEXT.get("worker_id"),
+             "task_id": _WORKER_CONTEXT.get("task_id"), "time": time.time(),
+             "rss": _read_proc_memory("/proc/self/status", "VmRSS")}
+    event.update(event_info)
+    if event_conn is not None:
+        event_conn.send(event)
+    else:
+        event_func(event)
+
+
+def _read_proc_memory(proc_file, field_name):
+    try:
+        with open(proc_file) as proc_f:
+            for line in proc_f:
+                if line.startswith(field_name + ":"):
+                    return int(line.split()[1]) * Constant.PROC_MEMORY_UNIT
+    except (OSError, ValueError, IndexError):
+        return None
+    return None
+
+
+def get_process_rss(pid):
+    """
+    get resident memory bytes of a process
+    :param pid: process id
+    :return: rss bytes, None when not supported or the process exits
+    """
+    return _read_proc_memory("/proc/%d/status" % pid, "VmRSS")
+
+
+def get_descendant_pids(pid):
+    """
+    get the pids of the children of a process and their children, e.g. the case worker processes of a worker
+    :param pid: process id
+    :return: pid list, empty when not supported
+    """
+    descendant_pids = []
+    visit_pids = [pid]
+    while visit_pids:
+        visit_pid = visit_pids.pop()
+        task_dir = "/proc/%d/task" % visit_pid
+        try:
+            task_ids = os.listdir(task_dir)
+        except OSError:
+            continue
+        for task_id in task_ids:
+            try:
+                with open(os.path.join(task_dir, task_id, "children")) as children_f:
+                    child_pids = [int(x) for x in children_f.read().split()]
+            except (OSError, ValueError):
+                continue
+            descendant_pids.extend(child_pids)
+            visit_pids.extend(child_pids)
+    return descendant_pids
+
+
+def _kill_pids(pid_list):
+    for pid in pid_list:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+def get_available_memory():
+    """
+    get available memory bytes of the machine
+    :return: available bytes, None when not supported
+    """
+    return _read_proc_memory("/proc/meminfo", "MemAvailable")
+
+
+def _reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_f:
+            clear_f.write(Constant.CLEAR_PEAK_RSS)
+    except OSError:
+        pass
+
+
+def _worker_main(worker_id, task_queue, event_conn, task_func):
+    _WORKER_CONTEXT.update({"worker_id": worker_id, "event_conn": event_conn})
+    while True:
+        task_item = task_queue.get()
+        if task_item is None:
+            return
+        task_id, task_arg = task_item
+        _WORKER_CONTEXT["task_id"] = task_id
+        _reset_peak_rss()
+        report_event(Constant.EVENT_TASK_START)
+        result = task_func(task_arg)
+        report_event(Constant.EVENT_TASK_END, result=result,
+                     peak_rss=_read_proc_memory("/proc/self/status", "VmHWM"))
+        _WORKER_CONTEXT["task_id"] = None
+
+
+# 'pylint: disable=too-many-instance-attributes,too-few-public-methods
+class _WorkerInfo:
+    def __init__(self, worker_id, process, task_queue, event_conn):
+        self.worker_id = worker_id
+        self.process = process
+        self.task_queue = task_queue
+        # every worker has its own event pipe, so a killed worker can not break the events of other workers
+        self.event_conn = event_conn
+        self.task_id = None
+        self.task_arg = None
+        self.task_start = None
+        self.case_info = None
+        self.case_start = None
+        self.stage_name = None
+        # key: case name, value: case report json object of the completed cases of current task
+        self.done_cases = {}
+        # estimated memory of current task, and the peak rss sampled while running current task
+        self.task_memory = 0
+        self.sampled_peak_rss = 0
+        # completed task count and peak rss of the worker life
+        self.task_cnt = 0
+        self.peak_rss = 0
+
+    def get_rss(self):
+        # the case worker processes of the worker are counted too
+        rss = sum(get_process_rss(pid) or 0 for pid in [self.process.pid] + get_descendant_pids(self.process.pid))
+        if self.task_id is not None:
+            self.sampled_peak_rss = max(self.sampled_peak_rss, rss)
+        self.peak_rss = max(self.peak_rss, rss)
+        return rss
+
+    def get_stat(self, stop_reason):
+        return {"worker_id": self.worker_id, "task_cnt": self.task_cnt, "peak_rss": self.peak_rss,
+                "stop_reason": stop_reason}
+
+    def assign(self, task_id, task_arg, task_memory=0):
+        self.task_id = task_id
+        self.task_arg = task_arg
+        self.task_memory = task_memory
+        self.sampled_peak_rss = 0
+        self.task_start = time.time()
+        self.case_info = None
+        self.case_start = None
+        self.stage_name = None
+        self.done_cases = {}
+        self.task_queue.put((task_id, task_arg))
+
+    def release(self):
+        self.task_id = None
+        self.task_arg = None
+
+
+class WorkerPool:
+    """
+    worker pool supervised by the caller process, a worker which runs a task or a case longer than the timeout,
+    or exits unexpectedly, is killed and replaced by a new worker, and the timeout_func decides what to do with
+    the task.
+
+    task_func runs in worker processes, it can report case progress by report_event with CASE_EVENT_* of
+    op_ut_case_info.Constant, event info: case_name, case_info(case json object) of case start event,
+    stage_name of stage start event, case_report(case report json object) of case end event.
+
+    timeout_func runs in caller process, called as timeout_func(task_arg, hang_info), hang_info is a dict:
+    reason(HANG_* of Constant), elapsed(of the task), case_elapsed, case_name, case_info, stage_name, done_cases,
+    exitcode.
+    it returns (result, retry_task_arg), result not None is yielded as the task result,
+    retry_task_arg not None is run again by a new worker before other pending tasks.
+
+    when memory_budget is set, a pending task starts only when the projected memory, the rss of idle workers
+    plus max(estimated memory, rss) of busy workers plus the estimated memory of the task, is in the budget.
+    the first held task reserves its memory, smaller tasks behind it start only in the rest of the budget,
+    so it is not starved. a task always starts when no other task is running.
+
+    a worker is replaced by a new one after it completes max_tasks_per_worker tasks, or when its rss is bigger
+    than max_worker_rss after a task, the stats of all workers are in worker_stats after close.
+
+    event_func runs in caller process, called as event_func(event, task_arg) for each case event of the workers,
+    and for EVENT_TASK_HANG with the hang info when a worker is killed or exits unexpectedly.
+    """
+
+    def __init__(self, worker_num, task_func, mp_context=None, task_timeout=None, case_timeout=None,
+                 timeout_func=None, memory_budget=None, task_memory_func=None, max_tasks_per_worker=None,
+                 max_worker_rss=None, event_func=None):
+        self.worker_num = max(int(worker_num), 1)
+        self.task_func = task_func
+        self.mp_context = mp_context if mp_context else multiprocessing.get_context()
+        self.task_timeout = task_timeout
+        self.case_timeout = case_timeout
+        self.timeout_func = timeout_func
+        self.memory_budget = memory_budget
+        self.task_memory_func = task_memory_func
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.max_worker_rss = max_worker_rss
+        self.event_func = event_func
+        self._workers = {}
+        self._next_worker_id = 0
+        self._next_task_id = 0
+        self._pending = collections.deque()
+        self.replace_cnt = 0
+        self.hold_cnt = 0
+        self.recycle_cnt = 0
+        self._held_task_ids = set()
+        # stats of the stopped workers: worker_id, task_cnt, peak_rss, stop_reason
+        self.worker_stats = []
+
+    def __enter__(self):
+        for _ in range(self.worker_num):
+            self._start_worker()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close(terminate=exc_type is not None)
+
+    def _start_worker(self):
+        worker_id = self._next_worker_id
+        self._next_worker_id += 1
+        task_queue = self.mp_context.SimpleQueue()
+        event_recv_conn, event_send_conn = self.mp_context.Pipe(duplex=False)
+        # not daemonic, so that a worker can run the cases of a big case file in case worker processes,
+        # the workers are stopped by close or __exit__
+        process = self.mp_context.Process(target=_worker_main, name="op_ut_worker_%d" % worker_id,
+                                          args=(worker_id, task_queue, event_send_conn, self.task_func),
+                                          daemon=False)
+        process.start()
+        event_send_conn.close()
+        self._workers[worker_id] = _WorkerInfo(worker_id, process, task_queue, event_recv_conn)
+
+    def _stop_worker(self, worker: _WorkerInfo, stop_reason=Constant.STOP_HUNG):
+        self._workers.pop(worker.worker_id, None)
+        self.worker_stats.append(worker.get_stat(stop_reason))
+        # the case worker processes of a killed worker would be left running
+        descendant_pids = get_descendant_pids(worker.process.pid) if worker.process.is_alive() else []
+        _kill_pids(descendant_pids)
+        if worker.process.is_alive():
+            worker.process.terminate()
+            worker.process.join(Constant.KILL_WAIT_SECONDS)
+        if worker.process.is_alive():
+            logger.log_warn("worker %d does not exit after terminate, kill it" % worker.worker_id)
+            worker.process.kill()
+            worker.process.join()
+        worker.event_conn.close()
+
+    def close(self, terminate=False):
+        """
+        stop all workers
+        :param terminate: True to kill the workers at once, else wait the workers to finish current task
+        :return: None
+        """
+        for worker in list(self._workers.values()):
+            if terminate:
+                self._stop_worker(worker, Constant.STOP_CLOSE)
+            else:
+                worker.get_rss()
+                worker.task_queue.put(None)
+        for worker in list(self._workers.values()):
+            worker.process.join()
+            worker.event_conn.close()
+            self.worker_stats.append(worker.get_stat(Constant.STOP_CLOSE))
+        self._workers = {}
+
+    def _get_recycle_reason(self, worker: _WorkerInfo):
+        if self.max_tasks_per_worker and worker.task_cnt >= self.max_tasks_per_worker:
+            return Constant.STOP_MAX_TASKS
+        if self.max_worker_rss and worker.get_rss() > self.max_worker_rss:
+            return Constant.STOP_MAX_RSS
+        return None
+
+    def _recycle_workers(self):
+        if not self._pending:
+            # the idle workers exit when close
+            return
+        for worker in list(self._workers.values()):
+            if worker.task_id is not None or worker.task_cnt == 0 or not worker.process.is_alive():
+                continue
+            recycle_reason = self._get_recycle_reason(worker)
+            if not recycle_reason:
+                continue
+            worker.task_queue.put(None)
+            worker.process.join(Constant.KILL_WAIT_SECONDS)
+            self._stop_worker(worker, recycle_reason)
+            self._start_worker()
+            self.recycle_cnt += 1
+
+    def _assign_tasks(self):
+        idle_workers = [worker for worker in self._workers.values() if worker.task_id is None]
+        if not idle_workers or not self._pending:
+            return
+        if not self.memory_budget:
+            for worker in idle_workers:
+                if not self._pending:
+                    return
+                task_id, task_arg = self._pending.popleft()
+                worker.assign(task_id, task_arg)
+            return
+
+        busy_cnt = len(self._workers) - len(idle_workers)
+        used_memory = sum(worker.get_rss() if worker.task_id is None else max(worker.task_memory, worker.get_rss())
+                          for worker in self._workers.values())
+        reserved_memory = 0
+        for task_item in list(self._pending):
+            if not idle_workers:
+                return
+            task_id, task_arg = task_item
+            task_memory = self.task_memory_func(task_arg) if self.task_memory_func else 0
+            if busy_cnt > 0 and used_memory + reserved_memory + task_memory > self.memory_budget:
+                if task_id not in self._held_task_ids:
+                    self._held_task_ids.add(task_id)
+                    self.hold_cnt += 1
+                    logger.log_info("hold back task %d, estimated memory: %dMB, projected memory: %dMB, "
+                                    "memory budget: %dMB" % (task_id, task_memory >> 20, used_memory >> 20,
+                                                             self.memory_budget >> 20))
+                if not reserved_memory:
+                    reserved_memory = task_memory
+                continue
+            self._pending.remove(task_item)
+            idle_workers.pop(0).assign(task_id, task_arg, task_memory)
+            busy_cnt += 1
+            used_memory += task_memory
+
+    def _handle_event(self, worker: _WorkerInfo, event):
+        if worker.task_id is None or worker.task_id != event.get("task_id"):
+            return None
+        event_type = event.get("type")
+        if self.event_func and event_type not in (Constant.EVENT_TASK_START, Constant.EVENT_TASK_END):
+            self.event_func(event, worker.task_arg)
+        if event_type == op_ut_case_info.Constant.CASE_EVENT_START:
+            worker.case_info = event
+            worker.case_start = event.get("time")
+            worker.stage_name = None
+        elif event_type == op_ut_case_info.Constant.CASE_EVENT_STAGE:
+            worker.stage_name = event.get("stage_name")
+        elif event_type == op_ut_case_info.Constant.CASE_EVENT_END:
+            worker.done_cases[event.get("case_name")] = event.get("case_report")
+            worker.case_info = None
+            worker.case_start = None
+            worker.stage_name = None
+        elif event_type == Constant.EVENT_TASK_END:
+            task_arg = worker.task_arg
+            task_stat = {"worker_id": worker.worker_id,
+                         "peak_rss": event.get("peak_rss") or worker.sampled_peak_rss or None}
+            worker.task_cnt += 1
+            worker.peak_rss = max(worker.peak_rss, task_stat.get("peak_rss") or 0)
+            worker.release()
+            return task_arg, event.get("result"), task_stat
+        return None
+
+    def _receive_events(self):
+        results = []
+        conn_map = {worker.event_conn: worker for worker in self._workers.values()}
+        for event_conn in connection.wait(list(conn_map), timeout=Constant.POLL_INTERVAL):
+            try:
+                while event_conn.poll():
+                    task_res = self._handle_event(conn_map[event_conn], event_conn.recv())
+                    if task_res is not None:
+                        results.append(task_res)
+            except (EOFError, OSError):
+                # the worker exits, found by _check_workers
+                continue
+        return results
+
+    def _get_hang_reason(self, worker: _WorkerInfo, now):
+        if not worker.process.is_alive():
+            return Constant.HANG_WORKER_EXIT
+        if self.task_timeout and now - worker.task_start > self.task_timeout:
+            return Constant.HANG_TASK_TIMEOUT
+        if self.case_timeout and worker.case_start and now - worker.case_start > self.case_timeout:
+            return Constant.HANG_CASE_TIMEOUT
+        return None
+
+    def _check_workers(self):
+        results = []
+        now = time.time()
+        for worker in list(self._workers.values()):
+            if worker.task_id is None:
+                if not worker.process.is_alive():
+                    self._stop_worker(worker, Constant.HANG_WORKER_EXIT)
+                    self._start_worker()
+                continue
+            worker.get_rss()
+            hang_reason = self._get_hang_reason(worker, now)
+            if not hang_reason:
+                continue
+            hang_info = {
+                "reason": hang_reason,
+                "elapsed": now - worker.task_start,
+                "case_elapsed": now - worker.case_start if worker.case_start else None,
+                "case_name": worker.case_info.get("case_name") if worker.case_info else None,
+                "case_info": worker.case_info.get("case_info") if worker.case_info else None,
+                "stage_name": worker.stage_name,
+                "done_cases": dict(worker.done_cases),
+                "exitcode": worker.process.exitcode
+            }
+            task_arg = worker.task_arg
+            task_stat = {"worker_id": worker.worker_id, "peak_rss": worker.sampled_peak_rss or None}
+            if self.event_func:
+                self.event_func({"type": Constant.EVENT_TASK_HANG, "worker_id": worker.worker_id,
+                                 "task_id": worker.task_id, "time": now, "rss": worker.sampled_peak_rss or None,
+                                 "reason": hang_reason, "case_name": hang_info.get("case_name"),
+                                 "stage_name": hang_info.get("stage_name"), "duration": hang_info.get("elapsed")},
+                                task_arg)
+            self._stop_worker(worker)
+            self._start_worker()
+            self.replace_cnt += 1
+            result, retry_task_arg = self.timeout_func(task_arg, hang_info) if self.timeout_func else (None, None)
+            if retry_task_arg is not None:
+                self._pending.appendleft((self._next_task_id, retry_task_arg))
+                self._next_task_id += 1
+            if result is not None:
+                results.append((task_arg, result, task_stat))
+        return results
+
+    def imap_unordered(self, task_list):
+        """
+        run tasks, yield the results in completion order
+
+        Parameters
+        ----------
+        task_list: list
+            task args, picklable, run in the list order
+
+        Returns
+        -------
+        generator of (task_arg, result, task_stat), task_stat is a dict: worker_id, peak_rss(bytes, can be None)
+        """
+        for task_arg in task_list:
+            self._pending.append((self._next_task_id, task_arg))
+            self._next_task_id += 1
+        while self._pending or any(worker.task_id is not None for worker in self._workers.values()):
+            self._recycle_workers()
+            self._assign_tasks()
+            for task_res in self._receive_events():
+                yield task_res
+            for task_res in self._check_workers():
+                yield task_res
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Copyright 2020 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+
+"""
+test op_ut_cache: cache key normalization, kernel cache key and toolkit identity
+"""
+import importlib.util
+
+import numpy as np
+import pytest
+
+from op_test_frame.ut import op_ut_cache
+from op_test_frame.ut.op_ut_case_info import CaseUsage
+
+
+def _load_module(module_file, module_name):
+    module_spec = importlib.util.spec_from_file_location(module_name, str(module_file))
+    module = importlib.util.module_from_spec(module_spec)
+    module_spec.loader.exec_module(module)
+    return module
+
+
+def _fake_tbe(monkeypatch, tbe_dir):
+    tbe_dir.mkdir(parents=True, exist_ok=True)
+    tbe_init = tbe_dir / "__init__.py"
+    tbe_init.write_text("")
+    tbe_spec = importlib.util.spec_from_file_location("tbe", str(tbe_init))
+    monkeypatch.setattr(op_ut_cache.importlib.util, "find_spec", lambda name: tbe_spec)
+    return tbe_init
+
+
+def test_normalize_params_strip_runtime_keys():
+    params = [{"shape": (2, 3), "dtype": "float16", "value": np.ones((2, 3)), "data_path": "/tmp/x.bin"}]
+    assert op_ut_cache.normalize_params(params) == op_ut_cache.normalize_params(
+        [{"dtype": "float16", "shape": [2, 3]}])
+
+
+def test_normalize_params_array_and_enum_stable():
+    params = {"const": np.arange(4, dtype="int32"), "usage": CaseUsage.IMPL, "axis": np.int64(1)}
+    same_params = {"usage": CaseUsage.IMPL, "axis": 1, "const": np.arange(4, dtype="int32")}
+    other_params = {"const": np.arange(1, 5, dtype="int32"), "usage": CaseUsage.IMPL, "axis": 1}
+    assert op_ut_cache.normalize_params(params) == op_ut_cache.normalize_params(same_params)
+    assert op_ut_cache.normalize_params(params) != op_ut_cache.normalize_params(other_params)
+
+
+def test_normalize_params_reject_object():
+    with pytest.raises(TypeError):
+        op_ut_cache.normalize_params({"attr": object()})
+
+
+def test_kernel_cache_key_depend_on_toolkit(tmp_path):
+    op_file = tmp_path / "impl" / "fake_cache_op.py"
+    op_file.parent.mkdir()
+    op_file.write_text("def fake_cache_op(x, y, kernel_name='fake'):\n    pass\n")
+    op_module = _load_module(op_file, "fake_cache_op")
+    key_args = {"op_module": op_module, "op_func_name": "fake_cache_op", "run_soc_version": "Ascend910",
+                "imply_type": "static_shape", "op_params": [{"shape": (2,), "dtype": "float16"}],
+                "addition_params": {"kernel_name": "fake"}}
+    cache_dir = str(tmp_path / "cache")
+    key = op_ut_cache.KernelCache(cache_dir, "toolkit_a").build_key(**key_args)
+    assert key == op_ut_cache.KernelCache(cache_dir, "toolkit_a").build_key(**key_args)
+    assert key != op_ut_cache.KernelCache(cache_dir, "toolkit_b").build_key(**key_args)
+
+
+def test_toolkit_id_change_with_version_file(tmp_path, monkeypatch):
+    _fake_tbe(monkeypatch, tmp_path / "toolkit" / "python" / "site-packages" / "tbe")
+    version_file = tmp_path / "toolkit" / "version.info"
+    version_file.write_text("Version=1.0\n")
+    old_id = op_ut_cache.get_toolkit_id()
+    assert old_id
+    assert old_id == op_ut_cache.get_toolkit_id()
+    version_file.write_text("Version=2.0\n")
+    assert op_ut_cache.get_toolkit_id() != old_id
+
+
+def test_kernel_cache_disabled_without_tbe(tmp_path, monkeypatch):
+    monkeypatch.setattr(op_ut_cache.importlib.util, "find_spec", lambda name: None)
+    assert op_ut_cache.get_toolkit_id() is None
+    assert op_ut_cache.get_kernel_cache({"kernel_cache_dir": str(tmp_path / "cache")}) is None
+
+
+def test_kernel_cache_store_restore(tmp_path, monkeypatch):
+    _fake_tbe(monkeypatch, tmp_path / "tbe")
+    kernel_cache = op_ut_cache.get_kernel_cache({"kernel_cache_dir": str(tmp_path / "cache")})
+    kernel_dir = tmp_path / "kernel_meta"
+    kernel_dir.mkdir()
+    (kernel_dir / "fake.o").write_bytes(b"kernel")
+    (kernel_dir / "fake.json").write_text("{}")
+    kernel_cache.store("ab" * 32, str(kernel_dir), "fake")
+    restore_dir = tmp_path / "restore"
+    assert kernel_cache.restore("ab" * 32, str(restore_dir), "fake")
+    assert (restore_dir / "fake.o").read_bytes() == b"kernel"
+    assert not kernel_cache.restore("cd" * 32, str(restore_dir), "fake")
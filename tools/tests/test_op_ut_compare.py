@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Copyright 2020 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+
+"""
+test op_ut_compare: chunked compare statistics, budget early exit, max_atol and nan/inf handling
+"""
+from types import SimpleNamespace
+
+import numpy as np
+
+from op_test_frame.common import op_status
+from op_test_frame.ut import op_ut_compare
+
+
+def _count_block_compare(monkeypatch):
+    called = []
+    origin_compare = op_ut_compare.precision_compare_util.compare_precision
+
+    def _compare(actual, expect, precision_standard=None):
+        called.append(actual.size)
+        return origin_compare(actual, expect, precision_standard=precision_standard)
+
+    monkeypatch.setattr(op_ut_compare.precision_compare_util, "compare_precision", _compare)
+    return called
+
+
+def test_all_blocks_pass():
+    expect = np.arange(1000, dtype=np.float32)
+    res = op_ut_compare.compare_precision_chunked(expect.copy(), expect, chunk_size=128)
+    assert res.status == op_status.SUCCESS
+    assert res.err_cnt == 0
+    assert res.compared_cnt == expect.size
+    assert res.failed_chunk_start is None
+
+
+def test_failed_block_not_compared_again(monkeypatch):
+    called = _count_block_compare(monkeypatch)
+    expect = np.ones(1000, dtype=np.float32)
+    actual = expect.copy()
+    actual[300:] = 2
+    res = op_ut_compare.compare_precision_chunked(actual, expect, chunk_size=100)
+    assert res.status == op_status.FAILED
+    assert res.failed_chunk_start == 300
+    # stop at the failed block, no whole output compare
+    assert res.early_exit
+    assert res.compared_cnt == 400
+    assert called == [100, 100, 100, 100]
+
+
+def test_failed_block_within_whole_output_budget(monkeypatch):
+    called = _count_block_compare(monkeypatch)
+    expect = np.ones(1000, dtype=np.float32)
+    actual = expect.copy()
+    actual[5] = 2
+    standard = SimpleNamespace(rtol=0.01, atol=0.001)
+    res = op_ut_compare.compare_precision_chunked(actual, expect, precision_standard=standard, chunk_size=100)
+    assert res.status == op_status.SUCCESS
+    assert res.failed_chunk_start == 0
+    assert res.err_cnt == 1
+    assert res.max_diff_idx == 5
+    assert res.compared_cnt == expect.size
+    # blocks after the failed one are judged by the statistics only
+    assert called == [100]
+
+
+def test_max_atol_fails():
+    expect = np.ones(1000, dtype=np.float32)
+    actual = expect.copy()
+    actual[950] = 10
+    standard = SimpleNamespace(rtol=0.01, atol=0.001, max_atol=1)
+    res = op_ut_compare.compare_precision_chunked(actual, expect, precision_standard=standard, chunk_size=100)
+    assert res.status == op_status.FAILED
+    assert "max_atol" in res.err_msg
+    assert res.max_diff_idx == 950
+
+
+def test_nan_and_inf():
+    expect = np.array([np.nan, np.inf, -np.inf, 1.0] * 250, dtype=np.float32)
+    res = op_ut_compare.compare_precision_chunked(expect.copy(), expect, chunk_size=64)
+    assert res.err_cnt == 0
+    assert res.max_diff == 0
+
+    actual = expect.copy()
+    actual[1] = -np.inf
+    diff, err_mask = op_ut_compare._compare_chunk(actual[:4], expect[:4], 0.001)
+    assert err_mask.tolist() == [False, True, False, False]
+    assert np.isfinite(diff[[0, 2, 3]]).all()
+
+
+def test_default_standard_by_dtype():
+    assert op_ut_compare.get_standard(None, np.float16) == (0.001, 0.001, None)
+    standard = SimpleNamespace(rtol=0.1, atol=0.2)
+    assert op_ut_compare.get_standard(standard, np.float16) == (0.1, 0.2, None)
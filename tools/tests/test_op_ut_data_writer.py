@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Copyright 2020 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+
+"""
+test op_ut_data_writer: skip same content, background writing and write errors
+"""
+import numpy as np
+
+from op_test_frame.ut import op_ut_data_writer
+
+
+def test_write_data_skip_same_content(tmp_path):
+    data_path = str(tmp_path / "data.bin")
+    data = np.arange(6, dtype="float16").reshape(2, 3)
+    assert op_ut_data_writer.write_data(data, data_path)
+    assert not op_ut_data_writer.write_data(data, data_path)
+    assert op_ut_data_writer.write_data(data + 1, data_path)
+    assert (np.fromfile(data_path, "float16") == (data + 1).reshape(-1)).all()
+
+
+def test_async_writer_flush_and_close(tmp_path):
+    data_writer = op_ut_data_writer.AsyncDataWriter(max_queue_size=2)
+    for idx in range(5):
+        data_writer.submit(np.full((4,), idx, dtype="int32"), str(tmp_path / ("data%d.bin" % idx)))
+    assert data_writer.flush() == []
+    assert data_writer.write_cnt == 5
+    assert (np.fromfile(str(tmp_path / "data4.bin"), "int32") == 4).all()
+    assert data_writer.close() == []
+
+
+def test_async_writer_return_write_errors(tmp_path):
+    # a directory at the data path makes the write fail
+    bad_path = tmp_path / "bad.bin"
+    bad_path.mkdir()
+    data_writer = op_ut_data_writer.AsyncDataWriter()
+    data_writer.submit(np.zeros((2,), dtype="float32"), str(bad_path))
+    data_writer.submit(np.zeros((2,), dtype="float32"), str(tmp_path / "good.bin"))
+    err_msg_list = data_writer.close()
+    assert len(err_msg_list) == 1
+    assert str(bad_path) in err_msg_list[0]
+    assert data_writer.write_cnt == 1
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Copyright 2020 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+
+"""
+test the input data of op ut cases: data_path loading and seeded random generation
+"""
+import numpy as np
+
+from op_test_frame.ut import op_ut
+
+
+def test_data_path_offset_stride(tmp_path):
+    data_file = tmp_path / "input0.bin"
+    np.arange(16, dtype="float32").tofile(str(data_file))
+    param_info = {"dtype": "float32", "shape": (2, 3), "data_path": str(data_file), "data_offset": 1,
+                  "data_stride": 2}
+    op_ut.OpUT._gen_input_data(param_info)
+    assert (param_info["value"] == np.arange(1, 13, 2, dtype="float32").reshape(2, 3)).all()
+
+
+def test_data_path_input_writable(tmp_path):
+    data_file = tmp_path / "input0.bin"
+    np.arange(4, dtype="float32").tofile(str(data_file))
+    param_info = {"dtype": "float32", "shape": (4,), "data_path": str(data_file)}
+    op_ut.OpUT._gen_input_data(param_info)
+    # an expect function may write its inputs in place, the file is not changed
+    param_info["value"][0] = 100
+    param_info["value"] += 1
+    assert param_info["value"][0] == 101
+    assert (np.fromfile(str(data_file), "float32") == np.arange(4, dtype="float32")).all()
+
+
+def test_seeded_data_reproducible_and_keep_global_state():
+    np.random.seed(1)
+    global_state = np.random.get_state()[1].copy()
+    for distribution in ("uniform", "normal"):
+        data = op_ut._gen_seeded_data((4, 5), "float32", distribution, [0.1, 1], 7)
+        assert (data == op_ut._gen_seeded_data((4, 5), "float32", distribution, [0.1, 1], 7)).all()
+        assert not (data == op_ut._gen_seeded_data((4, 5), "float32", distribution, [0.1, 1], 8)).all()
+    assert (np.random.get_state()[1] == global_state).all()
+
+
+def test_seeded_input_by_case_name():
+    param_info = {"dtype": "float16", "shape": (8,), "value_range": [1, 2]}
+    same_param_info = dict(param_info)
+    op_ut.OpUT._gen_input_data(param_info, seed=op_ut.OpUT._get_input_seed("case_a", 0))
+    op_ut.OpUT._gen_input_data(same_param_info, seed=op_ut.OpUT._get_input_seed("case_a", 0))
+    assert (param_info["value"] == same_param_info["value"]).all()
+    assert ((param_info["value"] >= 1) & (param_info["value"] <= 2)).all()
+
+
+def test_input_data_cache_writable(tmp_path):
+    data_cache = op_ut.op_ut_cache.InputDataCache(str(tmp_path / "cache"))
+    param_info = {"dtype": "float32", "shape": (3,)}
+    op_ut.OpUT._gen_input_data(param_info, seed=3, data_cache=data_cache)
+    cached_param_info = {"dtype": "float32", "shape": (3,)}
+    op_ut.OpUT._gen_input_data(cached_param_info, seed=3, data_cache=data_cache)
+    assert isinstance(cached_param_info["value"], np.memmap)
+    assert (cached_param_info["value"] == param_info["value"]).all()
+    cached_param_info["value"][0] = -1
+    assert data_cache.load(data_cache.build_key((3,), "float32", "uniform", [0.1, 1], 3))[0] != -1
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Copyright 2020 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+
+"""
+test op_ut_journal: journal records, resume after a broken run and broken tail truncation
+"""
+import pytest
+
+from op_test_frame.ut import op_ut_journal
+
+
+def _journal_with_records(tmp_path):
+    run_journal = op_ut_journal.RunJournal(str(tmp_path / "journal"))
+    case_file = tmp_path / "test_add_impl.py"
+    case_file.write_text("")
+    report_path = tmp_path / "rpt.json"
+    report_path.write_text("{}")
+    run_journal.append_case(str(case_file), "Ascend910", "case_0", {"status": "success"})
+    run_journal.append_case(str(case_file), "Ascend910", "case_1", {"status": "failed"})
+    run_journal.append_task(str(case_file), "Ascend310", str(report_path))
+    return run_journal, str(case_file), str(report_path)
+
+
+def test_resume_loads_done_cases_and_tasks(tmp_path):
+    run_journal, case_file, report_path = _journal_with_records(tmp_path)
+    resume_journal = op_ut_journal.RunJournal(run_journal.journal_path)
+    resume_journal.load()
+    assert resume_journal.get_done_cases(case_file, "Ascend910") == {"case_0": {"status": "success"},
+                                                                     "case_1": {"status": "failed"}}
+    assert resume_journal.is_task_done(case_file, "Ascend310", report_path)
+    assert not resume_journal.is_task_done(case_file, "Ascend910", report_path)
+
+    resume_journal.reset()
+    resume_journal.load()
+    assert not resume_journal.done_cases and not resume_journal.done_tasks
+
+
+@pytest.mark.parametrize("block_size", [4, 7, 64 * 1024])
+def test_resume_drops_broken_tail(tmp_path, monkeypatch, block_size):
+    monkeypatch.setattr(op_ut_journal.Constant, "TAIL_READ_BLOCK_SIZE", block_size)
+    run_journal, case_file, _ = _journal_with_records(tmp_path)
+    with open(run_journal.journal_path, "rb") as journal_f:
+        content = journal_f.read()
+    with open(run_journal.journal_path, "ab") as journal_f:
+        journal_f.write(b'{"type": "case", "case_file": "broken')
+
+    resume_journal = op_ut_journal.RunJournal(run_journal.journal_path)
+    resume_journal.load()
+    with open(run_journal.journal_path, "rb") as journal_f:
+        assert journal_f.read() == content
+    resume_journal.append_case(case_file, "Ascend910", "case_2", {"status": "success"})
+    resume_journal.load()
+    assert sorted(resume_journal.get_done_cases(case_file, "Ascend910")) == ["case_0", "case_1", "case_2"]
+
+
+def test_broken_only_line_is_dropped(tmp_path, monkeypatch):
+    monkeypatch.setattr(op_ut_journal.Constant, "TAIL_READ_BLOCK_SIZE", 4)
+    journal_path = tmp_path / "journal"
+    journal_path.write_bytes(b'{"type": "task", "case_fi')
+    run_journal = op_ut_journal.RunJournal(str(journal_path))
+    run_journal.load()
+    assert journal_path.read_bytes() == b""
+    assert not run_journal.done_tasks
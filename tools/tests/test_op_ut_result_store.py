@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Copyright 2020 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+
+"""
+test op_ut_result_store: case dedup in a run, shard rows, queries and schema version
+"""
+import sqlite3
+
+import pytest
+
+from op_test_frame.common import op_status
+from op_test_frame.ut import op_ut
+from op_test_frame.ut import op_ut_case_info
+from op_test_frame.ut import op_ut_result_store
+from op_test_frame.ut import ut_report
+
+
+def _make_case_rpt(case_name, status=op_status.SUCCESS, duration=1.0):
+    ut_case = op_ut.OpUT("StoreOp", "ut_store_op", "store_op")
+    ut_case.add_case("all", {"params": [{"shape": [1], "dtype": "float32", "format": "ND", "ori_shape": [1],
+                                         "ori_format": "ND"}], "case_name": case_name})
+    case_trace = op_ut_case_info.OpUTCaseTrace("Ascend910", list(ut_case._case_info_map.values())[0])
+    case_trace.add_stage_result(op_ut_case_info.OpUTStageResult(
+        status=status, stage_name=op_ut_case_info.Constant.STAGE_COMPILE, duration=duration))
+    case_rpt = ut_report.OpUTCaseReport(case_trace)
+    case_rpt.duration = duration
+    return case_rpt
+
+
+def test_case_added_again_replaces_stored(tmp_path):
+    with op_ut_result_store.ResultStore(str(tmp_path / "store.db")) as result_store:
+        result_store.add_cases("run_0", [_make_case_rpt("case_0", op_status.FAILED, 1.0)], run_time=1)
+        result_store.add_cases("run_0", [_make_case_rpt("case_0", op_status.SUCCESS, 2.0)], run_time=1)
+        run_list = result_store.list_runs()
+        case_rpt = _make_case_rpt("case_0")
+        stage_list = result_store.stage_durations("run_0", case_rpt.op_type, case_rpt.case_name, "Ascend910")
+    assert [(run["run_id"], run["case_cnt"], run["failed_cnt"]) for run in run_list] == [("run_0", 1, 0)]
+    assert stage_list == [{"stage_name": op_ut_case_info.Constant.STAGE_COMPILE, "status": op_status.SUCCESS,
+                           "duration": 2.0}]
+
+
+def test_shard_rows_of_a_run(tmp_path):
+    with op_ut_result_store.ResultStore(str(tmp_path / "store.db")) as result_store:
+        result_store.add_cases("run_0", [_make_case_rpt("case_0")], run_time=1, shard={"index": 0, "count": 2})
+        result_store.add_cases("run_0", [_make_case_rpt("case_1")], run_time=1, shard={"index": 1, "count": 2})
+        result_store.add_cases("run_0", [_make_case_rpt("case_1")], run_time=1, shard={"index": 1, "count": 2})
+        result_store.add_cases("run_1", [_make_case_rpt("case_0")], run_time=2)
+        run_list = result_store.list_runs()
+    assert [(run["run_id"], run["shard_cnt"], run["case_cnt"]) for run in run_list] == [("run_1", 0, 1),
+                                                                                       ("run_0", 2, 2)]
+
+
+def test_slowest_and_flipped_cases(tmp_path):
+    with op_ut_result_store.ResultStore(str(tmp_path / "store.db")) as result_store:
+        for run_idx, status in enumerate((op_status.SUCCESS, op_status.FAILED, op_status.SUCCESS)):
+            result_store.add_cases("run_%d" % run_idx, [_make_case_rpt("flaky", status, 1.0),
+                                                        _make_case_rpt("slow", op_status.SUCCESS, 10.0 + run_idx)],
+                                   run_time=run_idx)
+        slowest_list = result_store.slowest_cases(soc="Ascend910", limit=1)
+        flipped_list = result_store.flipped_cases(since=0)
+    assert slowest_list[0]["case_name"].endswith("slow")
+    assert slowest_list[0]["mean_duration"] == 11.0
+    assert slowest_list[0]["run_cnt"] == 3
+    assert [(case["case_name"].endswith("flaky"), case["flip_cnt"], case["last_status"])
+            for case in flipped_list] == [(True, 2, op_status.SUCCESS)]
+
+
+def test_reject_unknown_schema_version(tmp_path):
+    db_path = str(tmp_path / "store.db")
+    with op_ut_result_store.ResultStore(db_path):
+        pass
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == op_ut_result_store.Constant.SCHEMA_VERSION
+    conn.execute("PRAGMA user_version = 99")
+    conn.close()
+    with pytest.raises(RuntimeError, match="schema version 99"):
+        op_ut_result_store.ResultStore(db_path).open()
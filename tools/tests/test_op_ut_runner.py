@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Copyright 2020 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+
+"""
+test op_ut_runner: op module reload and the default run_ut invocation
+"""
+import sys
+
+import pytest
+
+from op_test_frame.ut import op_ut_func_cache
+from op_test_frame.ut import op_ut_runner
+from op_test_frame.ut import ut_report
+
+
+def test_reload_op_module_drops_cached_op_func(tmp_path, monkeypatch):
+    op_file = tmp_path / "ut_reload_op.py"
+    op_file.write_text("def reload_op(x):\n    return 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "ut_reload_op", raising=False)
+    op_module, op_func, _ = op_ut_func_cache.resolve_op_func("ut_reload_op", "reload_op")
+    op_ut_func_cache.get_op_signature(op_func, lambda func: ([], ["x"]))
+
+    op_ut_runner._reload_op_module("ut_reload_op")
+
+    _, reloaded_func, _ = op_ut_func_cache.resolve_op_func("ut_reload_op", "reload_op")
+    assert reloaded_func is not op_func
+    assert reloaded_func is getattr(sys.modules["ut_reload_op"], "reload_op")
+    assert op_ut_func_cache.get_op_signature(reloaded_func, lambda func: ([], ["y"])) == ([], ["y"])
+    assert op_module is sys.modules["ut_reload_op"]
+
+
+_SMOKE_OP = """
+def smoke_op(x, y, kernel_name="smoke_op"):
+    pass
+"""
+
+_SMOKE_CASE = """
+from op_test_frame.ut import OpUT
+ut_case = OpUT("SmokeOp", "ut_smoke_op", "smoke_op")
+for i in range(2):
+    ut_case.add_case("all", {"params": [
+        {"shape": [i + 1, 4], "dtype": "float32", "format": "ND", "ori_shape": [i + 1, 4], "ori_format": "ND"},
+        {"shape": [i + 1, 4], "dtype": "float32", "format": "ND", "ori_shape": [i + 1, 4], "ori_format": "ND"}],
+        "case_name": "smoke_%d" % i})
+"""
+
+
+@pytest.mark.parametrize("process_num_kwargs", [{}, {"process_num": None}])
+def test_run_ut_default_invocation(tmp_path, monkeypatch, process_num_kwargs):
+    case_dir = tmp_path / "cases"
+    case_dir.mkdir()
+    (case_dir / "test_smoke_op_impl.py").write_text(_SMOKE_CASE)
+    (case_dir / "test_smoke_op2_impl.py").write_text(_SMOKE_CASE.replace("smoke_%d", "smoke2_%d"))
+    (tmp_path / "ut_smoke_op.py").write_text(_SMOKE_OP)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+
+    assert op_ut_runner.run_ut(str(case_dir), "Ascend910", **process_num_kwargs) == "success"
+
+    test_report = ut_report.OpUTReport()
+    test_report.load(str(tmp_path / "report" / ".ut_test_report"))
+    assert test_report.total_cnt == 4
+    assert test_report.success_cnt == 4
+
+
+def test_run_ut_coverage_with_default_process_num(tmp_path, monkeypatch):
+    case_dir = tmp_path / "cases"
+    case_dir.mkdir()
+    (case_dir / "test_smoke_op_impl.py").write_text(_SMOKE_CASE)
+    (tmp_path / "ut_smoke_op.py").write_text(_SMOKE_OP)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+
+    assert op_ut_runner.run_ut(str(case_dir), "Ascend910", cov_report="json", process_num=None) == "success"
+    assert (tmp_path / "cov_report" / "coverage.json").exists()
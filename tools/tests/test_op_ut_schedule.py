@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Copyright 2020 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+
+"""
+test op_ut_schedule: shard partition, shard info and shard unit check
+"""
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from op_test_frame.ut import op_ut_schedule
+
+
+def _make_run_args(tmp_path, file_cnt=7, soc_list=("Ascend910", "Ascend310")):
+    run_arg_list = []
+    for file_idx in range(file_cnt):
+        case_file = tmp_path / ("Op%d" % file_idx) / ("test_op%d_impl.py" % file_idx)
+        case_file.parent.mkdir(parents=True, exist_ok=True)
+        case_file.write_text("#" * (file_idx + 1) * 100)
+        for soc in soc_list:
+            run_arg_list.append(SimpleNamespace(case_file=str(case_file), soc_version=soc))
+    return run_arg_list
+
+
+def _select_all(run_arg_list, history, shard_count):
+    return [op_ut_schedule.select_shard(run_arg_list, history, idx, shard_count)[0] for idx in range(shard_count)]
+
+
+def test_parse_shard():
+    assert op_ut_schedule.parse_shard("1/4") == (1, 4)
+    for bad_shard in ("4/4", "-1/2", "0/0", "a/2", "1"):
+        with pytest.raises(RuntimeError):
+            op_ut_schedule.parse_shard(bad_shard)
+
+
+def test_select_shard_partition(tmp_path):
+    run_arg_list = _make_run_args(tmp_path)
+    history = op_ut_schedule.DurationHistory(str(tmp_path / "history.json"))
+    shards = _select_all(run_arg_list, history, 3)
+    selected = [id(run_arg) for shard in shards for run_arg in shard]
+    assert sorted(selected) == sorted(id(run_arg) for run_arg in run_arg_list)
+    assert all(shards)
+
+
+def test_select_shard_stable_with_discovery_order(tmp_path):
+    run_arg_list = _make_run_args(tmp_path)
+    history = op_ut_schedule.DurationHistory(str(tmp_path / "history.json"))
+    history.update(run_arg_list[0].case_file, "Ascend910", 30)
+    shuffled_list = list(run_arg_list)
+    random.Random(0).shuffle(shuffled_list)
+
+    def _unit_keys(shards):
+        return [sorted(op_ut_schedule.get_duration_key(arg.case_file, arg.soc_version) for arg in shard)
+                for shard in shards]
+
+    assert _unit_keys(_select_all(run_arg_list, history, 3)) == _unit_keys(_select_all(shuffled_list, history, 3))
+
+
+def test_check_shard_units(tmp_path):
+    run_arg_list = _make_run_args(tmp_path)
+    history = op_ut_schedule.DurationHistory(str(tmp_path / "history.json"))
+    shard_list = [op_ut_schedule.build_shard_info(run_arg_list, shard, idx, 3)
+                  for idx, shard in enumerate(_select_all(run_arg_list, history, 3))]
+    assert shard_list[0]["unit_cnt"] == len(run_arg_list)
+    op_ut_schedule.check_shard_units(shard_list)
+    # shards without units info are not checked
+    op_ut_schedule.check_shard_units([None, {"index": 0, "count": 2}])
+
+    with pytest.raises(RuntimeError, match="missing unit count: 1"):
+        missing_shard = dict(shard_list[0], units=shard_list[0]["units"][1:])
+        op_ut_schedule.check_shard_units([missing_shard] + shard_list[1:])
+    with pytest.raises(RuntimeError, match="duplicate units"):
+        duplicate_shard = dict(shard_list[1], units=shard_list[1]["units"] + shard_list[0]["units"][:1])
+        op_ut_schedule.check_shard_units(shard_list[:1] + [duplicate_shard] + shard_list[2:])
+    with pytest.raises(RuntimeError, match="different case files"):
+        other_info = op_ut_schedule.build_shard_info(run_arg_list[:-1], [], 2, 3)
+        op_ut_schedule.check_shard_units(shard_list[:2] + [other_info])
+    with pytest.raises(RuntimeError, match="no units info"):
+        op_ut_schedule.check_shard_units(shard_list[:2] + [{"index": 2, "count": 3}])
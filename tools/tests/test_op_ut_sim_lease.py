@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Copyright 2020 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+
+"""
+test op_ut_sim_lease: slot count limits the concurrent simulator runs, the slot of a killed holder is released
+"""
+import os
+import sys
+import time
+import signal
+import subprocess
+import multiprocessing
+
+import pytest
+
+from op_test_frame.ut import op_ut_sim_lease
+
+# a local stand-in of the esl simulator, only takes time
+_FAKE_SIMULATOR_CMD = [sys.executable, "-c", "import time; time.sleep(0.3)"]
+
+
+def _run_fake_simulator(lease_dir, slot_num, record_path):
+    with op_ut_sim_lease.SimulatorLease(lease_dir, "esl", slot_num, timeout=30):
+        start_time = time.time()
+        subprocess.run(_FAKE_SIMULATOR_CMD, check=True)
+        end_time = time.time()
+    with open(record_path, "a") as record_f:
+        record_f.write("%f %f\n" % (start_time, end_time))
+
+
+def _hold_lease(lease_dir, ready_event):
+    lease = op_ut_sim_lease.SimulatorLease(lease_dir, "esl", 1)
+    lease.acquire()
+    ready_event.set()
+    time.sleep(60)
+
+
+def _get_max_concurrency(record_path):
+    time_points = []
+    with open(record_path) as record_f:
+        for line in record_f:
+            start_time, end_time = line.split()
+            time_points.append((float(start_time), 1))
+            time_points.append((float(end_time), -1))
+    running_cnt = 0
+    max_cnt = 0
+    for _, delta in sorted(time_points):
+        running_cnt += delta
+        max_cnt = max(max_cnt, running_cnt)
+    return max_cnt
+
+
+def test_get_slot_num():
+    assert op_ut_sim_lease.get_slot_num("esl") == 1
+    assert op_ut_sim_lease.get_slot_num("pv") == 0
+    assert op_ut_sim_lease.get_slot_num("pv", 3) == 3
+
+
+@pytest.mark.parametrize("slot_num", [1, 2])
+def test_slots_limit_concurrent_runs(tmp_path, slot_num):
+    lease_dir = str(tmp_path / "lease")
+    record_path = str(tmp_path / "record")
+    mp_context = multiprocessing.get_context("fork")
+    process_list = [mp_context.Process(target=_run_fake_simulator, args=(lease_dir, slot_num, record_path))
+                    for _ in range(4)]
+    for process in process_list:
+        process.start()
+    for process in process_list:
+        process.join(60)
+        assert process.exitcode == 0
+    assert _get_max_concurrency(record_path) == slot_num
+
+
+def test_killed_holder_slot_released(tmp_path):
+    lease_dir = str(tmp_path / "lease")
+    mp_context = multiprocessing.get_context("fork")
+    ready_event = mp_context.Event()
+    holder = mp_context.Process(target=_hold_lease, args=(lease_dir, ready_event))
+    holder.start()
+    assert ready_event.wait(30)
+
+    busy_lease = op_ut_sim_lease.SimulatorLease(lease_dir, "esl", 1, timeout=0.3)
+    with pytest.raises(RuntimeError, match="timeout"):
+        busy_lease.acquire()
+
+    os.kill(holder.pid, signal.SIGKILL)
+    holder.join(30)
+    with op_ut_sim_lease.SimulatorLease(lease_dir, "esl", 1, timeout=5) as lease:
+        assert lease.slot_idx == 0
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Copyright 2020 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+
+"""
+test op_ut stage events: every stage notifies its start and end, and gets its duration
+"""
+from op_test_frame.ut import op_ut
+from op_test_frame.ut.op_ut_case_info import Constant
+
+
+def _stage_params():
+    return [{"shape": [2, 4], "dtype": "float32", "format": "ND", "ori_shape": [2, 4], "ori_format": "ND",
+             "param_type": "input"},
+            {"shape": [2, 4], "dtype": "float32", "format": "ND", "ori_shape": [2, 4], "ori_format": "ND",
+             "param_type": "output"}]
+
+
+def test_gen_expect_stage_notify_start_and_end():
+    event_list = []
+    ut_case = op_ut.OpUT("StageOp", "ut_stage_op", "stage_op")
+    ut_case.add_precision_case("all", {"params": _stage_params(), "case_name": "gen_expect_case",
+                                       "calc_expect_func": lambda x, y: x["value"]})
+    case_info = list(ut_case._case_info_map.values())[0]
+    for param_info in case_info.op_params:
+        param_info["value"] = 1
+    ut_case._case_event_func = lambda event_type, **event_info: event_list.append((event_type, event_info))
+
+    stage_status = ut_case._run_gen_expect_stage(case_info)
+    assert event_list == [(Constant.CASE_EVENT_STAGE,
+                           {"case_name": case_info.case_name, "stage_name": Constant.STAGE_GEN_EXPECT})]
+    case_trace = op_ut.op_ut_case_info.OpUTCaseTrace("Ascend910", case_info)
+    ut_case._add_stage_result(case_trace, stage_status)
+    assert stage_status.stage_name == Constant.STAGE_GEN_EXPECT
+    assert stage_status.duration is not None
+    assert event_list[-1] == (Constant.CASE_EVENT_STAGE_END,
+                              {"case_name": case_info.case_name, "stage_name": Constant.STAGE_GEN_EXPECT,
+                               "status": stage_status.status})
+
+
+def test_custom_case_stage_end_event():
+    event_list = []
+    ut_case = op_ut.OpUT("StageOp", "ut_stage_op", "stage_op")
+
+    def _custom_func(soc_version):
+        assert soc_version == "Ascend910"
+
+    ut_case.add_cust_test_func(test_func=_custom_func)
+    case_rpt_list = ut_case.run_case("Ascend910", run_cfg={
+        "case_event_func": lambda event_type, **event_info: event_list.append((event_type, event_info))
+    }).get_case_rpt_list()
+
+    assert [event_type for event_type, _ in event_list] == [Constant.CASE_EVENT_START, Constant.CASE_EVENT_STAGE,
+                                                            Constant.CASE_EVENT_STAGE_END, Constant.CASE_EVENT_END]
+    assert event_list[2][1]["stage_name"] == Constant.STAGE_CUST_FUNC
+    stage_res = case_rpt_list[0].trace_detail.stage_result[0]
+    assert stage_res.stage_name == Constant.STAGE_CUST_FUNC
+    assert stage_res.duration is not None
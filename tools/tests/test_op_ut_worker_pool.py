@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Copyright 2020 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+
+"""
+test op_ut_worker_pool: case and task timeouts, unexpected worker exits and worker recycling
+"""
+import os
+import time
+import multiprocessing
+
+from op_test_frame.ut import op_ut_worker_pool
+from op_test_frame.ut.op_ut_case_info import Constant as CaseConstant
+from op_test_frame.ut.op_ut_worker_pool import Constant
+
+
+def _run_task(task_arg):
+    if task_arg == "hang_case":
+        op_ut_worker_pool.report_event(CaseConstant.CASE_EVENT_START, case_name="case_0", case_info={})
+        op_ut_worker_pool.report_event(CaseConstant.CASE_EVENT_STAGE, case_name="case_0",
+                                       stage_name=CaseConstant.STAGE_GEN_EXPECT)
+        time.sleep(60)
+    if task_arg == "hang_task":
+        time.sleep(60)
+    if task_arg == "exit":
+        os._exit(9)
+    if str(task_arg).startswith("pid"):
+        return os.getpid()
+    return "done_%s" % task_arg
+
+
+def _new_pool(hang_info_list, **pool_kwargs):
+    def _on_timeout(task_arg, hang_info):
+        hang_info_list.append(hang_info)
+        return "timeout_%s" % task_arg, None
+
+    return op_ut_worker_pool.WorkerPool(2, _run_task, mp_context=multiprocessing.get_context("fork"),
+                                        timeout_func=_on_timeout, **pool_kwargs)
+
+
+def test_case_timeout_kill_and_replace_worker():
+    hang_info_list = []
+    with _new_pool(hang_info_list, case_timeout=1) as worker_pool:
+        results = {task_arg: result for task_arg, result, _ in worker_pool.imap_unordered(["hang_case", "ok"])}
+        assert worker_pool.replace_cnt == 1
+    assert results == {"hang_case": "timeout_hang_case", "ok": "done_ok"}
+    assert hang_info_list[0]["reason"] == Constant.HANG_CASE_TIMEOUT
+    assert hang_info_list[0]["case_name"] == "case_0"
+    assert hang_info_list[0]["stage_name"] == CaseConstant.STAGE_GEN_EXPECT
+
+
+def test_task_timeout_and_retry():
+    hang_info_list = []
+    retry_arg_list = []
+
+    def _on_timeout(task_arg, hang_info):
+        hang_info_list.append(hang_info)
+        if not retry_arg_list:
+            retry_arg_list.append("ok")
+            return None, "ok"
+        return "timeout", None
+
+    with op_ut_worker_pool.WorkerPool(1, _run_task, mp_context=multiprocessing.get_context("fork"),
+                                      task_timeout=1, timeout_func=_on_timeout) as worker_pool:
+        results = [(task_arg, result) for task_arg, result, _ in worker_pool.imap_unordered(["hang_task"])]
+    assert results == [("ok", "done_ok")]
+    assert [hang_info["reason"] for hang_info in hang_info_list] == [Constant.HANG_TASK_TIMEOUT]
+
+
+def test_worker_exit_is_reported():
+    hang_info_list = []
+    with _new_pool(hang_info_list) as worker_pool:
+        results = {task_arg: result for task_arg, result, _ in worker_pool.imap_unordered(["exit", "ok", "ok2"])}
+    assert results == {"exit": "timeout_exit", "ok": "done_ok", "ok2": "done_ok2"}
+    assert hang_info_list[0]["reason"] == Constant.HANG_WORKER_EXIT
+    assert hang_info_list[0]["exitcode"] == 9
+
+
+def test_recycle_worker_after_max_tasks():
+    with op_ut_worker_pool.WorkerPool(1, _run_task, mp_context=multiprocessing.get_context("fork"),
+                                      max_tasks_per_worker=2) as worker_pool:
+        pid_list = [result for _, result, _ in worker_pool.imap_unordered(["pid_%d" % idx for idx in range(5)])]
+        assert worker_pool.recycle_cnt == 2
+    assert len(set(pid_list)) == 3
+    assert [stat["stop_reason"] for stat in worker_pool.worker_stats] == [Constant.STOP_MAX_TASKS,
+                                                                          Constant.STOP_MAX_TASKS,
+                                                                          Constant.STOP_CLOSE]
+    assert [stat["task_cnt"] for stat in worker_pool.worker_stats] == [2, 2, 1]
+
+
+def test_recycle_worker_over_max_rss():
+    with op_ut_worker_pool.WorkerPool(1, _run_task, mp_context=multiprocessing.get_context("fork"),
+                                      max_worker_rss=1) as worker_pool:
+        pid_list = [result for _, result, _ in worker_pool.imap_unordered(["pid_0", "pid_1"])]
+    if op_ut_worker_pool.get_process_rss(os.getpid()) is None:
+        # rss is not supported on this platform, the worker is never recycled
+        assert worker_pool.recycle_cnt == 0
+        return
+    assert worker_pool.recycle_cnt == 1
+    assert pid_list[0] != pid_list[1]
+    assert worker_pool.worker_stats[0]["stop_reason"] == Constant.STOP_MAX_RSS
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Copyright 2020 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+
+"""
+test ut_report: jsonl report writer, load and concat
+"""
+import json
+
+from op_test_frame.common import op_status
+from op_test_frame.ut import op_ut
+from op_test_frame.ut import op_ut_case_info
+from op_test_frame.ut import ut_report
+
+
+def _make_case_rpts(case_cnt, status=op_status.SUCCESS):
+    ut_case = op_ut.OpUT("RptOp", "ut_rpt_op", "rpt_op")
+    for idx in range(case_cnt):
+        ut_case.add_case("all", {"params": [{"shape": [idx + 1], "dtype": "float32", "format": "ND",
+                                             "ori_shape": [idx + 1], "ori_format": "ND"}],
+                                 "case_name": "case_%d" % idx})
+    case_rpt_list = []
+    for case_info in ut_case._case_info_map.values():
+        case_trace = op_ut_case_info.OpUTCaseTrace("Ascend910", case_info)
+        case_trace.add_stage_result(op_ut_case_info.OpUTStageResult(
+            status=status, stage_name=op_ut_case_info.Constant.STAGE_COMPILE))
+        case_rpt_list.append(ut_report.OpUTCaseReport(case_trace))
+    return case_rpt_list
+
+
+def _write_jsonl(report_path, case_rpt_list, shard=None):
+    rpt_writer = ut_report.JsonlReportWriter(str(report_path), shard=shard)
+    rpt_writer.open()
+    for case_rpt in case_rpt_list:
+        rpt_writer.add_case_report(case_rpt)
+    rpt_writer.close()
+
+
+def _load(report_path):
+    test_report = ut_report.OpUTReport()
+    test_report.load(str(report_path))
+    return test_report
+
+
+def test_jsonl_writer_load(tmp_path):
+    _write_jsonl(tmp_path / "rpt.jsonl", _make_case_rpts(3))
+    test_report = _load(tmp_path / "rpt.jsonl")
+    assert test_report.total_cnt == 3
+    assert test_report.success_cnt == 3
+    assert [case_rpt.case_name for case_rpt in ut_report.iter_case_reports(str(tmp_path / "rpt.jsonl"))] == \
+        [case_rpt.case_name for case_rpt in test_report.get_case_rpt_list()]
+
+
+def test_load_skip_broken_last_line(tmp_path):
+    _write_jsonl(tmp_path / "rpt.jsonl", _make_case_rpts(2))
+    with open(tmp_path / "rpt.jsonl", "a") as rpt_f:
+        rpt_f.write('{"case_name": "broken')
+    assert _load(tmp_path / "rpt.jsonl").total_cnt == 2
+
+
+def test_concat_drop_broken_tail(tmp_path):
+    case_rpt_list = _make_case_rpts(5)
+    report_dir = tmp_path / "rpts"
+    report_dir.mkdir()
+    _write_jsonl(report_dir / "rpt_0.json", case_rpt_list[:2])
+    with open(report_dir / "rpt_0.json", "a") as rpt_f:
+        rpt_f.write('{"case_name": "broken')
+    _write_jsonl(report_dir / "rpt_1.json", case_rpt_list[2:4])
+    json_report = ut_report.OpUTReport()
+    json_report.add_case_report(case_rpt_list[4])
+    json_report.save(str(report_dir / "rpt_2.json"))
+
+    output_path = tmp_path / "all.jsonl"
+    ut_report.concat_reports(str(report_dir), str(output_path), run_cmd="run")
+    with open(output_path) as out_f:
+        line_list = out_f.readlines()
+    assert all(line.endswith("\n") for line in line_list)
+    assert json.loads(line_list[0])["run_cmd"] == "run"
+    assert sorted(json.loads(line)["case_name"] for line in line_list[1:]) == \
+        sorted(case_rpt.case_name for case_rpt in case_rpt_list)
+    assert _load(output_path).total_cnt == 5
+
+
+def test_concat_check_shards(tmp_path):
+    case_rpt_list = _make_case_rpts(2)
+    report_dir = tmp_path / "rpts"
+    report_dir.mkdir()
+    _write_jsonl(report_dir / "rpt_0.json", case_rpt_list[:1], shard={"index": 0, "count": 2})
+    _write_jsonl(report_dir / "rpt_1.json", case_rpt_list[1:], shard={"index": 1, "count": 2})
+    ut_report.concat_reports(str(report_dir), str(tmp_path / "all.jsonl"), shard_count=2)
+    assert _load(tmp_path / "all.jsonl").total_cnt == 2
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Copyright 2020 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+
+"""
+test ut_report_diff: new failures, fixed, added and removed cases, duration regressions and duplicate cases
+"""
+from op_test_frame.common import op_status
+from op_test_frame.ut import op_ut
+from op_test_frame.ut import op_ut_case_info
+from op_test_frame.ut import ut_report
+from op_test_frame.ut import ut_report_diff
+
+_COMPILE = op_ut_case_info.Constant.STAGE_COMPILE
+
+
+def _make_case_rpt(case_name, status=op_status.SUCCESS, duration=1.0):
+    ut_case = op_ut.OpUT("DiffOp", "ut_diff_op", "diff_op")
+    ut_case.add_case("all", {"params": [{"shape": [1], "dtype": "float32", "format": "ND", "ori_shape": [1],
+                                         "ori_format": "ND"}], "case_name": case_name})
+    case_trace = op_ut_case_info.OpUTCaseTrace("Ascend910", list(ut_case._case_info_map.values())[0])
+    case_trace.add_stage_result(op_ut_case_info.OpUTStageResult(status=status, stage_name=_COMPILE,
+                                                                duration=duration))
+    case_rpt = ut_report.OpUTCaseReport(case_trace)
+    case_rpt.duration = duration
+    return case_rpt
+
+
+def _save_report(report_path, case_rpt_list):
+    test_report = ut_report.OpUTReport()
+    for case_rpt in case_rpt_list:
+        test_report.add_case_report(case_rpt)
+    test_report.save(str(report_path), report_format=ut_report.Constant.REPORT_FORMAT_JSONL)
+    return str(report_path)
+
+
+def _case_names(key_list):
+    return sorted(key[1].split("_")[-1] for key in key_list)
+
+
+def test_diff_reports(tmp_path):
+    base_file = _save_report(tmp_path / "base.jsonl", [
+        _make_case_rpt("keep"), _make_case_rpt("broken"), _make_case_rpt("fixed", op_status.FAILED),
+        _make_case_rpt("slower", duration=1.0), _make_case_rpt("removed")])
+    new_file = _save_report(tmp_path / "new.jsonl", [
+        _make_case_rpt("keep", duration=1.01), _make_case_rpt("broken", op_status.ERROR), _make_case_rpt("fixed"),
+        _make_case_rpt("slower", duration=2.0), _make_case_rpt("added", op_status.FAILED)])
+    report_diff = ut_report_diff.diff_reports(base_file, new_file)
+    assert report_diff.compared_cnt == 4
+    assert _case_names(report_diff.new_failures) == ["added", "broken"]
+    assert _case_names(report_diff.fixed_cases) == ["fixed"]
+    assert _case_names(report_diff.added_cases) == ["added"]
+    assert _case_names(report_diff.removed_cases) == ["removed"]
+    assert [(base, new) for _, base, new in report_diff.case_regressions] == [(1.0, 2.0)]
+    assert [stage for _, stage, _, _ in report_diff.stage_regressions] == [_COMPILE]
+    assert report_diff.has_failure() and report_diff.has_perf_regression()
+
+
+def test_duplicate_cases_keep_worst_status_and_longest_duration(tmp_path):
+    base_file = _save_report(tmp_path / "base.jsonl", [
+        _make_case_rpt("dup", op_status.FAILED, 1.0), _make_case_rpt("dup", op_status.SUCCESS, 3.0)])
+    new_file = _save_report(tmp_path / "new.jsonl", [
+        _make_case_rpt("dup", op_status.SUCCESS, 3.1), _make_case_rpt("dup", op_status.SUCCESS, 1.0)])
+    report_diff = ut_report_diff.diff_reports(base_file, new_file)
+    assert report_diff.compared_cnt == 1
+    assert _case_names(report_diff.fixed_cases) == ["dup"]
+    assert not report_diff.added_cases
+    assert not report_diff.has_perf_regression()
+
+    new_failed_file = _save_report(tmp_path / "new_failed.jsonl", [
+        _make_case_rpt("dup", op_status.SUCCESS, 1.0), _make_case_rpt("dup", op_status.ERROR, 1.0)])
+    report_diff = ut_report_diff.diff_reports(new_file, new_failed_file)
+    assert _case_names(report_diff.new_failures) == ["dup"]
+
+
+def test_main_gate(tmp_path):
+    base_file = _save_report(tmp_path / "base.jsonl", [_make_case_rpt("case", duration=1.0)])
+    new_file = _save_report(tmp_path / "new.jsonl", [_make_case_rpt("case", duration=2.0)])
+    assert ut_report_diff.main([base_file, new_file]) == 0
+    assert ut_report_diff.main([base_file, new_file, "--fail_on", "perf"]) == 1
+    assert ut_report_diff.main([base_file, str(tmp_path / "not_exist.jsonl")]) == 1
@@ -21,10 +21,15 @@ import os
 import stat
 import json
 import fnmatch
+import tempfile
+import multiprocessing
 from enum import Enum
 from op_test_frame.common import logger
 from op_test_frame.common import op_status
 from op_test_frame.utils import file_util
+from op_test_frame.ut import op_ut_cache
+from op_test_frame.ut import op_ut_case_info
+from op_test_frame.ut import op_ut_schedule
 from op_test_frame.ut.op_ut_case_info import OpUTCaseTrace
 
 
@@ -36,6 +41,58 @@ class Constant:
     DATA_FILE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_EXCL
     DATA_FILE_MODES = stat.S_IWUSR | stat.S_IRUSR | stat.S_IRGRP
     DATA_DIR_MODES = stat.S_IWUSR | stat.S_IRUSR | stat.S_IXUSR | stat.S_IRGRP | stat.S_IXGRP
+    REPORT_FORMAT_JSON = "json"
+    # first line is a header, then one case report a line, can be streamed and concatenated
+    REPORT_FORMAT_JSONL = "jsonl"
+    JSONL_FORMAT_TAG = "op_ut_report_jsonl"
+    JSONL_FORMAT_VERSION = "1"
+    # combine summary only reports in a process pool only when there are enough report files, else the pool cost more
+    COMBINE_PARALLEL_MIN_FILES = 8
+
+
+def _open_report_file(report_data_path):
+    report_data_path = os.path.realpath(report_data_path)
+    report_data_dir = os.path.dirname(report_data_path)
+    if not os.path.exists(report_data_dir):
+        file_util.makedirs(report_data_dir, mode=Constant.DATA_DIR_MODES)
+    if not os.path.exists(report_data_path):
+        return os.fdopen(os.open(report_data_path, Constant.DATA_FILE_FLAGS, Constant.DATA_FILE_MODES), 'w')
+    return open(report_data_path, 'w')
+
+
+def _build_jsonl_header(run_cmd=None, shard=None):
+    header = {"format": Constant.JSONL_FORMAT_TAG, "version": Constant.JSONL_FORMAT_VERSION, "run_cmd": run_cmd}
+    if shard:
+        header["shard"] = shard
+    return header
+
+
+def _read_jsonl_header(report_f):
+    """
+    read the header line of a jsonl report, return None and seek to the file start when it is a json report
+    """
+    try:
+        header = json.loads(report_f.readline())
+    except ValueError:
+        header = None
+    if isinstance(header, dict) and header.get("format") == Constant.JSONL_FORMAT_TAG:
+        return header
+    report_f.seek(0)
+    return None
+
+
+def _iter_jsonl_case_objs(report_f):
+    """
+    iterate the case json objects of a jsonl report after the header, skip the broken lines, e.g. the last line
+    of a report written by a killed run
+    """
+    for line_no, line in enumerate(report_f, start=2):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            logger.log_warn("skip broken report line %d in %s" % (line_no, report_f.name))
 
 
 class TestResultType(Enum):
@@ -75,6 +132,8 @@ class OpUTCaseReport:
             self.err_trace = err_trace
 
         self.trace_detail = case_run_trace
+        # seconds the case runs, None means not measured
+        self.duration = None
 
     def to_json_obj(self):
         """
@@ -87,6 +146,7 @@ class OpUTCaseReport:
             "run_soc": self.run_soc,
             "status": self.status,
             "err_msg": self.err_msg,
+            "duration": self.duration,
             "trace_detail": None if not self.trace_detail else self.trace_detail.to_json_obj()
         }
 
@@ -127,7 +187,12 @@ class OpUTCaseReport:
         """
         if not json_obj:
             return None
-        return OpUTCaseReport(OpUTCaseTrace.parser_json_obj(json_obj["trace_detail"]))
+        case_rpt = OpUTCaseReport(OpUTCaseTrace.parser_json_obj(json_obj["trace_detail"]))
+        case_rpt.duration = json_obj.get("duration")
+        # error is set by the runner, not derived from the stages, see op_ut_runner._build_hung_case_report
+        if json_obj.get("status") == op_status.ERROR:
+            case_rpt.status = op_status.ERROR
+        return case_rpt
 
 
 class OpUTReport:
@@ -135,14 +200,23 @@ class OpUTReport:
     op ut report
     """
 
-    def __init__(self, run_cmd=None):
+    def __init__(self, run_cmd=None, summary_only=False):
         self.run_cmd = run_cmd
+        # summary only report keeps the counters and the summary lines of failed and error cases,
+        # but not the case reports, so get_case_rpt_list is empty and it can not be saved
+        self.summary_only = summary_only
         self.total_cnt = 0
         self.failed_cnt = 0
         self.success_cnt = 0
         self.err_cnt = 0
+        self.kernel_cache_hit_cnt = 0
+        self.kernel_cache_miss_cnt = 0
+        self.shape_bucket_reuse_cnt = 0
+        # shard of the run, like {"index": 0, "count": 4}, None means not sharded
+        self.shard = None
         self._report_list = []
-        # map struct is: soc -> status['success', 'failed'] -> case_rpt list
+        # map struct is: soc -> status['success', 'failed'] -> case_rpt list,
+        # or failed and error case summary str list in summary only report
         self._soc_report_map = {}
 
     def get_case_rpt_list(self):
@@ -158,7 +232,6 @@ class OpUTReport:
         :param case_rpt: case report
         :return: None
         """
-        self._report_list.append(case_rpt)
         self.total_cnt += 1
         if case_rpt.status == op_status.SUCCESS:
             self.success_cnt += 1
@@ -166,13 +239,61 @@ class OpUTReport:
             self.failed_cnt += 1
         if case_rpt.status == op_status.ERROR:
             self.err_cnt += 1
+        self._count_compile_result(case_rpt)
 
         if case_rpt.run_soc not in self._soc_report_map.keys():
             self._soc_report_map[case_rpt.run_soc] = {}
         if case_rpt.status not in self._soc_report_map[case_rpt.run_soc].keys():
             self._soc_report_map[case_rpt.run_soc][case_rpt.status] = []
 
-        self._soc_report_map[case_rpt.run_soc][case_rpt.status].append(case_rpt)
+        if not self.summary_only:
+            self._report_list.append(case_rpt)
+            self._soc_report_map[case_rpt.run_soc][case_rpt.status].append(case_rpt)
+        elif case_rpt.status != op_status.SUCCESS:
+            self._soc_report_map[case_rpt.run_soc][case_rpt.status].append(case_rpt.summary_txt())
+
+    def _merge_summary(self, rpt):
+        self.total_cnt += rpt.total_cnt
+        self.success_cnt += rpt.success_cnt
+        self.failed_cnt += rpt.failed_cnt
+        self.err_cnt += rpt.err_cnt
+        self.kernel_cache_hit_cnt += rpt.kernel_cache_hit_cnt
+        self.kernel_cache_miss_cnt += rpt.kernel_cache_miss_cnt
+        self.shape_bucket_reuse_cnt += rpt.shape_bucket_reuse_cnt
+        for soc, soc_detail in rpt._soc_report_map.items():  # 'pylint: disable=protected-access
+            for status, summary_list in soc_detail.items():
+                self._soc_report_map.setdefault(soc, {}).setdefault(status, []).extend(summary_list)
+
+    def _count_compile_result(self, case_rpt: OpUTCaseReport):
+        if not case_rpt.trace_detail:
+            return
+        for stage_res in case_rpt.trace_detail.stage_result:
+            if stage_res.stage_name != op_ut_case_info.Constant.STAGE_COMPILE or \
+                    not isinstance(stage_res.result, dict):
+                continue
+            cache_status = stage_res.result.get(op_ut_cache.Constant.KERNEL_CACHE_RESULT_KEY)
+            if cache_status == op_ut_cache.Constant.CACHE_HIT:
+                self.kernel_cache_hit_cnt += 1
+            elif cache_status == op_ut_cache.Constant.CACHE_MISS:
+                self.kernel_cache_miss_cnt += 1
+            if stage_res.result.get(op_ut_cache.Constant.SHAPE_BUCKET_RESULT_KEY):
+                self.shape_bucket_reuse_cnt += 1
+
+    def get_failed_case_names(self):
+        """
+        get the failed and error case names grouped by case file and soc
+        :return: dict, key is (case file real path, soc), value is case name set
+        """
+        failed_case_map = {}
+        for case_rpt in self._report_list:
+            if case_rpt.status not in (op_status.FAILED, op_status.ERROR) or not case_rpt.trace_detail:
+                continue
+            case_file = case_rpt.trace_detail.ut_case_info.case_file
+            if not case_file:
+                continue
+            failed_key = (os.path.realpath(case_file), case_rpt.run_soc)
+            failed_case_map.setdefault(failed_key, set()).add(case_rpt.case_name)
+        return failed_case_map
 
     def merge_rpt(self, rpt):
         """
@@ -180,6 +301,9 @@ class OpUTReport:
         :param rpt: another report
         :return: None
         """
+        if rpt.summary_only:
+            self._merge_summary(rpt)
+            return
         for case_rpt in rpt.get_case_rpt_list():
             self.add_case_report(case_rpt)
 
@@ -188,10 +312,13 @@ class OpUTReport:
         convert to json object
         :return: json object
         """
-        return {
+        json_obj = {
             "run_cmd": self.run_cmd,
             "report_list": [case_rpt.to_json_obj() for case_rpt in self._report_list]
         }
+        if self.shard:
+            json_obj["shard"] = self.shard
+        return json_obj
 
     def summary_txt(self):
         """
@@ -208,15 +335,20 @@ run command: %s
 - error count: %d
 ------------------------------------------------------------------------
 """ % (self.run_cmd, ", ".join(self._soc_report_map), self.total_cnt, self.success_cnt, self.failed_cnt, self.err_cnt)
+        if self.kernel_cache_hit_cnt > 0 or self.kernel_cache_miss_cnt > 0:
+            total_txt += "- kernel cache hit count: %d, miss count: %d\n" % (self.kernel_cache_hit_cnt,
+                                                                           self.kernel_cache_miss_cnt)
+            total_txt += "------------------------------------------------------------------------\n"
+        if self.shape_bucket_reuse_cnt > 0:
+            total_txt += "- dynamic shape bucket reuse kernel count: %d\n" % self.shape_bucket_reuse_cnt
+            total_txt += "------------------------------------------------------------------------\n"
 
         for soc, soc_detail in self._soc_report_map.items():
             total_txt += "Soc Version: %s\n" % soc
-            for err_case in soc_detail.get(op_status.ERROR, []):
-                total_txt += "    " + err_case.summary_txt() + "\n"
-            for err_case in soc_detail.get(op_status.FAILED, []):
-                total_txt += "    " + err_case.summary_txt() + "\n"
-            for err_case in soc_detail.get(op_status.SUCCESS, []):
-                total_txt += "    " + err_case.summary_txt() + "\n"
+            for status in (op_status.ERROR, op_status.FAILED, op_status.SUCCESS):
+                for err_case in soc_detail.get(status, []):
+                    case_txt = err_case if isinstance(err_case, str) else err_case.summary_txt()
+                    total_txt += "    " + case_txt + "\n"
             total_txt += "------------------------------------------------------------------------\n"
 
         total_txt += "========================================================================\n"
@@ -250,81 +382,104 @@ run command: %s
             with open(rpt_file_path, 'w') as rpt_file:
                 rpt_file.write(rpt_txt)
 
-    def combine_report(self, report_paths, strict=False, file_pattern=None):
+    def combine_report(self, report_paths, strict=False,  # 'pylint: disable=too-many-arguments
+                       file_pattern=None, shard_count=None, process_num=None):
         """
-        combine all report in report paths
+        combine all report in report paths, the report files are merged one by one in the file order,
+        a summary only report loads the files in a process pool, the loaded summaries are small,
+        a full report loads them in the current process, not to pickle every case report back from the pool
         :param report_paths: report path
         :param strict: True is not found report will raise runtime exception
         :param file_pattern: report file pattern
+        :param shard_count: if not None, the reports are sharded run reports, check all the shards are combined
+        :param process_num: process count to load the report files of a summary only report, default is None,
+                            use cpu_count, 1 means load in the current process
         :return: None
         """
+        shard_list = []
+        find_report_list = find_report_files(report_paths, strict=strict, file_pattern=file_pattern)
+        load_args = [(report_file, self.summary_only) for report_file in find_report_list]
+        process_num = process_num if process_num else multiprocessing.cpu_count()
+        process_num = min(process_num, len(load_args))
+        # daemonic process, e.g. a case file worker, is not allowed to have children
+        if not self.summary_only or process_num <= 1 or len(load_args) < Constant.COMBINE_PARALLEL_MIN_FILES or \
+                multiprocessing.current_process().daemon:
+            rpt_iter = map(_load_report, load_args)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(processes=process_num)
+            rpt_iter = pool.imap(_load_report, load_args)
+        try:
+            for ut_report in rpt_iter:
+                shard_list.append(ut_report.shard)
+                self.merge_rpt(ut_report)
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+        logger.log_info("combine %d reports success, case cnt: %d" % (len(find_report_list), self.total_cnt))
+        if shard_count is not None:
+            self._check_shards(shard_list, shard_count)
 
-        def _add_report(rpt: OpUTReport):
-            for case_rpt in rpt.get_case_rpt_list():
-                self.add_case_report(case_rpt)
-
-        if not isinstance(report_paths, (tuple, list)):
-            report_paths = (report_paths,)
-
-        find_report_list = []
-        for report_path in report_paths:
-            if not os.path.exists(report_path):
-                logger.log_warn("combine_report report path not exist: %s" % report_path)
-            if os.path.isfile(report_path):
-                ut_report = OpUTReport()
-                ut_report.load(report_path)
-                print("load %s success, case cnt: %d" % (report_path, ut_report.total_cnt))
-                _add_report(ut_report)
-                continue
-            for path, dir_names, file_names in os.walk(report_path):
-                print(path, dir_names, file_names)
-                for file_name in file_names:
-                    if file_pattern and not fnmatch.fnmatch(file_name, file_pattern):
-                        continue
-                    report_file = os.path.join(path, file_name)
-                    find_report_list.append(report_file)
-                    report_file = os.path.join(path, file_name)
-                    ut_report = OpUTReport()
-                    ut_report.load(report_file)
-                    print("load %s success, case cnt: %d" % (report_file, ut_report.total_cnt))
-                    _add_report(ut_report)
-        if not find_report_list and strict:
-            logger.log_err("combine_report not found any report to combine in: [%s]" % ", ".join(report_paths))
-            raise RuntimeError("combine_report not found any report to combine in: [%s]" % ", ".join(report_paths))
+    @staticmethod
+    def _check_shards(shard_list, shard_count):
+        shard_index_list = []
+        for shard in shard_list:
+            if not shard or shard.get("count") != shard_count:
+                err_msg = "combine_report found report not belong to a %d shards run, shard: %s" % (shard_count, shard)
+                logger.log_err(err_msg)
+                raise RuntimeError(err_msg)
+            shard_index_list.append(shard.get("index"))
+        missing_list = [str(idx) for idx in range(shard_count) if idx not in shard_index_list]
+        duplicate_list = sorted(set(str(idx) for idx in shard_index_list if shard_index_list.count(idx) > 1))
+        if missing_list or duplicate_list:
+            err_msg = "combine_report shard check failed, missing shards: [%s], duplicate shards: [%s]" % (
+                ", ".join(missing_list), ", ".join(duplicate_list))
+            logger.log_err(err_msg)
+            raise RuntimeError(err_msg)
+        try:
+            op_ut_schedule.check_shard_units(shard_list)
+        except RuntimeError as unit_err:
+            logger.log_err("combine_report %s" % unit_err.args[0])
+            raise
 
     def load(self, report_file):
         """
-        load report
+        load report, support json and jsonl report, jsonl report is parsed line by line
         :param report_file: report file path
         :return: None
         """
         with open(report_file) as r_f:
-            json_str = r_f.read()
-        json_obj = json.loads(json_str)
-        self.run_cmd = json_obj["run_cmd"]
-        for case_rpt in [OpUTCaseReport.parser_json_obj(case_obj) for case_obj in json_obj["report_list"]]:
-            self.add_case_report(case_rpt)
-
-    def save(self, report_data_path):
+            header = _read_jsonl_header(r_f)
+            if header is None:
+                json_obj = json.load(r_f)
+                self.run_cmd = json_obj["run_cmd"]
+                self.shard = json_obj.get("shard")
+                for case_rpt in [OpUTCaseReport.parser_json_obj(case_obj) for case_obj in json_obj["report_list"]]:
+                    self.add_case_report(case_rpt)
+                return
+            self.run_cmd = header.get("run_cmd")
+            self.shard = header.get("shard")
+            # one case a line, only the current case report is kept in summary only report
+            for case_obj in _iter_jsonl_case_objs(r_f):
+                self.add_case_report(OpUTCaseReport.parser_json_obj(case_obj))
+
+    def save(self, report_data_path, report_format=Constant.REPORT_FORMAT_JSON):
         """
         save report
         :param report_data_path: report data path
+        :param report_format: json or jsonl, jsonl writes one case report a line
         :return: None
         """
-        json_obj = self.to_json_obj()
-        report_data_path = os.path.realpath(report_data_path)
-        report_data_dir = os.path.dirname(report_data_path)
-        if not os.path.exists(report_data_dir):
-            file_util.makedirs(report_data_dir, mode=Constant.DATA_DIR_MODES)
-        json_str = json.dumps(json_obj, indent=4)
-
-        if not os.path.exists(report_data_path):
-            with os.fdopen(os.open(report_data_path,
-                                   Constant.DATA_FILE_FLAGS, Constant.DATA_FILE_MODES), 'w') as rpt_fout:
-                rpt_fout.write(json_str)
-        else:
-            with open(report_data_path, 'w') as rpt_file:
-                rpt_file.write(json_str)
+        if self.summary_only:
+            raise RuntimeError("summary only report has no case report to save")
+        with _open_report_file(report_data_path) as rpt_file:
+            if report_format != Constant.REPORT_FORMAT_JSONL:
+                rpt_file.write(json.dumps(self.to_json_obj(), indent=4))
+                return
+            rpt_file.write(json.dumps(_build_jsonl_header(self.run_cmd, self.shard)) + "\n")
+            for case_rpt in self._report_list:
+                rpt_file.write(json.dumps(case_rpt.to_json_obj()) + "\n")
 
     @staticmethod
     def parser_json_obj(json_obj):
@@ -337,3 +492,170 @@ run command: %s
         for case_rpt in [OpUTCaseReport.parser_json_obj(case_obj) for case_obj in json_obj["report_list"]]:
             rpt.add_case_report(case_rpt)
         return rpt
+
+
+class JsonlReportWriter:
+    """
+    write a jsonl report case by case, the header is written when open and each case line is flushed when added,
+    so the report of a killed run keeps the completed cases
+    """
+
+    def __init__(self, report_data_path, run_cmd=None, shard=None):
+        self.report_data_path = report_data_path
+        self.run_cmd = run_cmd
+        self.shard = shard
+        self._rpt_file = None
+
+    def open(self):
+        """
+        create the report file and write the header line
+        :return: None
+        """
+        self._rpt_file = _open_report_file(self.report_data_path)
+        self._write_line(_build_jsonl_header(self.run_cmd, self.shard))
+
+    def add_case_report(self, case_rpt: OpUTCaseReport):
+        """
+        append one case report line
+        :param case_rpt: case report
+        :return: None
+        """
+        self._write_line(case_rpt.to_json_obj())
+
+    def close(self):
+        """
+        close the report file
+        :return: None
+        """
+        if self._rpt_file:
+            self._rpt_file.close()
+            self._rpt_file = None
+
+    def _write_line(self, json_obj):
+        self._rpt_file.write(json.dumps(json_obj) + "\n")
+        self._rpt_file.flush()
+
+
+def _load_report(load_arg):
+    report_file, summary_only = load_arg
+    ut_report = OpUTReport(summary_only=summary_only)
+    ut_report.load(report_file)
+    return ut_report
+
+
+def iter_case_reports(report_file):
+    """
+    iterate the case reports of a json or jsonl report file, a jsonl report is parsed line by line
+    :param report_file: report file path
+    :return: OpUTCaseReport iterator
+    """
+    with open(report_file) as r_f:
+        if _read_jsonl_header(r_f) is None:
+            for case_obj in json.load(r_f)["report_list"]:
+                yield OpUTCaseReport.parser_json_obj(case_obj)
+            return
+        for case_obj in _iter_jsonl_case_objs(r_f):
+            yield OpUTCaseReport.parser_json_obj(case_obj)
+
+
+def find_report_files(report_paths, strict=False, file_pattern=None):
+    """
+    find report files in report paths, the files in a directory are in a stable order
+    :param report_paths: report file or directory, or a list of them
+    :param strict: True is not found report will raise runtime exception
+    :param file_pattern: report file pattern, only work for the files in directories
+    :return: report file list
+    """
+    if not isinstance(report_paths, (tuple, list)):
+        report_paths = (report_paths,)
+
+    find_report_list = []
+    for report_path in report_paths:
+        if not os.path.exists(report_path):
+            logger.log_warn("combine_report report path not exist: %s" % report_path)
+        if os.path.isfile(report_path):
+            find_report_list.append(report_path)
+            continue
+        for path, dir_names, file_names in os.walk(report_path):
+            # combine in a stable order, the reports may be written by processes in any order
+            dir_names.sort()
+            for file_name in sorted(file_names):
+                if file_pattern and not fnmatch.fnmatch(file_name, file_pattern):
+                    continue
+                find_report_list.append(os.path.join(path, file_name))
+    if not find_report_list and strict:
+        logger.log_err("combine_report not found any report to combine in: [%s]" % ", ".join(report_paths))
+        raise RuntimeError("combine_report not found any report to combine in: [%s]" % ", ".join(report_paths))
+    return find_report_list
+
+
+def _copy_jsonl_case_lines(report_f, out_f, report_file):
+    """
+    copy the case lines of a jsonl report after the header line by line, the last line without line end is
+    written by a killed run, drop it so that it does not join the first line of the next report
+    """
+    for line in report_f:
+        if not line.endswith("\n"):
+            logger.log_warn("drop broken last line of report %s" % report_file)
+            return
+        out_f.write(line)
+
+
+def concat_reports(report_paths, output_path, run_cmd=None, shard=None,  # 'pylint: disable=too-many-arguments
+                   strict=False, file_pattern=None, shard_count=None):
+    """
+    combine reports to a jsonl report by concatenating the case lines of jsonl reports,
+    only json reports are parsed and converted
+
+    Parameters
+    ----------
+    report_paths: str or list
+        report files or directories
+    output_path: str
+        combined jsonl report path
+    run_cmd: str
+        run command of the combined report
+    shard: dict
+        shard of the combined report, like {"index": 0, "count": 4}, None means not sharded
+    strict: bool
+        True is not found report will raise runtime exception
+    file_pattern: str
+        report file pattern
+    shard_count: int
+        if not None, the reports are sharded run reports, check all the shards are combined
+
+    Returns
+    -------
+    report file list combined
+    """
+    find_report_list = find_report_files(report_paths, strict=strict, file_pattern=file_pattern)
+    shard_list = []
+    # write a temp file and replace, the output may be one of the reports to combine
+    output_path = os.path.realpath(output_path)
+    output_dir = os.path.dirname(output_path)
+    if not os.path.exists(output_dir):
+        file_util.makedirs(output_dir, mode=Constant.DATA_DIR_MODES)
+    tmp_fd, tmp_path = tempfile.mkstemp(dir=output_dir, prefix=".tmp_report_")
+    os.chmod(tmp_path, Constant.DATA_FILE_MODES)
+    with os.fdopen(tmp_fd, "w") as out_f:
+        out_f.write(json.dumps(_build_jsonl_header(run_cmd, shard)) + "\n")
+        for report_file in find_report_list:
+            with open(report_file) as r_f:
+                header = _read_jsonl_header(r_f)
+                if header is not None:
+                    shard_list.append(header.get("shard"))
+                    _copy_jsonl_case_lines(r_f, out_f, report_file)
+                    continue
+            ut_report = OpUTReport()
+            ut_report.load(report_file)
+            shard_list.append(ut_report.shard)
+            for case_rpt in ut_report.get_case_rpt_list():
+                out_f.write(json.dumps(case_rpt.to_json_obj()) + "\n")
+    if shard_count is not None:
+        try:
+            OpUTReport._check_shards(shard_list, shard_count)  # 'pylint: disable=protected-access
+        except RuntimeError:
+            os.remove(tmp_path)
+            raise
+    os.replace(tmp_path, output_path)
+    return find_report_list
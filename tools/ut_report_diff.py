@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Copyright 2020 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+
+"""
+ut report diff, apply the comparison of two ut reports by (op_type, case_name, run_soc), to gate the new failures
+and the duration regressions of a run: diff_reports
+
+usage:
+    python ut_report_diff.py ./base/.ut_test_report ./report/.ut_test_report --threshold 0.2 --fail_on all
+"""
+import os
+import sys
+import json
+import argparse
+
+from op_test_frame.common import logger
+from op_test_frame.common import op_status
+from op_test_frame.ut import ut_report
+
+
+# 'pylint: disable=too-few-public-methods
+class Constant:
+    """
+    This class for Constant.
+    """
+    # a duration is regressed when it is this ratio longer than the base
+    DEFAULT_DURATION_THRESHOLD = 0.2
+    # and it is at least this seconds longer, so that the noise of the short cases and stages is ignored
+    DEFAULT_MIN_DURATION_DELTA = 0.05
+    FAIL_ON_FAILURE = "failure"
+    FAIL_ON_PERF = "perf"
+    FAIL_ON_ALL = "all"
+    FAIL_ON_NONE = "none"
+    # the worse status is kept when a report has the same case more than once
+    STATUS_SEVERITY = {op_status.SUCCESS: 0, op_status.FAILED: 1, op_status.ERROR: 2}
+
+
+def _is_failed(status):
+    return status in (op_status.FAILED, op_status.ERROR)
+
+
+def _get_case_key(case_rpt: ut_report.OpUTCaseReport):
+    return case_rpt.op_type, case_rpt.case_name, case_rpt.run_soc
+
+
+def _get_case_brief(case_rpt: ut_report.OpUTCaseReport):
+    # only keep what to compare, so that a big base report not keeps the case reports in memory
+    stage_durations = {}
+    if case_rpt.trace_detail:
+        for stage_res in case_rpt.trace_detail.stage_result:
+            if stage_res.duration is not None:
+                stage_durations[stage_res.stage_name] = stage_durations.get(stage_res.stage_name, 0) + \
+                                                        stage_res.duration
+    return case_rpt.status, case_rpt.duration, stage_durations
+
+
+def _max_duration(duration, other_duration):
+    if duration is None:
+        return other_duration
+    if other_duration is None:
+        return duration
+    return max(duration, other_duration)
+
+
+def _merge_case_brief(case_brief, other_brief):
+    status, duration, stage_durations = case_brief
+    other_status, other_duration, other_stage_durations = other_brief
+    if Constant.STATUS_SEVERITY.get(other_status, 0) > Constant.STATUS_SEVERITY.get(status, 0):
+        status = other_status
+    merged_stage_durations = dict(stage_durations)
+    for stage_name, stage_duration in other_stage_durations.items():
+        merged_stage_durations[stage_name] = _max_duration(merged_stage_durations.get(stage_name), stage_duration)
+    return status, _max_duration(duration, other_duration), merged_stage_durations
+
+
+def _load_case_briefs(report_file):
+    """
+    load the case briefs of a report keyed by case key, a case in the report more than once, e.g. a report
+    concatenated from overlapped runs, keeps the worst status and the longest durations
+    """
+    case_brief_map = {}
+    for case_rpt in ut_report.iter_case_reports(report_file):
+        case_key = _get_case_key(case_rpt)
+        case_brief = _get_case_brief(case_rpt)
+        if case_key in case_brief_map:
+            logger.log_warn("duplicate case %s in report %s, keep the worst status and the longest duration" % (
+                "[%s]  %s (%s)" % case_key, report_file))
+            case_brief = _merge_case_brief(case_brief_map.get(case_key), case_brief)
+        case_brief_map[case_key] = case_brief
+    return case_brief_map
+
+
+def _is_regressed(base_duration, new_duration, threshold, min_delta):
+    if base_duration is None or new_duration is None:
+        return False
+    delta = new_duration - base_duration
+    return delta >= min_delta and delta > base_duration * threshold
+
+
+class ReportDiff:
+    """
+    difference of a new report to a base report, case keys are (op_type, case_name, run_soc)
+    """
+
+    def __init__(self):
+        # failed or error in new report, but success in base report or not in base report
+        self.new_failures = []
+        # success in new report, but failed or error in base report
+        self.fixed_cases = []
+        self.added_cases = []
+        self.removed_cases = []
+        # (case key, base duration, new duration)
+        self.case_regressions = []
+        # (case key, stage name, base duration, new duration)
+        self.stage_regressions = []
+        self.compared_cnt = 0
+
+    def has_failure(self):
+        """
+        check has new failure
+        :return: True or False
+        """
+        return bool(self.new_failures)
+
+    def has_perf_regression(self):
+        """
+        check has case or stage duration regression
+        :return: True or False
+        """
+        return bool(self.case_regressions or self.stage_regressions)
+
+    def to_json_obj(self):
+        """
+        convert to json object
+        :return: json object
+        """
+        return {
+            "compared_cnt": self.compared_cnt,
+            "new_failures": [list(key) for key in self.new_failures],
+            "fixed_cases": [list(key) for key in self.fixed_cases],
+            "added_cases": [list(key) for key in self.added_cases],
+            "removed_cases": [list(key) for key in self.removed_cases],
+            "case_regressions": [{"case": list(key), "base": base, "new": new}
+                                 for key, base, new in self.case_regressions],
+            "stage_regressions": [{"case": list(key), "stage": stage, "base": base, "new": new}
+                                  for key, stage, base, new in self.stage_regressions],
+        }
+
+    def summary_txt(self):
+        """
+        get diff summary string
+        :return: summary string
+        """
+        def _key_txt(key):
+            return "[%s]  %s (%s)" % key
+
+        total_txt = """========================================================================
+- compared case count: %d
+- new failure count: %d
+- fixed count: %d
+- added count: %d
+- removed count: %d
+- case duration regression count: %d
+- stage duration regression count: %d
+------------------------------------------------------------------------
+""" % (self.compared_cnt, len(self.new_failures), len(self.fixed_cases), len(self.added_cases),
+       len(self.removed_cases), len(self.case_regressions), len(self.stage_regressions))
+        for title, key_list in (("new failure", self.new_failures), ("fixed", self.fixed_cases),
+                                ("added", self.added_cases), ("removed", self.removed_cases)):
+            for key in key_list:
+                total_txt += "    %s: %s\n" % (title, _key_txt(key))
+        for key, base, new in self.case_regressions:
+            total_txt += "    case slower: %s %.3fs -> %.3fs\n" % (_key_txt(key), base, new)
+        for key, stage, base, new in self.stage_regressions:
+            total_txt += "    stage slower: %s %s %.3fs -> %.3fs\n" % (_key_txt(key), stage, base, new)
+        total_txt += "========================================================================\n"
+        return total_txt
+
+
+def diff_reports(base_report_file, new_report_file,
+                 threshold=Constant.DEFAULT_DURATION_THRESHOLD, min_delta=Constant.DEFAULT_MIN_DURATION_DELTA):
+    """
+    compare the new report to the base report, the case briefs of both reports are hashed by case key,
+    so it is linear of the case count, a case in a report more than once keeps the worst status and
+    the longest durations
+
+    Parameters
+    ----------
+    base_report_file: str
+        base report file, json or jsonl report
+    new_report_file: str
+        new report file, json or jsonl report
+    threshold: float
+        a case or stage duration is regressed when it is this ratio longer than the base
+    min_delta: float
+        seconds, and a regressed duration is at least this seconds longer than the base
+
+    Returns
+    -------
+    ReportDiff
+    """
+    base_case_map = _load_case_briefs(base_report_file)
+
+    report_diff = ReportDiff()
+    for case_key, new_brief in _load_case_briefs(new_report_file).items():
+        new_status, new_duration, new_stage_durations = new_brief
+        base_brief = base_case_map.pop(case_key, None)
+        if base_brief is None:
+            report_diff.added_cases.append(case_key)
+            if _is_failed(new_status):
+                report_diff.new_failures.append(case_key)
+            continue
+        report_diff.compared_cnt += 1
+        base_status, base_duration, base_stage_durations = base_brief
+        if _is_failed(new_status) and not _is_failed(base_status):
+            report_diff.new_failures.append(case_key)
+        elif _is_failed(base_status) and new_status == op_status.SUCCESS:
+            report_diff.fixed_cases.append(case_key)
+        if _is_regressed(base_duration, new_duration, threshold, min_delta):
+            report_diff.case_regressions.append((case_key, base_duration, new_duration))
+        for stage_name, new_stage_duration in new_stage_durations.items():
+            if _is_regressed(base_stage_durations.get(stage_name), new_stage_duration, threshold, min_delta):
+                report_diff.stage_regressions.append((case_key, stage_name, base_stage_durations.get(stage_name),
+                                                      new_stage_duration))
+    report_diff.removed_cases = list(base_case_map.keys())
+    report_diff.case_regressions.sort(key=lambda x: x[1] - x[2])
+    report_diff.stage_regressions.sort(key=lambda x: x[2] - x[3])
+    return report_diff
+
+
+def main(argv=None):
+    """
+    diff two reports from command line, exit with 1 when the gate fails
+    :param argv: command line args, default is None, sys.argv
+    :return: exit code
+    """
+    parser = argparse.ArgumentParser(description="diff two op ut reports")
+    parser.add_argument("base_report", help="base report file")
+    parser.add_argument("new_report", help="new report file")
+    parser.add_argument("--threshold", type=float, default=Constant.DEFAULT_DURATION_THRESHOLD,
+                        help="duration regression ratio")
+    parser.add_argument("--min_delta", type=float, default=Constant.DEFAULT_MIN_DURATION_DELTA,
+                        help="seconds, min duration increase of a regression")
+    parser.add_argument("--fail_on", default=Constant.FAIL_ON_FAILURE,
+                        choices=(Constant.FAIL_ON_FAILURE, Constant.FAIL_ON_PERF, Constant.FAIL_ON_ALL,
+                                 Constant.FAIL_ON_NONE),
+                        help="gate fails on new failures, duration regressions, all of them or none")
+    parser.add_argument("--output", default=None, help="json file to save the diff")
+    args = parser.parse_args(argv)
+    for report_file in (args.base_report, args.new_report):
+        if not os.path.isfile(report_file):
+            logger.log_err("report not exist: %s" % report_file)
+            return 1
+    report_diff = diff_reports(args.base_report, args.new_report, args.threshold, args.min_delta)
+    print(report_diff.summary_txt())
+    if args.output:
+        with open(args.output, "w") as diff_f:
+            json.dump(report_diff.to_json_obj(), diff_f, indent=4)
+
+    gate_failed = False
+    if args.fail_on in (Constant.FAIL_ON_FAILURE, Constant.FAIL_ON_ALL) and report_diff.has_failure():
+        logger.log_err("report diff gate failed, %d new failures" % len(report_diff.new_failures))
+        gate_failed = True
+    if args.fail_on in (Constant.FAIL_ON_PERF, Constant.FAIL_ON_ALL) and report_diff.has_perf_regression():
+        logger.log_err("report diff gate failed, %d case and %d stage duration regressions" % (
+            len(report_diff.case_regressions), len(report_diff.stage_regressions)))
+        gate_failed = True
+    return 1 if gate_failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())